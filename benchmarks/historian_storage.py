@@ -0,0 +1,297 @@
+"""
+Benchmark WorkflowHistorianStorage against an in-memory SQLite copy of the
+historian schema.
+
+Oracle sequences are emulated with one-row tables.  Reserving ids costs an
+UPDATE and a SELECT where Oracle needs a single 'SELECT seq.nextval' query, so
+statement counts slightly overstate id traffic.  Synthetic update
+streams shaped like real workflows are replayed through either
+WorkflowHistorianStorage.update (one transaction per update) or update_many
+(one transaction per batch), and the script reports updates per second,
+statements per update and p50/p99 latency per storage call.
+
+    python benchmarks/historian_storage.py --scenario wide-parallel --size 2000
+"""
+
+from flow_workflow.historian.operation_data import OperationData
+from flow_workflow.historian.status import Status
+from flow_workflow.historian.storage import WorkflowHistorianStorage
+from sqlalchemy import event
+
+import argparse
+import time
+
+
+OWNER = 'WORKFLOW'
+
+CREATE_STATEMENTS = [
+"""
+CREATE TABLE WORKFLOW.WORKFLOW_INSTANCE (
+    WORKFLOW_INSTANCE_ID integer primary key not null,
+    PARENT_INSTANCE_ID integer,
+    PEER_INSTANCE_ID integer,
+    CURRENT_EXECUTION_ID integer,
+    WORKFLOW_PLAN_ID integer not null,
+    NAME varchar not null,
+    INPUT_STORED varchar,
+    OUTPUT_STORED varchar,
+    PARALLEL_INDEX integer,
+    PARENT_EXECUTION_ID integer,
+    INTENTION varchar
+)
+""",
+"""
+CREATE TABLE WORKFLOW.WORKFLOW_INSTANCE_EXECUTION (
+    WORKFLOW_EXECUTION_ID integer primary key not null,
+    WORKFLOW_INSTANCE_ID integer not null,
+    STATUS varchar not null,
+    START_TIME timestamp,
+    END_TIME timestamp,
+    EXIT_CODE integer,
+    STDOUT varchar,
+    STDERR varchar,
+    IS_DONE integer,
+    IS_RUNNING integer,
+    DISPATCH_ID varchar,
+    CPU_TIME float,
+    MAX_MEMORY integer,
+    MAX_SWAP integer,
+    MAX_PROCESSES integer,
+    MAX_THREADS integer,
+    USER_NAME varchar
+)
+""",
+"""
+CREATE TABLE WORKFLOW.WORKFLOW_HISTORIAN (
+    NET_KEY varchar not null,
+    OPERATION_ID integer not null,
+    COLOR integer not null,
+    WORKFLOW_INSTANCE_ID integer,
+    PRIMARY KEY (NET_KEY, OPERATION_ID, COLOR)
+)
+""",
+"""
+CREATE TABLE WORKFLOW.WORKFLOW_INSTANCE_SEQ (VALUE integer not null)
+""",
+"""
+CREATE TABLE WORKFLOW.WORKFLOW_EXECUTION_SEQ (VALUE integer not null)
+""",
+"""
+INSERT INTO WORKFLOW.WORKFLOW_INSTANCE_SEQ (VALUE) VALUES (0)
+""",
+"""
+INSERT INTO WORKFLOW.WORKFLOW_EXECUTION_SEQ (VALUE) VALUES (0)
+""",
+]
+
+
+class SQLiteHistorianStorage(WorkflowHistorianStorage):
+    """
+    WorkflowHistorianStorage on SQLite, with sequences kept in tables.
+    """
+    def create_tables(self):
+        with self.engine.begin() as conn:
+            conn.execute("ATTACH DATABASE ':memory:' as %s" % OWNER)
+            for statement in CREATE_STATEMENTS:
+                conn.execute(statement)
+
+    def _next_id(self, transaction, sequence_name):
+        return self._next_ids(transaction, sequence_name, 1)[0]
+
+    def _next_ids(self, transaction, sequence_name, count):
+        # a block of <count> ids per reservation, like the CONNECT BY query
+        transaction.execute("UPDATE %s SET value = value + %d"
+                % (sequence_name, count))
+        last = transaction.execute("SELECT value FROM %s"
+                % sequence_name).fetchone()[0]
+        return range(last - count + 1, last + 1)
+
+
+class StatementCounter(object):
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args, **kwargs):
+        self.count += 1
+
+
+# Synthetic update streams
+# ------------------------
+# Each scenario yields update_info dicts in the order an orchestrator would
+# publish them.
+
+NET_KEY = 'benchmark_net'
+PLAN_ID = 1
+CHILD_STATUSES = ['new', 'scheduled', 'running', 'done']
+
+
+def _update(operation_id, color, status, **kwargs):
+    update_info = {
+        'operation_data': OperationData(net_key=NET_KEY,
+            operation_id=operation_id, color=color),
+        'name': 'operation %d' % operation_id,
+        'status': Status(status),
+        'workflow_plan_id': PLAN_ID,
+        'user_name': 'benchmark',
+    }
+    update_info.update(kwargs)
+    return update_info
+
+
+def _parent_data(operation_id, color):
+    return OperationData(net_key=NET_KEY, operation_id=operation_id,
+            color=color)
+
+
+def deep_model_updates(size):
+    """
+    A chain of <size> nested models, each with one command in it.
+    """
+    updates = []
+    for depth in xrange(size):
+        model_id = 2 * depth + 1
+        command_id = model_id + 1
+        extra = {}
+        if depth:
+            extra['parent_operation_data'] = _parent_data(model_id - 2, 0)
+        updates.append(_update(model_id, 0, 'new', **extra))
+        updates.append(_update(model_id, 0, 'running', start_time='start',
+            **extra))
+        for status in CHILD_STATUSES:
+            updates.append(_update(command_id, 0, status,
+                parent_operation_data=_parent_data(model_id, 0)))
+
+    for depth in reversed(xrange(size)):
+        updates.append(_update(2 * depth + 1, 0, 'done', end_time='end'))
+    return updates
+
+
+def _parallel_child_updates(operation_id, parent_id, parent_color, begin,
+        size):
+    updates = []
+    for status in CHILD_STATUSES:
+        for index in xrange(size):
+            updates.append(_update(operation_id, begin + index, status,
+                parent_operation_data=_parent_data(parent_id, parent_color),
+                peer_operation_data=_parent_data(operation_id, begin),
+                parallel_index=index, dispatch_id=str(index)))
+    return updates
+
+
+def wide_parallel_updates(size):
+    """
+    A model containing one parallel-by command with <size> children.
+    """
+    updates = [_update(1, 0, 'new'), _update(1, 0, 'running'),
+            _update(2, 0, 'new', parent_operation_data=_parent_data(1, 0)),
+            _update(2, 0, 'running', parent_operation_data=_parent_data(1, 0))]
+    updates.extend(_parallel_child_updates(2, 1, 0, 1, size))
+    updates.append(_update(2, 0, 'done'))
+    updates.append(_update(1, 0, 'done'))
+    return updates
+
+
+def nested_parallel_updates(size):
+    """
+    A parallel-by model with <size> children, each of which runs a
+    parallel-by command with <size> children.
+    """
+    updates = [_update(1, 0, 'new'), _update(1, 0, 'running')]
+    next_color = 1
+    outer_begin = next_color
+    next_color += size
+    for outer_index in xrange(size):
+        outer_color = outer_begin + outer_index
+        updates.append(_update(1, outer_color, 'running',
+            peer_operation_data=_parent_data(1, outer_begin),
+            parallel_index=outer_index))
+        updates.extend(_parallel_child_updates(2, 1, outer_color, next_color,
+            size))
+        next_color += size
+        updates.append(_update(1, outer_color, 'done'))
+    updates.append(_update(1, 0, 'done'))
+    return updates
+
+
+SCENARIOS = {
+    'deep-model': deep_model_updates,
+    'wide-parallel': wide_parallel_updates,
+    'nested-parallel': nested_parallel_updates,
+}
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+def run(scenario, size, batch_size, id_block_size, id_cache_size):
+    storage = SQLiteHistorianStorage(connection_string='sqlite:///:memory:',
+            owner=OWNER, id_cache_size=id_cache_size, id_cache_ttl=None,
+            id_block_size=id_block_size, pool_size=1)
+    storage.create_tables()
+    counter = StatementCounter(storage.engine)
+    counter.count = 0
+
+    updates = SCENARIOS[scenario](size)
+    if batch_size > 1:
+        calls = [(storage.update_many, updates[i:i + batch_size])
+                for i in xrange(0, len(updates), batch_size)]
+    else:
+        calls = [(storage.update, update) for update in updates]
+
+    latencies = []
+    begin = time.time()
+    for func, arg in calls:
+        call_begin = time.time()
+        func(arg)
+        latencies.append(time.time() - call_begin)
+    elapsed = time.time() - begin
+
+    latencies.sort()
+    return {
+        'scenario': scenario,
+        'updates': len(updates),
+        'calls': len(calls),
+        'updates_per_second': len(updates) / elapsed,
+        'statements_per_update': float(counter.count) / len(updates),
+        'p50_ms': 1000 * percentile(latencies, 0.50),
+        'p99_ms': 1000 * percentile(latencies, 0.99),
+        'id_cache': storage.id_cache.stats,
+    }
+
+
+REPORT = ('%(scenario)-16s %(updates)7d updates %(calls)7d calls '
+        '%(updates_per_second)9.1f updates/s '
+        '%(statements_per_update)6.2f statements/update '
+        'p50 %(p50_ms)7.3f ms  p99 %(p99_ms)7.3f ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+            formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS),
+            action='append', help='May be given several times '
+            '(default: all scenarios)')
+    parser.add_argument('--size', type=int, default=200,
+            help='Depth or width of the synthetic workflow')
+    parser.add_argument('--batch-size', type=int, default=1,
+            help='Updates per update_many call (1 uses update)')
+    parser.add_argument('--id-block-size', type=int, default=20)
+    parser.add_argument('--id-cache-size', type=int, default=10000)
+    arguments = parser.parse_args()
+
+    for scenario in arguments.scenario or sorted(SCENARIOS):
+        result = run(scenario, size=arguments.size,
+                batch_size=arguments.batch_size,
+                id_block_size=arguments.id_block_size,
+                id_cache_size=arguments.id_cache_size)
+        print REPORT % result
+        print '%-16s id cache %s' % ('', result['id_cache'])
+
+
+if __name__ == '__main__':
+    main()
@@ -14,7 +14,7 @@ class IAdapter(object):
 
     @abc.abstractmethod
     def future_operations(self, parent_future_operation,
-            input_connections, output_properties):
+            input_connections, output_properties, resources=None):
         raise NotImplementedError()
 
 
@@ -51,7 +51,7 @@ class AdapterBase(IAdapter):
 
 
     def future_operation(self, parent_future_operation, input_connections,
-            output_properties):
+            output_properties, resources=None):
         return FutureOperation(
             operation_class=self.operation_class,
             input_connections=input_connections,
@@ -62,9 +62,9 @@ class AdapterBase(IAdapter):
             parent=parent_future_operation)
 
     def future_operations(self, parent_future_operation, input_connections,
-            output_properties):
+            output_properties, resources=None):
         return [self.future_operation(parent_future_operation,
-            input_connections, output_properties)]
+            input_connections, output_properties, resources=resources)]
 
 
 class NullAdapter(AdapterBase):
@@ -0,0 +1,85 @@
+from collections import OrderedDict
+
+import threading
+import time
+
+
+_MISSING = object()
+
+
+class LRUCache(object):
+    """
+    A bounded least-recently-used mapping.  Entries optionally expire <ttl>
+    seconds after they were set.  Lookups are counted in <hits> and
+    <misses>.  All operations are safe to call from several threads.
+    """
+    def __init__(self, max_size, ttl=None, clock=time.time):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._lookup(key) is not _MISSING
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._lookup(key)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            else:
+                self.hits += 1
+                return value
+
+    def set(self, key, value):
+        if self.max_size <= 0:
+            return
+
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, self._expiration_time())
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._entries),
+        }
+
+    def _expiration_time(self):
+        if self.ttl is None:
+            return None
+        return self.clock() + self.ttl
+
+    def _lookup(self, key):
+        entry = self._entries.pop(key, _MISSING)
+        if entry is _MISSING:
+            return _MISSING
+
+        value, expiration_time = entry
+        if expiration_time is not None and expiration_time <= self.clock():
+            return _MISSING
+
+        # re-insert to mark as most recently used
+        self._entries[key] = entry
+        return value
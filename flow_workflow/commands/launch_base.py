@@ -1,20 +1,28 @@
 from flow import exit_codes
 from flow.commands.base import CommandBase
+from flow.configuration.settings.injector import setting
 from flow.petri_net.builder import Builder
 from flow.service_locator import ServiceLocator
 from flow.util.exit import exit_process
 from flow.exit_codes import EXECUTE_ERROR
 from flow_workflow import factory
+from flow_workflow.compiled_workflow import CompiledWorkflow
+from flow_workflow.compiled_workflow import CompiledWorkflowCache
+from flow_workflow.compiled_workflow import cache_key
 from flow_workflow.completion import MonitoringCompletionHandler
 from flow_workflow.entities.workflow.adapters import WorkflowAdapter
 from flow_workflow.future_operation import ForeignFutureOperation
 from flow_workflow.future_operation import NullFutureOperation
+from flow_workflow.future_operation import save_operations
 from flow_workflow.historian.operation_data import OperationData
 from flow_workflow.parallel_id import ParallelIdentifier
+from flow_workflow.profiling import PhaseTimer
+from flow_workflow.profiling import RedisCommandCounter
 from lxml import etree
 from twisted.internet import defer
 
 import abc
+import cProfile
 import flow.interfaces
 import injector
 import json
@@ -29,7 +37,9 @@ LOG = logging.getLogger(__name__)
 @injector.inject(storage=flow.interfaces.IStorage,
         broker=flow.interfaces.IBroker,
         service_locator=ServiceLocator,
-        injector=injector.Injector)
+        injector=injector.Injector,
+        compiled_workflow_cache_dir=setting(
+            'workflow.compiled_workflow_cache_dir', None))
 class LaunchWorkflowCommandBase(CommandBase):
     def setup_completion_handler(self, net):
         declare_deferred = self.broker.declare_queue(net.key, durable=False,
@@ -70,6 +80,13 @@ class LaunchWorkflowCommandBase(CommandBase):
         parser.add_argument('--email', '-e',
                 help="If set, send notification emails to the given address")
 
+        parser.add_argument('--profile', action='store_true',
+                help="Report the time spent in each submission phase along "
+                     "with adapter, net and redis command counts")
+        parser.add_argument('--profile-output', default=None,
+                help="Write cProfile stats for the submission to this file "
+                     "(implies --profile)")
+
     @abc.abstractproperty
     def local_workflow(self):
         raise NotImplementedError()
@@ -84,22 +101,56 @@ class LaunchWorkflowCommandBase(CommandBase):
 
 
     def _execute(self, parsed_arguments):
+        timer = PhaseTimer()
+        profiler = None
+        redis_counter = None
+        profiling = bool(getattr(parsed_arguments, 'profile', False) or
+                getattr(parsed_arguments, 'profile_output', None))
+        if profiling:
+            redis_counter = RedisCommandCounter(self.storage)
+            redis_counter.install()
+            if parsed_arguments.profile_output:
+                profiler = cProfile.Profile()
+                profiler.enable()
+
         workflow, net, start_place = self.construct_net(parsed_arguments.xml,
-                parsed_arguments.inputs_file, parsed_arguments.resource_file)
+                parsed_arguments.inputs_file, parsed_arguments.resource_file,
+                timer=timer)
 
-        self.setup_services(net)
+        with timer.phase('setup_services'):
+            self.setup_services(net)
 
         if parsed_arguments.plan_id:
             net.set_constant('workflow_plan_id', parsed_arguments.plan_id)
 
         _execute_deferred = defer.Deferred()
+        timer.begin('start_net')
         start_deferred = self.start_net(net, start_place)
+        if profiling:
+            start_deferred.addBoth(self._report_profile, timer=timer,
+                    redis_counter=redis_counter, profiler=profiler,
+                    profile_output=parsed_arguments.profile_output)
         start_deferred.addCallback(self._on_net_started,
                 parsed_arguments=parsed_arguments, workflow=workflow, net=net,
                 _execute_deferred=_execute_deferred)
         start_deferred.addErrback(self._on_net_started_failed)
         return _execute_deferred
 
+    def _report_profile(self, result, timer, redis_counter, profiler,
+            profile_output):
+        timer.end('start_net')
+
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile_output)
+            LOG.info('Wrote cProfile stats to %s', profile_output)
+
+        redis_counter.uninstall()
+        timer.count('redis_commands', redis_counter.total)
+        LOG.info('Submission profile:\n%s', timer.report())
+        LOG.debug('Redis commands by type: %s', redis_counter.counts)
+        return result
+
     def _on_net_started(self, _callback, parsed_arguments, workflow, net,
             _execute_deferred):
         results_deferred = self.wait_for_results(net=net,
@@ -116,7 +167,7 @@ class LaunchWorkflowCommandBase(CommandBase):
 
         if block:
             if self.complete():
-                self.write_outputs(net, workflow.child_adapter.operation_id,
+                self.write_outputs(net, workflow.child_operation_id,
                         workflow.output_properties,
                         parsed_arguments.outputs_file)
 
@@ -153,19 +204,27 @@ class LaunchWorkflowCommandBase(CommandBase):
         else:
             return False
 
-    def construct_net(self, xml_filename, inputs_filename, resources_filename):
-        xml = load_xml(xml_filename)
-        inputs = load_inputs(inputs_filename)
-        resources = load_resources(resources_filename)
+    def construct_net(self, xml_filename, inputs_filename, resources_filename,
+            timer=None):
+        if timer is None:
+            timer = PhaseTimer()
 
-        workflow = WorkflowAdapter(xml, inputs,
-                local_workflow=self.local_workflow)
+        with timer.phase('load_inputs'):
+            inputs = load_inputs(inputs_filename)
+            resources = load_resources(resources_filename)
 
-        future_net = workflow.future_net(resources)
+        workflow = self.compiled_workflow(xml_filename, inputs, resources,
+                timer)
+        future_net = workflow.future_net
+        timer.count('future_nets', count_future_nets(future_net))
 
         # XXX Update builder to use injector
         builder = Builder(self.storage)
-        stored_net = builder.store(future_net, self.variables, self.constants)
+        with timer.phase('builder_store'):
+            stored_net = builder.store(future_net, self.variables,
+                    self.constants)
+        timer.count('places', len(builder.future_places))
+        timer.count('transitions', len(builder.future_transitions))
         LOG.info('Created net with key (%s)', stored_net.key)
 
         if self.operation_data:
@@ -175,17 +234,52 @@ class LaunchWorkflowCommandBase(CommandBase):
         else:
             parent_future_op = NullFutureOperation()
 
-        future_operations = workflow.future_operations(parent_future_op,
-                input_connections=None, output_properties=None)
+        with timer.phase('future_operations'):
+            future_operations = workflow.future_operations(parent_future_op)
+        timer.count('operations', len(future_operations))
 
-        for future_operation in future_operations:
-            future_operation.save(stored_net)
-        workflow.store_inputs(stored_net)
+        with timer.phase('save_operations'):
+            save_operations(stored_net, future_operations,
+                    variables=workflow.input_variables(inputs))
 
         start_place_index = builder.future_places[future_net.start_place]
 
         return workflow, stored_net, start_place_index
 
+    def compiled_workflow(self, xml_filename, inputs, resources, timer):
+        """
+        Build the CompiledWorkflow for <xml_filename>, or load it from the
+        compiled workflow cache when one is configured.
+        """
+        cache = None
+        if self.compiled_workflow_cache_dir:
+            cache = CompiledWorkflowCache(self.compiled_workflow_cache_dir)
+            with timer.phase('load_compiled_workflow'):
+                key = cache_key(xml_filename, input_names=inputs.keys(),
+                        resources=resources,
+                        local_workflow=self.local_workflow)
+                compiled_workflow = cache.get(key)
+            if compiled_workflow is not None:
+                LOG.debug('Using cached compiled workflow %s', key)
+                timer.count('adapters', 0)
+                return compiled_workflow
+
+        with timer.phase('load_xml'):
+            xml = load_xml(xml_filename)
+
+        adapters_before = factory.adapters_created()
+        with timer.phase('compile_workflow'):
+            workflow = WorkflowAdapter(xml, inputs,
+                    local_workflow=self.local_workflow)
+            compiled_workflow = CompiledWorkflow.compile(workflow, resources)
+        timer.count('adapters', factory.adapters_created() - adapters_before)
+
+        if cache is not None:
+            with timer.phase('store_compiled_workflow'):
+                cache.set(key, compiled_workflow)
+
+        return compiled_workflow
+
     def write_outputs(self, net, operation_id, output_properties, outputs_file):
         if outputs_file:
             op = factory.load_operation(net=net, operation_id=operation_id)
@@ -243,6 +337,23 @@ def load_inputs(filename):
     return inputs
 
 
+def count_future_nets(future_net):
+    """
+    The number of future nets in the tree rooted at <future_net>.
+    """
+    count = 0
+    stack = [future_net]
+    seen = set()
+    while stack:
+        net = stack.pop()
+        if id(net) in seen:
+            continue
+        seen.add(id(net))
+        count += 1
+        stack.extend(getattr(net, 'subnets', ()))
+    return count
+
+
 def load_resources(filename):
     resources = {}
     if filename:
@@ -0,0 +1,193 @@
+from flow_workflow import io
+from flow_workflow.future_operation import NullFutureOperation
+from flow_workflow.parallel_id import ParallelIdentifier
+
+import cPickle
+import copy
+import hashlib
+import json
+import logging
+import os
+import stat
+import tempfile
+
+
+LOG = logging.getLogger(__name__)
+
+
+# bump when the pickled contents of CompiledWorkflow change
+CACHE_FORMAT_VERSION = 1
+
+
+class CompiledWorkflow(object):
+    """
+    Everything submitting a workflow builds that depends only on the xml,
+    the resources and the names of the inputs: the future net and the future
+    operations.  Input values are supplied per run.
+    """
+    def __init__(self, future_net, future_operations, root_operation,
+            input_storage_operation_id, child_operation_id,
+            output_properties):
+        self.future_net = future_net
+        self._future_operations = future_operations
+        self._root_operation = root_operation
+        self.input_storage_operation_id = input_storage_operation_id
+        self.child_operation_id = child_operation_id
+        self.output_properties = output_properties
+
+    @classmethod
+    def compile(cls, workflow, resources):
+        root_operation = NullFutureOperation()
+        future_net = workflow.future_net(resources)
+        future_operations = workflow.future_operations(root_operation,
+                input_connections=None, output_properties=None,
+                resources=resources)
+
+        return cls(future_net=future_net,
+                future_operations=future_operations,
+                root_operation=root_operation,
+                input_storage_operation_id=
+                    workflow.inputs_storage_adapter.operation_id,
+                child_operation_id=workflow.child_adapter.operation_id,
+                output_properties=workflow.output_properties)
+
+    def future_operations(self, parent_future_operation):
+        """
+        The future operations, with the top level ones parented to
+        <parent_future_operation>.
+        """
+        result = []
+        for fop in self._future_operations:
+            if fop.parent is self._root_operation:
+                fop = copy.copy(fop)
+                fop.parent = parent_future_operation
+                parent_future_operation.add_child(fop)
+            result.append(fop)
+        return result
+
+    def input_variables(self, inputs):
+        """
+        The net variables holding <inputs>, so they can be written together
+        with the operations.  The input storage operation is a
+        DirectStorageOperation, so inputs are stored under its own id.
+        """
+        return io.output_variables(dict(
+            ((self.input_storage_operation_id, name), value)
+            for name, value in inputs.iteritems()),
+            parallel_id=ParallelIdentifier())
+
+
+def cache_key(xml_filename, input_names, resources, local_workflow):
+    digest = hashlib.sha1()
+    with open(xml_filename) as f:
+        digest.update(f.read())
+    digest.update(json.dumps({
+        'format_version': CACHE_FORMAT_VERSION,
+        'code_version': _code_version(),
+        'input_names': sorted(input_names),
+        'resources': resources,
+        'local_workflow': bool(local_workflow),
+    }, sort_keys=True))
+    return digest.hexdigest()
+
+
+_CODE_VERSION = None
+
+
+def _code_version():
+    """
+    The latest modification time of this package's modules, so upgrading
+    flow_workflow invalidates cached workflows.
+    """
+    global _CODE_VERSION
+    if _CODE_VERSION is None:
+        package_dir = os.path.dirname(os.path.abspath(__file__))
+        latest = 0
+        for dirpath, dirnames, filenames in os.walk(package_dir):
+            for filename in filenames:
+                if filename.endswith('.py'):
+                    latest = max(latest, os.path.getmtime(
+                        os.path.join(dirpath, filename)))
+        _CODE_VERSION = latest
+    return _CODE_VERSION
+
+
+class CompiledWorkflowCache(object):
+    """
+    Stores pickled CompiledWorkflows in a directory of the current user
+    under <directory>, one file per cache key.  Unreadable or unwritable
+    entries are logged and treated as misses.
+
+    Unpickling runs code, so entries are only read when both the user's
+    directory and the file belong to the current user and nobody else can
+    write to them.
+    """
+    def __init__(self, directory):
+        self.directory = os.path.join(directory, str(os.getuid()))
+
+    def _path(self, key):
+        return os.path.join(self.directory, '%s.pickle' % key)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            if not _is_private(os.lstat(self.directory), stat.S_ISDIR):
+                LOG.warning('Not using compiled workflow cache %s: it must '
+                        'be a directory only its owner can write to',
+                        self.directory)
+                return None
+            fd = os.open(path, os.O_RDONLY | getattr(os, 'O_NOFOLLOW', 0))
+        except OSError:
+            return None
+
+        with os.fdopen(fd, 'rb') as f:
+            file_stat = os.fstat(f.fileno())
+            if not (_is_private(file_stat, stat.S_ISREG) and
+                    file_stat.st_nlink == 1):
+                LOG.warning('Ignoring compiled workflow %s: it must be a '
+                        'file only its owner can write to', path)
+                return None
+
+            try:
+                return cPickle.load(f)
+            except Exception:
+                LOG.warning('Ignoring unreadable compiled workflow %s',
+                        path, exc_info=True)
+                return None
+
+    def set(self, key, compiled_workflow):
+        try:
+            data = cPickle.dumps(compiled_workflow, cPickle.HIGHEST_PROTOCOL)
+        except Exception:
+            LOG.warning('Could not pickle compiled workflow, not caching it',
+                    exc_info=True)
+            return
+
+        try:
+            if not os.path.isdir(self.directory):
+                # the configured directory may be shared by several users
+                parent = os.path.dirname(self.directory)
+                if not os.path.isdir(parent):
+                    os.makedirs(parent)
+                os.mkdir(self.directory, 0700)
+            if not _is_private(os.lstat(self.directory), stat.S_ISDIR):
+                LOG.warning('Not writing compiled workflow to %s: it must '
+                        'be a directory only its owner can write to',
+                        self.directory)
+                return
+            # mkstemp creates the file readable and writable by its owner only
+            fd, temp_path = tempfile.mkstemp(dir=self.directory,
+                    suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            # rename is atomic, so concurrent submissions never read a
+            # partial file
+            os.rename(temp_path, self._path(key))
+        except (IOError, OSError):
+            LOG.warning('Could not write compiled workflow to %s',
+                    self.directory, exc_info=True)
+
+
+def _is_private(file_stat, is_type):
+    return (is_type(file_stat.st_mode) and file_stat.st_uid == os.getuid()
+            and not file_stat.st_mode & (stat.S_IWGRP | stat.S_IWOTH))
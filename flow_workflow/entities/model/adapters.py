@@ -127,14 +127,17 @@ class ModelAdapter(adapter_base.ParallelXMLAdapterBase):
                 operation_id=self.operation_id)
 
     def future_operations(self, parent_future_operation,
-            input_connections, output_properties):
+            input_connections, output_properties, resources=None):
+        resources = resources or {}
         model_future_operation = self.future_operation(parent_future_operation,
-                input_connections, output_properties)
+                input_connections, output_properties, resources=resources)
 
+        child_resources = resources.get('children', {})
         result = [model_future_operation]
         for child in self.children:
             result.extend(child.future_operations(model_future_operation,
                 self.child_input_connections(child.name, input_connections),
-                self.child_output_properties(child.name, output_properties)))
+                self.child_output_properties(child.name, output_properties),
+                resources=child_resources.get(child.name, {})))
 
         return result
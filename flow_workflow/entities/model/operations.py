@@ -2,6 +2,9 @@ from flow_workflow import operation_base
 
 
 class InputConnectorOperation(operation_base.PassThroughOperation):
+    def input_source(self, name):
+        return self.parent.input_source(name)
+
     def load_input(self, name, parallel_id):
         return self.parent.load_input(name, parallel_id)
 
@@ -12,6 +15,12 @@ class ModelOperation(operation_base.Operation):
     def output_connector(self):
         return self.child_named('output connector')
 
+    def output_source(self, name):
+        return self.output_connector.output_source(name)
+
+    def output_destination(self, name):
+        return self.output_connector.output_destination(name)
+
     def load_output(self, name, parallel_id):
         return self.output_connector.load_output(name, parallel_id)
 
@@ -1,4 +1,5 @@
 from flow.petri_net.actions.base import BasicActionBase
+from flow_workflow.net_constants import forget_constants
 
 
 class NotificationAction(BasicActionBase):
@@ -7,5 +8,7 @@ class NotificationAction(BasicActionBase):
     def execute(self, net, color_descriptor, active_tokens, service_interfaces):
         deferred = service_interfaces['workflow_completion'].notify(
                 net, status=self.args['status'])
+        # the net expires once the workflow is done
+        forget_constants(net.key)
         return map(net.token, active_tokens), deferred
 
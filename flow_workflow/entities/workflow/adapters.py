@@ -1,5 +1,4 @@
 from flow_workflow.entities.workflow.future_nets import WorkflowNet
-from flow_workflow.parallel_id import ParallelIdentifier
 from flow_workflow.adapter_base import AdapterBase
 import flow_workflow.factory
 
@@ -32,12 +31,6 @@ class WorkflowAdapter(AdapterBase):
     def name(self):
         return 'Workflow'
 
-    def store_inputs(self, net):
-        input_storage_operation = flow_workflow.factory.load_operation(net,
-                self.inputs_storage_adapter.operation_id)
-        input_storage_operation.store_outputs(self.inputs,
-                parallel_id=ParallelIdentifier())
-
     @property
     def input_connections(self):
         return {
@@ -64,11 +57,11 @@ class WorkflowAdapter(AdapterBase):
         return WorkflowNet(self.child_adapter_future_net(resources))
 
     def future_operation(self, parent_future_operation, input_connections,
-            output_properties):
+            output_properties, resources=None):
         return parent_future_operation
 
     def future_operations(self, parent_future_operation,
-            input_connections, output_properties):
+            input_connections, output_properties, resources=None):
         return self.inputs_storage_adapter.future_operations(
                 self.future_operation(parent_future_operation,
                     input_connections, output_properties),
@@ -78,4 +71,5 @@ class WorkflowAdapter(AdapterBase):
                             self.future_operation(parent_future_operation,
                                 input_connections, output_properties),
                             self.input_connections,
-                            self.output_properties)
+                            self.output_properties,
+                            resources=resources)
@@ -1,4 +1,6 @@
 from flow.util.containers import head
+from flow_workflow import io
+from flow_workflow.cache import LRUCache
 import pkg_resources
 import re
 import logging
@@ -8,6 +10,12 @@ LOG = logging.getLogger(__name__)
 
 _NEXT_OPERATION_ID = -1
 
+# Operation dicts do not change once FutureOperation.save has written them,
+# so they are shared by every load_operation call in the process.
+OPERATION_CACHE_SIZE = 10000
+_OPERATION_DICTS = LRUCache(max_size=OPERATION_CACHE_SIZE)
+_OPERATION_CLASSES = {}
+
 
 def adapter(operation_type, *args, **kwargs):
     global _NEXT_OPERATION_ID
@@ -23,6 +31,13 @@ def adapter(operation_type, *args, **kwargs):
     return obj
 
 
+def adapters_created():
+    """
+    The number of adapters created by this process so far.
+    """
+    return _NEXT_OPERATION_ID + 1
+
+
 def adapter_from_xml(xml, *args, **kwargs):
     return adapter(get_operation_type(xml), *args, xml=xml, **kwargs)
 
@@ -38,17 +53,65 @@ def sanitize_operation_type(operation_type_string):
 
 
 def load_operation(net, operation_id):
-    operation_dict = net.variables[operation_variable_name(operation_id)]
+    operation_dict = dict(_operation_dict(net, operation_id))
     LOG.debug('Loading operation %s using dict: %s',
             operation_id, operation_dict)
 
-    ep = head(pkg_resources.iter_entry_points(
-        'flow_workflow.operations', operation_dict.pop('_class')))
-    cls = ep.load()
+    cls = operation_class(operation_dict.pop('_class'))
     LOG.debug('Loaded operation %s (%r) from net %s: %s',
             operation_id, cls, net.key, operation_dict)
     return cls(net=net, **operation_dict)
 
 
+def operation_class(class_name):
+    cls = _OPERATION_CLASSES.get(class_name)
+    if cls is None:
+        ep = head(pkg_resources.iter_entry_points(
+            'flow_workflow.operations', class_name))
+        cls = ep.load()
+        _OPERATION_CLASSES[class_name] = cls
+    return cls
+
+
+def prefetch_operations(net, operation_ids):
+    """
+    Fetch the dicts of every operation in <operation_ids> that is not cached
+    yet with a single HMGET, so that loading them later needs no round trip.
+    """
+    missing_ids = set(int(operation_id) for operation_id in operation_ids
+            if (net.key, int(operation_id)) not in _OPERATION_DICTS)
+    if not missing_ids:
+        return
+
+    names = dict((operation_variable_name(operation_id), operation_id)
+            for operation_id in missing_ids)
+    for name, operation_dict in io.get_variables(net, names).iteritems():
+        _OPERATION_DICTS.set((net.key, names[name]), operation_dict)
+
+
+def cached_operation_dict(net, operation_id):
+    """
+    The dict of operation <operation_id> if it is cached, otherwise None.
+    """
+    return _OPERATION_DICTS.get((net.key, int(operation_id)))
+
+
+def cache_operation_dict(net, operation_id, operation_dict):
+    _OPERATION_DICTS.set((net.key, int(operation_id)), operation_dict)
+
+
+def forget_operation(net_key, operation_id):
+    _OPERATION_DICTS.discard((net_key, int(operation_id)))
+
+
+def _operation_dict(net, operation_id):
+    cache_key = (net.key, int(operation_id))
+    operation_dict = _OPERATION_DICTS.get(cache_key)
+    if operation_dict is None:
+        operation_dict = net.variables[operation_variable_name(operation_id)]
+        _OPERATION_DICTS.set(cache_key, operation_dict)
+    return operation_dict
+
+
 def operation_variable_name(operation_id):
     return '_wf_op_%s' % operation_id
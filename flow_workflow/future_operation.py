@@ -1,4 +1,4 @@
-from flow_workflow.factory import operation_variable_name
+from flow_workflow.factory import forget_operation, operation_variable_name
 
 
 class FutureOperation(object):
@@ -30,6 +30,7 @@ class FutureOperation(object):
     def save(self, net):
         net.variables[self._operation_variable_name] = self.as_dict(
                 default_net_key=net.key)
+        forget_operation(net.key, self.operation_id)
 
     def as_dict(self, default_net_key):
         result = {
@@ -45,6 +46,131 @@ class FutureOperation(object):
         return result
 
 
+def save_operations(net, future_operations, variables=None):
+    """
+    Save <future_operations> to <net> with a single HMSET.  Any extra
+    <variables> are written in the same call.  Operation inputs are resolved
+    here, see input_source_tables.
+    """
+    tables = input_source_tables(future_operations)
+    values = {}
+    for fop in future_operations:
+        operation_dict = fop.as_dict(default_net_key=net.key)
+        if fop.operation_id in tables:
+            operation_dict['input_sources'] = tables[fop.operation_id]
+        values[fop._operation_variable_name] = operation_dict
+    if variables:
+        values.update(variables)
+
+    if values:
+        net.variables.update(values)
+    for fop in future_operations:
+        forget_operation(net.key, fop.operation_id)
+
+
+def input_source_tables(future_operations):
+    """
+    Resolve the inputs of <future_operations>, which are all stored in the
+    same net, to the direct storage outputs they load from.  Returns
+    {operation_id: {input_name: (operation_id, property_name) or None}},
+    matching what Operation.input_source finds one operation at a time.
+
+    Operations with an input that leads outside <future_operations> get no
+    table and resolve their inputs at run time.
+    """
+    resolver = _InputSourceResolver(future_operations)
+    tables = {}
+    for fop in future_operations:
+        input_connections = fop.kwargs.get('input_connections')
+        if fop.operation_class == 'input_connector' or not input_connections:
+            continue
+
+        table = {}
+        try:
+            for property_dict in input_connections.itervalues():
+                for name in property_dict:
+                    try:
+                        table[name] = resolver.input_source(fop, name)
+                    except _MissingInput:
+                        # Operation.load_inputs skips missing inputs too
+                        pass
+        except _Unresolvable:
+            continue
+        tables[fop.operation_id] = table
+
+    return tables
+
+
+class _MissingInput(Exception):
+    pass
+
+
+class _Unresolvable(Exception):
+    pass
+
+
+class _InputSourceResolver(object):
+    """
+    Mirrors Operation.input_source and Operation.output_source for each
+    operation class, on future operations.
+    """
+    def __init__(self, future_operations):
+        self.operations = dict((fop.operation_id, fop)
+                for fop in future_operations)
+        self._output_sources = {}
+        self._resolving = set()
+
+    def _operation(self, operation_id):
+        try:
+            return self.operations[int(operation_id)]
+        except KeyError:
+            raise _Unresolvable(operation_id)
+
+    def input_source(self, fop, name):
+        if fop.operation_class == 'input_connector':
+            if not fop.parent.operation_id:
+                # Operation.parent is a NullOperation
+                return None
+            return self.input_source(
+                    self._operation(fop.parent.operation_id), name)
+
+        input_connections = fop.kwargs.get('input_connections') or {}
+        for source_id, property_dict in input_connections.iteritems():
+            if name in property_dict:
+                return self.output_source(self._operation(source_id),
+                        property_dict[name])
+        raise _MissingInput(name)
+
+    def output_source(self, fop, name):
+        key = (fop.operation_id, name)
+        if key not in self._output_sources:
+            if key in self._resolving:
+                raise _Unresolvable(key)
+            self._resolving.add(key)
+            try:
+                self._output_sources[key] = self._output_source(fop, name)
+            finally:
+                self._resolving.discard(key)
+        return self._output_sources[key]
+
+    def _output_source(self, fop, name):
+        operation_class = fop.operation_class
+        if operation_class == 'direct_storage':
+            return fop.operation_id, name
+        elif operation_class == 'null':
+            return None
+        elif operation_class in ('pass_through', 'input_connector'):
+            return self.input_source(fop, name)
+        elif operation_class == 'model':
+            output_connector = fop._children.get('output connector')
+            if output_connector is None:
+                raise _Unresolvable(fop.operation_id)
+            return self.output_source(
+                    self._operation(output_connector.operation_id), name)
+        else:
+            raise _Unresolvable(operation_class)
+
+
 class NullFutureOperation(object):
     def __init__(self, *args, **kwargs):
         pass
@@ -2,9 +2,11 @@ from abc import abstractmethod
 from flow.petri_net.actions.base import BasicActionBase
 from flow.util.containers import head
 from flow_workflow import factory
+from flow_workflow.historian import summary
+from flow_workflow.historian.context import HistorianContext
 from flow_workflow.historian.operation_data import OperationData
+from flow_workflow.net_constants import get_constant
 from flow_workflow.parallel_id import ParallelIdentifier
-from time import localtime, strftime
 from twisted.internet import defer
 
 import logging
@@ -13,9 +15,15 @@ import logging
 LOG = logging.getLogger(__name__)
 
 
+FINAL_STATUSES = frozenset(['crashed', 'done'])
+
+
 class HistorianActionBase(BasicActionBase):
     required_args = ['operation_id']
 
+    # whether _execute reports on the children of the operation
+    reports_children = False
+
     def execute(self, net, color_descriptor, active_tokens, service_interfaces):
         if env_is_perl_true(net, 'UR_DBI_NO_COMMIT'):
             LOG.debug('UR_DBI_NO_COMMIT is set, not updating status.')
@@ -23,13 +31,16 @@ class HistorianActionBase(BasicActionBase):
 
         historian = service_interfaces['workflow_historian']
 
-        token_data = net.token(head(active_tokens)).data.value
-        workflow_data = token_data.get('workflow_data', {})
+        context = HistorianContext.prefetch(net, head(active_tokens),
+                operation_id=self.args['operation_id'],
+                include_children=self.reports_children,
+                fetch_time=self.needs_timestamp)
+        workflow_data = context.token_data.get('workflow_data', {})
         parallel_id = ParallelIdentifier(workflow_data.get('parallel_id', []))
 
         deferred = self._execute(historian=historian, net=net,
                 color_descriptor=color_descriptor, parallel_id=parallel_id,
-                token_data=token_data)
+                context=context)
 
         return map(net.token, active_tokens), deferred
 
@@ -44,24 +55,38 @@ class HistorianActionBase(BasicActionBase):
                 result[arg] = self_args[arg]
         return result
 
+    @property
+    def needs_timestamp(self):
+        return bool(self.args.get('calculate_start_time', False) or
+                self.args.get('calculate_end_time', False))
+
     @abstractmethod
     def _execute(self, historian, net, color_descriptor, parallel_id,
-            token_data):
+            context):
         raise NotImplementedError()
 
     def operation(self, net):
         return factory.load_operation(net, self.args['operation_id'])
 
+    @property
+    def status(self):
+        return self.args['status']
+
     def update_operation_status(self, historian, net, operation,
-            color_descriptor, parallel_id, token_data):
+            color_descriptor, parallel_id, context):
+        return historian.update(**self.operation_status_fields(net,
+            operation, color_descriptor, parallel_id, context))
+
+    def operation_status_fields(self, net, operation, color_descriptor,
+            parallel_id, context):
         operation_data = OperationData(net_key=operation.net_key,
                 operation_id=operation.operation_id,
                 color=color_descriptor.color)
         fields = {
                 'operation_data': operation_data.to_dict,
                 'name': operation.name,
-                'workflow_plan_id': net.constant('workflow_plan_id'),
-                'user_name': net.constant('user_name'),
+                'workflow_plan_id': get_constant(net, 'workflow_plan_id'),
+                'user_name': get_constant(net, 'user_name'),
                 }
 
         fields.update(self.message_args)
@@ -69,12 +94,13 @@ class HistorianActionBase(BasicActionBase):
             color_descriptor))
         fields.update(get_peer_fields(operation, parallel_id, color_descriptor))
 
-        fields.update(self.get_shell_command_fields(token_data))
+        fields.update(self.get_shell_command_fields(context))
         fields.update(self.get_log_fields(operation.log_manager, parallel_id))
 
-        return historian.update(**fields)
+        return fields
 
-    def get_shell_command_fields(self, token_data):
+    def get_shell_command_fields(self, context):
+        token_data = context.token_data
         fields = {}
         if 'job_id' in token_data:
             fields['dispatch_id'] = '%s%s' % (
@@ -82,10 +108,10 @@ class HistorianActionBase(BasicActionBase):
                     token_data['job_id'])
 
         if self.args.get('calculate_start_time', False):
-            fields['start_time'] = self.timestamp
+            fields['start_time'] = context.timestamp
 
         if self.args.get('calculate_end_time', False):
-            fields['end_time'] = self.timestamp
+            fields['end_time'] = context.timestamp
 
         if 'exit_code' in token_data:
             fields['exit_code'] = token_data['exit_code']
@@ -101,14 +127,6 @@ class HistorianActionBase(BasicActionBase):
 
         return fields
 
-    @property
-    def timestamp(self):
-        now = self.connection.time()
-        # convert (sec, microsec) from redis to floating point sec
-        now = now[0] + now[1] * 1e-6
-
-        return strftime("%Y-%m-%d %H:%M:%S", localtime(now)).upper()
-
 
 def get_parent_fields(operation, parallel_id, color_descriptor):
     if operation.parent.operation_id:
@@ -142,33 +160,102 @@ def get_peer_fields(operation, parallel_id, color_descriptor):
 
 class UpdateChildrenStatuses(HistorianActionBase):
     required_args = ['operation_id', 'status']
+    reports_children = True
 
     def _execute(self, historian, net, color_descriptor, parallel_id,
-            token_data):
-        deferreds = []
+            context):
+        if (self.status not in summary.RECORDED_STATUSES and
+                summary.summary_for(net, parallel_id) is not None):
+            return defer.succeed(None)
+
         operation = self.operation(net)
-        for child_operation in operation.iter_children():
-            deferred = self.update_operation_status(historian, net,
-                    child_operation, color_descriptor, parallel_id,
-                    token_data=token_data)
-            deferreds.append(deferred)
+        updates = [self.operation_status_fields(net, child_operation,
+            color_descriptor, parallel_id, context=context)
+            for child_operation in operation.iter_children()]
 
-        return defer.gatherResults(deferreds)
+        return historian.update_many(updates)
 
 
 class UpdateOperationStatus(HistorianActionBase):
     required_args = ['operation_id', 'status']
 
     def _execute(self, historian, net, color_descriptor, parallel_id,
-            token_data):
+            context):
         operation = self.operation(net)
+        updates = []
+
+        parallel_by_summary = summary.summary_for(net, parallel_id)
+        if (parallel_by_summary is None or
+                self.status in summary.RECORDED_STATUSES):
+            updates.append(self.operation_status_fields(net, operation,
+                color_descriptor, parallel_id, context=context))
+
+        if (parallel_by_summary is not None and
+                operation.operation_id == parallel_by_summary.operation_id):
+            # a summarized child of the parallel-by operation
+            summary_due = parallel_by_summary.record(net, self.status)
+            if summary_due or updates:
+                updates.append(self.summary_fields(net, operation,
+                    summary.counts(net, operation.operation_id,
+                        parallel_by_summary.parallel_id),
+                    color=color_descriptor.group.parent_color,
+                    status='running'))
+
+        elif self.finishes_summarized_parallel_by(operation, parallel_id):
+            status_counts = summary.counts(net, operation.operation_id,
+                    parallel_id)
+            if status_counts:
+                updates.append(self.summary_fields(net, operation,
+                    status_counts, color=color_descriptor.color,
+                    status=self.status))
+
+        if not updates:
+            return defer.succeed(None)
+        elif len(updates) == 1:
+            return historian.update(**updates[0])
+        else:
+            return historian.update_many(updates)
+
+    def finishes_summarized_parallel_by(self, operation, parallel_id):
+        return (operation.parallel_by_summarize_threshold is not None and
+                not parallel_id.refers_to(operation) and
+                self.status in FINAL_STATUSES)
+
+    def summary_fields(self, net, operation, status_counts, color, status):
+        """
+        The fields of the summary row showing <status_counts> for the
+        parallel-by <operation> whose own row has <color>.  The summary row
+        is a peer of that row.
+        """
+        fields = {
+                'operation_data': OperationData(net_key=operation.net_key,
+                    operation_id=operation.operation_id,
+                    color=summary.summary_color(color)).to_dict,
+                'peer_operation_data': OperationData(
+                    net_key=operation.net_key,
+                    operation_id=operation.operation_id,
+                    color=color).to_dict,
+                'name': summary.summarized_name(operation.name,
+                    status_counts),
+                'status': status,
+                'is_summary': True,
+                'workflow_plan_id': get_constant(net, 'workflow_plan_id'),
+                'user_name': get_constant(net, 'user_name'),
+                }
 
-        return self.update_operation_status(historian, net, operation,
-                color_descriptor, parallel_id, token_data=token_data)
+        if operation.parent.operation_id:
+            if operation.parent_is_foreign:
+                fields['is_subflow'] = True
+            fields['parent_operation_data'] = OperationData(
+                    net_key=operation.parent.net_key,
+                    operation_id=operation.parent.operation_id,
+                    color=color).to_dict
+
+        return fields
 
 
 def env_is_perl_true(net, varname):
-    env = net.constant('environment', {})
+    env = get_constant(net, 'environment', {})
     var = env.get(varname)
     return var_is_perl_true(var)
 
@@ -0,0 +1,73 @@
+from twisted.internet import defer, reactor
+from twisted.python.failure import Failure
+
+import logging
+
+
+LOG = logging.getLogger(__name__)
+
+
+class UpdateBatcher(object):
+    """
+    Collects items until either <batch_size> items are pending or
+    <batch_window> seconds have passed since the first one arrived, then
+    hands them all to <write_batch> at once.
+
+    <write_batch> is called with a list of items and must return (or return a
+    deferred that fires with) a list of per-item results.  Results that are
+    Failure instances errback the deferred returned by the corresponding
+    add() call; everything else is used to callback it.
+    """
+    def __init__(self, write_batch, batch_size, batch_window, clock=reactor):
+        self.write_batch = write_batch
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.clock = clock
+
+        self._pending = []
+        self._delayed_flush = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, item):
+        deferred = defer.Deferred()
+        self._pending.append((item, deferred))
+
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+        elif self._delayed_flush is None:
+            self._delayed_flush = self.clock.callLater(self.batch_window,
+                    self.flush)
+
+        return deferred
+
+    def flush(self):
+        if self._delayed_flush is not None:
+            if self._delayed_flush.active():
+                self._delayed_flush.cancel()
+            self._delayed_flush = None
+
+        pending, self._pending = self._pending, []
+        if not pending:
+            return defer.succeed(None)
+
+        LOG.debug('Flushing batch of %d items', len(pending))
+        items = [item for item, _ in pending]
+        write_deferred = defer.maybeDeferred(self.write_batch, items)
+        write_deferred.addCallbacks(self._on_written, self._on_failed,
+                callbackArgs=(pending,), errbackArgs=(pending,))
+        return write_deferred
+
+    def _on_written(self, results, pending):
+        for (item, deferred), result in zip(pending, results):
+            if isinstance(result, Failure):
+                deferred.errback(result)
+            else:
+                deferred.callback(result)
+
+    def _on_failed(self, failure, pending):
+        LOG.error('Failed to write batch of %d items: %s',
+                len(pending), failure.getErrorMessage())
+        for item, deferred in pending:
+            deferred.errback(failure)
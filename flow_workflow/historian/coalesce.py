@@ -0,0 +1,83 @@
+from collections import OrderedDict
+
+
+class UpdateCoalescer(object):
+    """
+    Keeps at most one pending update per OperationData and Status.
+
+    A later update with the same status as a pending one is folded into it:
+    it only fills in the fields the pending update leaves empty (summary
+    rows take the later fields, see should_overwrite).  Updates with
+    different statuses are kept apart, because whether each of them
+    overwrites the stored row or only fills its empty columns depends on
+    the status already stored.  Pending updates are written in the order
+    their (operation, status) was first seen.
+
+    Only updates written together are coalesced, i.e. with the historian's
+    batch_size greater than one or in an UpdateBatchMessage.
+    """
+    def __init__(self):
+        self._updates = OrderedDict()
+        self.received = 0
+
+    def __len__(self):
+        return len(self._updates)
+
+    @property
+    def coalesced(self):
+        """
+        The number of received updates that were folded into another one.
+        """
+        return self.received - len(self._updates)
+
+    def add(self, update_info):
+        self.received += 1
+
+        key = (update_info['operation_data'], update_info['status'].index)
+        if key in self._updates:
+            self._updates[key] = merge_update_info(self._updates[key],
+                    update_info)
+        else:
+            self._updates[key] = dict(update_info)
+
+    def pop_all(self):
+        """
+        Return the pending updates in the order they were first seen and
+        reset the coalescer.
+        """
+        updates = self._updates.values()
+        self._updates = OrderedDict()
+        self.received = 0
+        return updates
+
+
+def coalesce(update_infos):
+    coalescer = UpdateCoalescer()
+    for update_info in update_infos:
+        coalescer.add(update_info)
+    return coalescer.pop_all()
+
+
+def should_overwrite(new_info, stored_status):
+    """
+    Whether the fields of <new_info> replace those of a row with
+    <stored_status>: only when its status is higher.  Summary rows are also
+    overwritten at an equal status, so that the counts of a running
+    parallel-by are refreshed.  An interim summary therefore never
+    replaces the final one, whatever order they arrive in.
+    """
+    new_status = new_info['status']
+    return (new_status.should_overwrite(stored_status) or
+            (bool(new_info.get('is_summary')) and new_status == stored_status))
+
+
+def merge_update_info(stored_info, new_info):
+    overwrite = should_overwrite(new_info, stored_info['status'])
+
+    result = dict(stored_info)
+    for name, value in new_info.iteritems():
+        if value is None:
+            continue
+        if result.get(name) is None or overwrite:
+            result[name] = value
+    return result
@@ -2,6 +2,7 @@ from flow.commands.service import ServiceCommand
 from flow.configuration.inject.broker import BrokerConfiguration
 from flow_workflow.configuration.inject.oltp import OLTPConfiguration
 from flow_workflow.historian import handler
+from flow_workflow.historian.partitions import partition_queue_name
 
 import logging
 
@@ -15,9 +16,41 @@ class WorkflowHistorianCommand(ServiceCommand):
             OLTPConfiguration,
     ]
 
-    def _setup(self, *args, **kwargs):
+    @staticmethod
+    def annotate_parser(parser):
+        ServiceCommand.annotate_parser(parser)
+        parser.add_argument('--partition', type=int, default=None,
+                help='Only consume updates for this partition of net keys '
+                     '(see workflow.historian.partitions)')
+        parser.add_argument('--batch-size', type=int, default=None,
+                help='Write up to this many updates in one transaction '
+                     '(default: workflow.historian.batch_size, which is 1). '
+                     'Updates to the same operation and status are only '
+                     'coalesced when this is greater than 1')
+
+    def _setup(self, parsed_arguments, *args, **kwargs):
+        update_handler = self.injector.get(handler.HistorianUpdateHandler)
+        if parsed_arguments.batch_size is not None:
+            update_handler.batch_size = parsed_arguments.batch_size
+        if update_handler.batch_size <= 1:
+            LOG.info('Writing historian updates one at a time, without '
+                    'coalescing them (see --batch-size)')
+
+        if parsed_arguments.partition is not None:
+            update_handler.queue_name = partition_queue_name(
+                    update_handler.queue_name, parsed_arguments.partition)
+            LOG.info('Consuming historian updates from partition %d (%s)',
+                    parsed_arguments.partition, update_handler.queue_name)
+
         self.handlers = [
-            self.injector.get(handler.HistorianUpdateHandler),
+            update_handler,
         ]
 
-        return ServiceCommand._setup(self, *args, **kwargs)
+        batch_handler = self.injector.get(handler.HistorianUpdateBatchHandler)
+        if batch_handler.queue_name:
+            if parsed_arguments.partition is not None:
+                batch_handler.queue_name = partition_queue_name(
+                        batch_handler.queue_name, parsed_arguments.partition)
+            self.handlers.append(batch_handler)
+
+        return ServiceCommand._setup(self, parsed_arguments, *args, **kwargs)
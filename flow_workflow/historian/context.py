@@ -0,0 +1,91 @@
+from flow_workflow import factory
+from time import localtime, strftime
+
+import json
+import logging
+
+
+LOG = logging.getLogger(__name__)
+
+
+class HistorianContext(object):
+    """
+    The redis state a historian action reads, fetched with one pipelined
+    round trip: the data of the active token, the redis time and the dicts
+    of the operations the action reports on that are not cached yet.
+
+    Operation dicts are handed to the factory cache, so the operations can
+    then be loaded without further reads.  Net constants come from the
+    process wide net_constants cache and are not fetched here.
+    """
+    def __init__(self, token_data, now=None):
+        self.token_data = token_data
+        self.now = now
+
+    @classmethod
+    def prefetch(cls, net, token_index, operation_id, include_children=False,
+            fetch_time=False):
+        connection = net.variables.connection
+        pipeline = connection.pipeline(transaction=False)
+
+        pipeline.hgetall(net.token(token_index).data.key)
+
+        operation_ids = _operation_ids_to_fetch(net, operation_id,
+                include_children)
+        if operation_ids:
+            pipeline.hmget(net.variables.key,
+                    [factory.operation_variable_name(i)
+                        for i in operation_ids])
+
+        if fetch_time:
+            pipeline.time()
+
+        results = iter(pipeline.execute())
+
+        token_data = dict((key, json.loads(value))
+                for key, value in next(results).iteritems())
+
+        if operation_ids:
+            for operation_id, raw in zip(operation_ids, next(results)):
+                if raw is not None:
+                    factory.cache_operation_dict(net, operation_id,
+                            json.loads(raw))
+
+        now = None
+        if fetch_time:
+            now = next(results)
+
+        return cls(token_data=token_data, now=now)
+
+    @property
+    def timestamp(self):
+        # convert (sec, microsec) from redis to floating point sec
+        now = self.now[0] + self.now[1] * 1e-6
+
+        return strftime("%Y-%m-%d %H:%M:%S", localtime(now)).upper()
+
+
+def _operation_ids_to_fetch(net, operation_id, include_children):
+    """
+    The ids of <operation_id> and of the operations in the same net that
+    reporting on it reads (its parent, and its children if
+    <include_children>) that are not cached.  The parent and children are
+    only known once the operation's own dict is cached, so the first report
+    on an operation loads them separately and caches them for later ones.
+    """
+    operation_dict = factory.cached_operation_dict(net, operation_id)
+    if operation_dict is None:
+        return [int(operation_id)]
+
+    related_ids = []
+    if (operation_dict.get('parent_operation_id') and
+            operation_dict.get('parent_net_key') == net.key):
+        related_ids.append(operation_dict['parent_operation_id'])
+
+    if include_children:
+        related_ids.extend(child_id for net_key, child_id
+                in operation_dict.get('children', {}).itervalues()
+                if net_key == net.key)
+
+    return [int(i) for i in related_ids
+            if factory.cached_operation_dict(net, i) is None]
@@ -1,14 +1,18 @@
+from collections import defaultdict
 from flow import exit_codes
 from flow.configuration.settings.injector import setting
 from flow.handler import Handler
 from flow.util.exit import exit_process
 from flow_workflow.historian import messages
+from flow_workflow.historian.batch import UpdateBatcher
 from flow_workflow.historian.operation_data import OperationData
 from flow_workflow.historian.oracle_exceptions import EXIT_ON
 from flow_workflow.historian.status import Status
 from flow_workflow.historian.storage import WorkflowHistorianStorage
+from flow_workflow.historian.workers import StorageWorkerPool
 from injector import inject
-from twisted.internet import defer
+from twisted.internet import defer, reactor
+from twisted.python.failure import Failure
 
 import logging
 
@@ -16,6 +20,10 @@ import logging
 LOG = logging.getLogger(__name__)
 
 
+LOST_DATABASE_MESSAGE = ("This historian cannot handle messages anymore, "
+        "because it lost access to Oracle... exiting.")
+
+
 @inject(storage=WorkflowHistorianStorage)
 class HistorianHandlerBase(Handler):
     def _handle_message(self, message):
@@ -24,15 +32,137 @@ class HistorianHandlerBase(Handler):
             return defer.succeed(None)
 
         except EXIT_ON:
-            LOG.exception("This historian cannot handle messages anymore, "
-                    "because it lost access to Oracle... exiting.")
+            LOG.exception(LOST_DATABASE_MESSAGE)
+            exit_process(exit_codes.EXECUTE_FAILURE)
+
+    def _check_database_failure(self, failure):
+        if failure.check(defer.FirstError):
+            sub_failure = failure.value.subFailure
+        else:
+            sub_failure = failure
+
+        if sub_failure.check(*EXIT_ON):
+            LOG.critical("%s\n%s", LOST_DATABASE_MESSAGE,
+                    sub_failure.getTraceback())
             exit_process(exit_codes.EXECUTE_FAILURE)
+        return failure
 
 
-@inject(queue_name=setting('workflow.historian.update_queue'))
+def _serialization_key(operation_data):
+    return (str(operation_data['net_key']), int(operation_data['operation_id']))
+
+
+@inject(queue_name=setting('workflow.historian.update_queue'),
+        batch_size=setting('workflow.historian.batch_size', 1),
+        batch_window=setting('workflow.historian.batch_window', 0.5),
+        worker_threads=setting('workflow.historian.worker_threads', 0))
 class HistorianUpdateHandler(HistorianHandlerBase):
+    """
+    With a batch_size greater than one, messages are collected for up to
+    batch_window seconds and written in a single transaction.  The deferred
+    for each message (and so its ack) only fires once that transaction has
+    committed, so the broker prefetch count should be at least batch_size.
+    Updates to the same operation and status are only coalesced within such
+    a batch (or an UpdateBatchMessage); with the default batch_size of one
+    every update is written as it arrives.
+
+    With worker_threads greater than zero, storage calls run on a thread
+    pool instead of in the reactor.  Updates to the same operation are
+    always written one after another; workflow.historian.pool_size should
+    be at least worker_threads.
+    """
     message_class = messages.UpdateMessage
 
+    _batcher = None
+    _worker_pool = None
+
+    def _handle_message(self, message):
+        if self.batch_size > 1:
+            return self.batcher.add(self._get_message_dict(message))
+
+        elif self.worker_threads > 0:
+            deferred = self.worker_pool.run(
+                    _serialization_key(message.operation_data),
+                    self._handle_historian_message, message)
+            deferred.addErrback(self._check_database_failure)
+            return deferred
+
+        else:
+            return HistorianHandlerBase._handle_message(self, message)
+
+    @property
+    def batcher(self):
+        if self._batcher is None:
+            self._batcher = UpdateBatcher(self._write_batch,
+                    batch_size=self.batch_size,
+                    batch_window=self.batch_window)
+            reactor.addSystemEventTrigger('before', 'shutdown',
+                    self._batcher.flush)
+        return self._batcher
+
+    @property
+    def worker_pool(self):
+        if self._worker_pool is None:
+            if self.worker_threads > getattr(self.storage, 'pool_size',
+                    self.worker_threads):
+                LOG.warning("Running %d storage threads with only %d "
+                        "database connections", self.worker_threads,
+                        self.storage.pool_size)
+            self._worker_pool = StorageWorkerPool(self.worker_threads)
+        return self._worker_pool
+
+    def _write_batch(self, message_dicts):
+        if self.worker_threads > 0:
+            deferred = self._write_batch_in_lanes(message_dicts)
+        else:
+            deferred = defer.maybeDeferred(self._write_batch_now,
+                    message_dicts)
+        deferred.addErrback(self._check_database_failure)
+        return deferred
+
+    def _write_batch_in_lanes(self, message_dicts):
+        lanes = defaultdict(list)
+        for index, message_dict in enumerate(message_dicts):
+            lane = self.worker_pool.lane(_serialization_key(
+                message_dict['operation_data'].to_dict))
+            lanes[lane].append(index)
+
+        lane_deferreds = []
+        for lane, indices in lanes.iteritems():
+            deferred = self.worker_pool.run_in_lane(lane,
+                    self._write_batch_now,
+                    [message_dicts[i] for i in indices])
+            deferred.addCallback(lambda results, indices=indices:
+                    zip(indices, results))
+            lane_deferreds.append(deferred)
+
+        result = defer.gatherResults(lane_deferreds, consumeErrors=True)
+        result.addCallback(_reassemble, len(message_dicts))
+        return result
+
+    def _write_batch_now(self, message_dicts):
+        try:
+            self.storage.update_many(message_dicts)
+            return [None] * len(message_dicts)
+
+        except EXIT_ON:
+            raise
+
+        except Exception:
+            LOG.exception("Failed to write batch of %d updates, "
+                    "retrying them one at a time.", len(message_dicts))
+            return map(self._write_single, message_dicts)
+
+    def _write_single(self, message_dict):
+        try:
+            self.storage.update(message_dict)
+        except EXIT_ON:
+            raise
+        except Exception:
+            LOG.exception("Failed to update %s",
+                    message_dict['operation_data'])
+            return Failure()
+
     def _handle_historian_message(self, message):
         message_dict = self._get_message_dict(message)
         LOG.debug("Updating [net_key='%s', operation_id='%s']: %r",
@@ -41,16 +171,51 @@ class HistorianUpdateHandler(HistorianHandlerBase):
         self.storage.update(message_dict)
 
     def _get_message_dict(self, message):
-        message_dict = message.to_dict()
+        return _prepare_message_dict(message.to_dict())
+
+
+@inject(queue_name=setting('workflow.historian.update_batch_queue', None))
+class HistorianUpdateBatchHandler(HistorianUpdateHandler):
+    """
+    Writes every update in an UpdateBatchMessage in a single transaction.
+    With worker_threads greater than zero the batch is split by worker lane,
+    one transaction per lane, to keep updates to an operation in order.  The
+    message fails if any of its updates could not be written.
+    """
+    message_class = messages.UpdateBatchMessage
+
+    def _handle_message(self, message):
+        message_dicts = [_prepare_message_dict(dict(update))
+                for update in message.updates]
+        LOG.debug("Updating batch of %d operations", len(message_dicts))
+
+        deferred = self._write_batch(message_dicts)
+        deferred.addCallback(_first_failure)
+        return deferred
+
+
+def _first_failure(results):
+    for result in results:
+        if isinstance(result, Failure):
+            return result
+
+
+def _prepare_message_dict(message_dict):
+    message_dict['status'] = Status(message_dict['status'])
 
-        message_dict['status'] = Status(message_dict['status'])
+    OPERATION_DATA_FIELDS = ['operation_data', 'parent_operation_data',
+            'peer_operation_data']
+    for field in OPERATION_DATA_FIELDS:
+        if field in message_dict:
+            message_dict[field] = OperationData.from_dict(
+                    message_dict[field])
 
-        OPERATION_DATA_FIELDS = ['operation_data', 'parent_operation_data',
-                'peer_operation_data']
-        for field in OPERATION_DATA_FIELDS:
-            if field in message_dict:
-                message_dict[field] = OperationData.from_dict(
-                        message_dict[field])
+    return message_dict
 
-        return message_dict
 
+def _reassemble(lane_results, size):
+    results = [None] * size
+    for indexed_results in lane_results:
+        for index, result in indexed_results:
+            results[index] = result
+    return results
@@ -28,9 +28,28 @@ class UpdateMessage(Message):
             'stderr': basestring,
 
             'exit_code': int,
+
+            # summary rows are also overwritten at an equal status, see
+            # flow_workflow.historian.coalesce.should_overwrite
+            'is_summary': bool,
     }
 
     def validate(self):
         Message.validate(self)
         Status(self.status) # throws ValueError if invalid
 
+
+class UpdateBatchMessage(Message):
+    """
+    Several UpdateMessages' fields, written by the historian in one
+    transaction.
+    """
+    required_fields = {
+            'updates': list,
+    }
+
+    def validate(self):
+        Message.validate(self)
+        for update in self.updates:
+            UpdateMessage(**update).validate()
+
@@ -0,0 +1,64 @@
+from flow_workflow.cache import LRUCache
+
+import re
+import threading
+
+
+_LABEL_REGEX = re.compile(
+        r'^\s*(\w+)\s+(?:.*?\b(?:FROM|INTO)\s+)?([\w.]+)',
+        re.IGNORECASE | re.DOTALL)
+
+
+def statement_label(statement):
+    """
+    A short name for <statement>, e.g. 'SELECT workflow.workflow_historian'.
+    """
+    match = _LABEL_REGEX.match(statement)
+    if match is None:
+        return 'OTHER'
+
+    verb, table = match.groups()
+    return '%s %s' % (verb.upper(), table.lower())
+
+
+class StatementMetrics(object):
+    """
+    Counts executed statements and the time spent in them, grouped by
+    statement_label.  The labels of the last <label_cache_size> distinct
+    statements are cached.  Safe to use from several threads.
+    """
+    def __init__(self, label_cache_size=1000):
+        self._lock = threading.Lock()
+        self._labels = LRUCache(max_size=label_cache_size)
+        self._counts = {}
+        self._seconds = {}
+
+    def record(self, statement, seconds):
+        label = self._labels.get(statement)
+        if label is None:
+            label = statement_label(statement)
+            self._labels.set(statement, label)
+
+        with self._lock:
+            self._counts[label] = self._counts.get(label, 0) + 1
+            self._seconds[label] = self._seconds.get(label, 0.0) + seconds
+
+    @property
+    def total_count(self):
+        with self._lock:
+            return sum(self._counts.itervalues())
+
+    @property
+    def stats(self):
+        """
+        {label: {'count': n, 'seconds': total seconds}}
+        """
+        with self._lock:
+            return dict((label, {'count': count,
+                                 'seconds': self._seconds[label]})
+                    for label, count in self._counts.iteritems())
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+            self._seconds.clear()
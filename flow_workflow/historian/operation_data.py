@@ -1,6 +1,13 @@
 import json
 
 class OperationData(object):
+    """
+    Identifies a historian row: one per (net_key, operation_id, color).
+
+    Colors of tokens are never negative.  A negative color marks the
+    summary row of a parallel-by operation, see
+    flow_workflow.historian.summary.summary_color.
+    """
     def __init__(self, net_key, operation_id, color):
         self.net_key = net_key
         self.operation_id = int(operation_id)
@@ -32,5 +39,15 @@ class OperationData(object):
         return "OperationData(net_key='%s', operation_id=%s, color=%s)" % (
                 self.net_key, self.operation_id, self.color)
 
+    @property
+    def key(self):
+        return (str(self.net_key), self.operation_id, self.color)
+
     def __eq__(self, other):
         return self.to_dict == other.to_dict
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.key)
@@ -0,0 +1,32 @@
+"""
+Updates can be spread over several historian queues by net_key, so that
+several historian services can consume them without fighting over the same
+rows.  With workflow.historian.partitions set to N, updates are published to
+'<update_routing_key>.<partition>' and each historian service started with
+'--partition <partition>' consumes '<update_queue>_<partition>'.  Every update
+for a net lands in the same partition, so updates for an operation are still
+handled in order.
+"""
+
+import zlib
+
+
+def partition_for(net_key, partitions):
+    # crc32 rather than hash() so every process agrees on the partition
+    return (zlib.crc32(str(net_key)) & 0xffffffff) % partitions
+
+
+def partition_routing_key(routing_key, partition):
+    return '%s.%d' % (routing_key, partition)
+
+
+def partition_queue_name(queue_name, partition):
+    return '%s_%d' % (queue_name, partition)
+
+
+def routing_key_for(routing_key, net_key, partitions):
+    if partitions > 1:
+        return partition_routing_key(routing_key,
+                partition_for(net_key, partitions))
+    else:
+        return routing_key
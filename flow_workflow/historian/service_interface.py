@@ -1,7 +1,10 @@
+from collections import OrderedDict
 from flow.configuration.settings.injector import setting
 from flow_workflow.historian import messages
+from flow_workflow.historian.batch import UpdateBatcher
+from flow_workflow.historian.partitions import routing_key_for
 from injector import inject
-from twisted.internet import defer
+from twisted.internet import defer, reactor
 
 import flow.interfaces
 import flow_workflow.interfaces
@@ -13,11 +16,26 @@ LOG = logging.getLogger(__name__)
 
 @inject(broker=flow.interfaces.IBroker,
         exchange=setting('workflow.historian.exchange'),
-        update_routing_key=setting('workflow.historian.update_routing_key'))
+        update_routing_key=setting('workflow.historian.update_routing_key'),
+        update_batch_routing_key=setting(
+            'workflow.historian.update_batch_routing_key', None),
+        partitions=setting('workflow.historian.partitions', 1),
+        publish_batch_size=setting('workflow.historian.publish_batch_size', 1),
+        publish_batch_window=setting(
+            'workflow.historian.publish_batch_window', 0.05))
 class WorkflowHistorianServiceInterface(
         flow_workflow.interfaces.IWorkflowHistorian):
+    """
+    With a publish_batch_size greater than one (and an
+    update_batch_routing_key), updates are buffered for up to
+    publish_batch_window seconds and published as UpdateBatchMessages, one
+    per partition.  Buffered updates keep their order within a partition,
+    and the deferred for each update fires once its batch is published.
+    """
+    _publisher = None
+
     def update(self, operation_data, name, workflow_plan_id, **kwargs):
-        if workflow_plan_id is None or workflow_plan_id < 0:
+        if not _valid_plan_id(workflow_plan_id):
             # ignore update (don't even make message)
             LOG.debug("Received negative workflow_plan_id:%s, "
                     "ignoring update (operation_data=%s, name=%s,"
@@ -31,5 +49,93 @@ class WorkflowHistorianServiceInterface(
                     operation_data, name, workflow_plan_id, kwargs)
             message = messages.UpdateMessage(operation_data=operation_data,
                     name=name, workflow_plan_id=workflow_plan_id, **kwargs)
-            return self.broker.publish(self.exchange, self.update_routing_key,
-                    message)
+            if self.buffers_updates:
+                # the message above only validates the update
+                return self.publisher.add(dict(kwargs,
+                    operation_data=operation_data, name=name,
+                    workflow_plan_id=workflow_plan_id))
+
+            routing_key = routing_key_for(self.update_routing_key,
+                    net_key=operation_data['net_key'],
+                    partitions=self.partitions)
+            return self.broker.publish(self.exchange, routing_key, message)
+
+    def update_many(self, updates):
+        """
+        Publish <updates> as one UpdateBatchMessage per partition, so the
+        historian writes them in a single transaction.  Without an
+        update_batch_routing_key they are published one at a time, and when
+        updates are buffered they are added to the buffer.
+        """
+        updates = [u for u in updates if _valid_plan_id(u['workflow_plan_id'])]
+        if not updates:
+            return defer.succeed(None)
+
+        if not self.update_batch_routing_key or self.buffers_updates:
+            # buffered updates go through update, so that they stay in order
+            return defer.gatherResults([self.update(**u) for u in updates],
+                    consumeErrors=True)
+
+        deferreds = [self._publish_batch(routing_key,
+                [updates[i] for i in indices]) for routing_key, indices
+                in self._batches(updates).iteritems()]
+        return defer.gatherResults(deferreds, consumeErrors=True)
+
+    @property
+    def buffers_updates(self):
+        return bool(self.update_batch_routing_key and
+                self.publish_batch_size > 1)
+
+    @property
+    def publisher(self):
+        if self._publisher is None:
+            self._publisher = UpdateBatcher(self._publish_buffered,
+                    batch_size=self.publish_batch_size,
+                    batch_window=self.publish_batch_window, clock=reactor)
+            reactor.addSystemEventTrigger('before', 'shutdown',
+                    self._publisher.flush)
+        return self._publisher
+
+    def _publish_buffered(self, updates):
+        results = [None] * len(updates)
+
+        deferreds = []
+        for routing_key, indices in self._batches(updates).iteritems():
+            deferred = self._publish_batch(routing_key,
+                    [updates[i] for i in indices])
+            deferred.addErrback(_record_failure, results, indices)
+            deferreds.append(deferred)
+
+        result = defer.gatherResults(deferreds)
+        result.addCallback(lambda _: results)
+        return result
+
+    def _batches(self, updates):
+        """
+        {routing_key: [index in <updates>]} with the indices in order.
+        """
+        batches = OrderedDict()
+        for index, update in enumerate(updates):
+            routing_key = routing_key_for(self.update_batch_routing_key,
+                    net_key=update['operation_data']['net_key'],
+                    partitions=self.partitions)
+            batches.setdefault(routing_key, []).append(index)
+        return batches
+
+    def _publish_batch(self, routing_key, batch):
+        LOG.debug("Sending batch of %d updates to %s", len(batch),
+                routing_key)
+        message = messages.UpdateBatchMessage(updates=batch)
+        return defer.maybeDeferred(self.broker.publish, self.exchange,
+                routing_key, message)
+
+
+def _record_failure(failure, results, indices):
+    LOG.error("Failed to publish batch of %d updates: %s", len(indices),
+            failure.getErrorMessage())
+    for index in indices:
+        results[index] = failure
+
+
+def _valid_plan_id(workflow_plan_id):
+    return workflow_plan_id is not None and workflow_plan_id >= 0
@@ -1,15 +1,20 @@
-from collections import defaultdict, namedtuple
+from collections import defaultdict, deque, namedtuple
 from flow.configuration.settings.injector import setting
+from flow_workflow.cache import LRUCache
+from flow_workflow.historian.coalesce import coalesce, should_overwrite
+from flow_workflow.historian.metrics import StatementMetrics
 from flow_workflow.historian.status import Status
 from injector import inject
 from sqlalchemy import create_engine
 from sqlalchemy import event
 from sqlalchemy.dialects.oracle import dialect as oracle_dialect
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import QueuePool, StaticPool
 
 import logging
 import re
+import threading
+import time
 
 
 class CannotInsertError(RuntimeError):
@@ -52,6 +57,29 @@ WHERE workflow_execution_id = :workflow_execution_id
 FOR UPDATE
 """
 
+# Insert into workflow_historian unless the row is already there, without
+# raising IntegrityError.  rowcount tells whether the row was inserted.
+CLAIM_STATEMENTS_DICT = {}
+CLAIM_STATEMENTS_DICT['oracle'] = """
+MERGE INTO %s.workflow_historian h
+USING (SELECT :net_key AS net_key, :operation_id AS operation_id,
+    :color AS color FROM DUAL) n
+ON (h.net_key=n.net_key AND h.operation_id=n.operation_id AND h.color=n.color)
+WHEN NOT MATCHED THEN INSERT (net_key, operation_id, color)
+VALUES (n.net_key, n.operation_id, n.color)
+"""
+
+CLAIM_STATEMENTS_DICT['sqlite'] = """
+INSERT OR IGNORE INTO %s.workflow_historian (net_key, operation_id, color)
+VALUES (:net_key, :operation_id, :color)
+"""
+
+CLAIM_STATEMENTS_DICT['postgresql'] = """
+INSERT INTO %s.workflow_historian (net_key, operation_id, color)
+VALUES (:net_key, :operation_id, :color)
+ON CONFLICT DO NOTHING
+"""
+
 
 TABLES = namedtuple('Tables', ['historian', 'instance', 'execution'])
 SEQUENCES = namedtuple('Sequences', ['instance', 'execution'])
@@ -66,7 +94,11 @@ def on_oracle_connect(connection, record):
     cursor.close()
 
 @inject(connection_string=setting('workflow.historian.connection_string'),
-        owner=setting('workflow.historian.owner'))
+        owner=setting('workflow.historian.owner'),
+        id_cache_size=setting('workflow.historian.id_cache_size', 10000),
+        id_cache_ttl=setting('workflow.historian.id_cache_ttl', None),
+        id_block_size=setting('workflow.historian.id_block_size', 20),
+        pool_size=setting('workflow.historian.pool_size', 1))
 class WorkflowHistorianStorage(object):
     def __init__(self):
         self.statements = STATEMENTS(**{k:v % self.owner
@@ -77,9 +109,35 @@ class WorkflowHistorianStorage(object):
         self.sequences = SEQUENCES(
                 instance='%s.workflow_instance_seq' % self.owner,
                 execution='%s.workflow_execution_seq' % self.owner)
+        self.id_allocators = SEQUENCES(
+                instance=SequenceAllocator(self._next_ids,
+                    self.sequences.instance, self.id_block_size),
+                execution=SequenceAllocator(self._next_ids,
+                    self.sequences.execution, self.id_block_size))
+
+        if self.pool_size > 1:
+            self.engine = create_engine(self.connection_string,
+                    case_sensitive=False, poolclass=QueuePool,
+                    pool_size=self.pool_size, max_overflow=0)
+        else:
+            self.engine = create_engine(self.connection_string,
+                    case_sensitive=False, poolclass=StaticPool)
+
+        claim_statement = CLAIM_STATEMENTS_DICT.get(self.engine.dialect.name)
+        if claim_statement is not None:
+            self.claim_statement = claim_statement % self.owner
+        else:
+            self.claim_statement = None
 
-        self.engine = create_engine(self.connection_string,
-                case_sensitive=False, poolclass=StaticPool)
+        # operation_data.key -> workflow_instance_id and
+        # workflow_instance_id -> current_execution_id, for committed rows
+        # (a transaction keeps the ids it finds in transaction.new_ids until
+        # it commits, so other worker threads never see uncommitted rows)
+        self.id_cache = LRUCache(max_size=self.id_cache_size,
+                ttl=self.id_cache_ttl)
+
+        # statement counts and timings, by statement_label
+        self.statement_metrics = StatementMetrics()
 
         # Oracle needs us to tell it to accept strings for dates/timestamps
         if isinstance(self.engine.dialect, oracle_dialect):
@@ -88,23 +146,74 @@ class WorkflowHistorianStorage(object):
     def update(self, update_info):
         LOG.debug("Updating '%s'", update_info['name'])
 
-        transaction = SimpleTransaction(self.engine)
+        transaction = SimpleTransaction(self.engine,
+                metrics=self.statement_metrics)
         try:
             instance_id = self._recursive_insert_or_update(transaction,
                     update_info)
+            transaction.commit()
         except:
             transaction.rollback()
             raise
-        transaction.commit()
 
+        self._log_stats()
         return instance_id
 
+    def update_many(self, update_infos):
+        """
+        Apply several updates in a single transaction.  Updates that refer to
+        the same operation_data and status are merged before anything is
+        written (see UpdateCoalescer).
+        """
+        merged_update_infos = coalesce(update_infos)
+        LOG.debug("Writing %d updates (merged from %d) in one "
+                "transaction", len(merged_update_infos), len(update_infos))
+
+        transaction = SimpleTransaction(self.engine,
+                metrics=self.statement_metrics)
+        try:
+            self._reserve_ids(transaction, merged_update_infos)
+            instance_ids = [self._recursive_insert_or_update(transaction,
+                update_info) for update_info in merged_update_infos]
+            transaction.commit()
+        except:
+            transaction.rollback()
+            raise
+
+        self._log_stats()
+        return instance_ids
+
+    def _log_stats(self):
+        if LOG.isEnabledFor(logging.DEBUG):
+            LOG.debug("Historian id cache: %s", self.id_cache.stats)
+            LOG.debug("Historian statements: %s",
+                    self.statement_metrics.stats)
+
+    def _reserve_ids(self, transaction, update_infos):
+        """
+        Fetch ids for every operation in <update_infos> that will probably
+        be inserted, in one round trip per sequence.
+        """
+        new_count = len(set(_instance_id_cache_key(operation_data)
+            for operation_data in (update_info['operation_data']
+                for update_info in update_infos)
+            if not self._is_known(transaction, operation_data)))
+        if new_count > 1:
+            self.id_allocators.instance.reserve(transaction, new_count)
+            self.id_allocators.execution.reserve(transaction, new_count)
+
     def _recursive_insert_or_update(self, transaction, update_info,
             recursion_level=0):
         LOG.debug("Attempting to insert or update '%s'", update_info['name'])
         if recursion_level > 1:
             raise RuntimeError("update should never recurse more than once!")
 
+        if self._is_known(transaction, update_info['operation_data']):
+            instance_id = self._update(transaction, update_info,
+                    recursion_level)
+            LOG.debug("Updated '%s'", update_info['name'])
+            return instance_id
+
         try:
             instance_id = self._insert(transaction, update_info,
                     recursion_level)
@@ -124,16 +233,15 @@ class WorkflowHistorianStorage(object):
 
         instance_row, execution_row = self._get_rows(transaction,
                 instance_id)
-        stored_status = Status(execution_row['STATUS'])
-        new_status = update_info['status']
-        should_overwrite = new_status.should_overwrite(stored_status)
+        overwrite = should_overwrite(update_info,
+                Status(execution_row['STATUS']))
 
         update_instance_dict = self._get_update_instance_dict(
                 transaction      = transaction,
                 recursion_level  = recursion_level,
                 update_info      = update_info,
                 instance_row     = instance_row,
-                should_overwrite = should_overwrite)
+                should_overwrite = overwrite)
 
         self._update_instance(transaction, update_instance_dict,
                 instance_id)
@@ -141,7 +249,7 @@ class WorkflowHistorianStorage(object):
         update_execution_dict = self._get_update_execution_dict(
                 update_info      = update_info,
                 execution_row    = execution_row,
-                should_overwrite = should_overwrite)
+                should_overwrite = overwrite)
 
         execution_id = instance_row['CURRENT_EXECUTION_ID']
         self._update_execution(transaction, update_execution_dict,
@@ -161,12 +269,37 @@ class WorkflowHistorianStorage(object):
                 id_field="workflow_execution_id",
                 update_id=execution_id)
 
-    def _insert(self, transaction, update_info, recursion_level):
+    def _is_known(self, transaction, operation_data):
+        """
+        True when the workflow_historian row for <operation_data> is known to
+        exist already, so that an insert would certainly fail.
+        """
+        cache_key = _instance_id_cache_key(operation_data)
+        return cache_key in transaction.new_ids or cache_key in self.id_cache
+
+    def _claim_historian_row(self, transaction, operation_data):
+        """
+        Insert the workflow_historian row for <operation_data>.  Returns
+        False if it already existed.
+        """
         try:
-            execute_and_log(transaction,
-                    self.statements.insert_into_workflow_historian,
-                    operation_data = update_info['operation_data'])
+            if self.claim_statement is not None:
+                result = execute_and_log(transaction, self.claim_statement,
+                        operation_data=operation_data)
+                return result.rowcount == 1
+            else:
+                execute_and_log(transaction,
+                        self.statements.insert_into_workflow_historian,
+                        operation_data=operation_data)
+                return True
+
         except IntegrityError:
+            # lost a race against another historian inserting the same row
+            return False
+
+    def _insert(self, transaction, update_info, recursion_level):
+        if not self._claim_historian_row(transaction,
+                update_info['operation_data']):
             raise CannotInsertError("Couldn't insert into WORKFLOW_HISTORIAN "
                     "with %s" % update_info['operation_data'])
 
@@ -207,8 +340,29 @@ class WorkflowHistorianStorage(object):
                 {'CURRENT_EXECUTION_ID': execution_id},
                 instance_id)
 
+        self._cache_id(transaction, _instance_id_cache_key(
+            update_info['operation_data']), instance_id)
+        self._cache_id(transaction, _execution_id_cache_key(instance_id),
+                execution_id)
+
         return instance_id
 
+    def _cached_id(self, transaction, cache_key):
+        value = transaction.new_ids.get(cache_key)
+        if value is None:
+            value = self.id_cache.get(cache_key)
+        return value
+
+    def _cache_id(self, transaction, cache_key, value):
+        if not transaction.new_ids:
+            transaction.add_commit_callback(self._publish_ids,
+                    transaction.new_ids)
+        transaction.new_ids[cache_key] = value
+
+    def _publish_ids(self, new_ids):
+        for cache_key, value in new_ids.iteritems():
+            self.id_cache.set(cache_key, value)
+
     @staticmethod
     def _next_id(transaction, sequence_name):
         NEXT_ID = "SELECT %s.nextval FROM DUAL"
@@ -216,11 +370,21 @@ class WorkflowHistorianStorage(object):
         result = execute_and_log(transaction, stmnt)
         return result.fetchone()[0]
 
+    def _next_ids(self, transaction, sequence_name, count):
+        if count > 1 and isinstance(self.engine.dialect, oracle_dialect):
+            NEXT_IDS = "SELECT %s.nextval FROM DUAL CONNECT BY LEVEL <= :count"
+            stmnt = NEXT_IDS % sequence_name
+            result = execute_and_log(transaction, stmnt, count=count)
+            return [row[0] for row in result.fetchall()]
+        else:
+            return [self._next_id(transaction, sequence_name)
+                    for _ in xrange(count)]
+
     def next_instance_id(self, transaction):
-        return self._next_id(transaction, self.sequences.instance)
+        return self.id_allocators.instance.next(transaction)
 
     def next_execution_id(self, transaction):
-        return self._next_id(transaction, self.sequences.execution)
+        return self.id_allocators.execution.next(transaction)
 
     def _get_rows(self, transaction, instance_id):
         """
@@ -306,6 +470,11 @@ class WorkflowHistorianStorage(object):
         return update_dict
 
     def _select_instance_id(self, transaction, operation_data):
+        cache_key = _instance_id_cache_key(operation_data)
+        instance_id = self._cached_id(transaction, cache_key)
+        if instance_id is not None:
+            return instance_id
+
         result = execute_and_log(transaction,
                 self.statements.select_instance_id,
                 operation_data=operation_data)
@@ -313,6 +482,7 @@ class WorkflowHistorianStorage(object):
         if rows:
             instance_id = rows[0][0]
             if instance_id is not None:
+                self._cache_id(transaction, cache_key, instance_id)
                 return instance_id
         return None
 
@@ -348,18 +518,74 @@ class WorkflowHistorianStorage(object):
                 operation_data   = operation_data,
                 workflow_plan_id = workflow_plan_id)
 
+        cache_key = _execution_id_cache_key(instance_id)
+        execution_id = self._cached_id(transaction, cache_key)
+        if execution_id is not None:
+            return execution_id
+
         result = execute_and_log(transaction,
                 self.statements.select_execution_id,
                 workflow_instance_id=instance_id)
         execution_id = result.fetchone()[0]
+        if execution_id is not None:
+            self._cache_id(transaction, cache_key, execution_id)
         return execution_id
 
 
+def _instance_id_cache_key(operation_data):
+    return ('instance_id',) + operation_data.key
+
+
+def _execution_id_cache_key(instance_id):
+    return ('execution_id', instance_id)
+
+
+class SequenceAllocator(object):
+    """
+    Hands out values of a database sequence, reserving <block_size> of them
+    per round trip.  Reserved values that are never used leave gaps, just as
+    a cached Oracle sequence does.
+    """
+    def __init__(self, fetch_ids, sequence_name, block_size):
+        self.fetch_ids = fetch_ids
+        self.sequence_name = sequence_name
+        self.block_size = max(1, block_size)
+
+        self._available = deque()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._available)
+
+    def next(self, transaction):
+        with self._lock:
+            if not self._available:
+                self._reserve(transaction, self.block_size)
+            return self._available.popleft()
+
+    def reserve(self, transaction, count):
+        """
+        Make sure at least <count> values are available locally.
+        """
+        with self._lock:
+            self._reserve(transaction, count)
+
+    def _reserve(self, transaction, count):
+        missing = count - len(self._available)
+        if missing > 0:
+            self._available.extend(self.fetch_ids(transaction,
+                self.sequence_name, max(missing, self.block_size)))
+
+
 class SimpleTransaction(object):
-    def __init__(self, engine):
+    def __init__(self, engine, metrics=None):
         self.engine = engine
+        self.metrics = metrics
         self.conn = None
         self.trans = None
+        # cache_key -> id, published to the shared id cache on commit
+        self.new_ids = {}
+        self._commit_callbacks = []
 
         try:
             self.conn, self.trans = self.begin_transaction()
@@ -374,9 +600,16 @@ class SimpleTransaction(object):
                 self.trans, self.conn)
         return conn, trans
 
-    def execute(self, *args, **kwargs):
+    def execute(self, statement, **kwargs):
         statement_kwargs = get_updated_statement_kwargs(**kwargs)
-        return self.conn.execute(*args, **statement_kwargs)
+        if self.metrics is None:
+            return self.conn.execute(statement, **statement_kwargs)
+
+        begin = time.time()
+        try:
+            return self.conn.execute(statement, **statement_kwargs)
+        finally:
+            self.metrics.record(statement, time.time() - begin)
 
     def commit(self, *args, **kwargs):
         LOG.debug("Commiting transaction")
@@ -387,13 +620,23 @@ class SimpleTransaction(object):
             raise
 
         self._close()
+        for callback, callback_args in self._commit_callbacks:
+            callback(*callback_args)
         return return_value
 
+    def add_commit_callback(self, callback, *args):
+        self._commit_callbacks.append((callback, args))
+
     def rollback(self, *args, **kwargs):
+        if self.trans is None:
+            # already committed, e.g. when a commit callback failed
+            return
+
         LOG.debug("Rolling back transaction.")
-        return_value = self.trans.rollback(*args, **kwargs)
-        self._close()
-        return return_value
+        try:
+            return self.trans.rollback(*args, **kwargs)
+        finally:
+            self._close()
 
     def _close(self):
         self.conn.close()
@@ -415,8 +658,9 @@ def get_updated_statement_kwargs(**kwargs):
 
 
 def execute_and_log(transaction, statement, **kwargs):
-    statement_kwargs = get_updated_statement_kwargs(**kwargs)
-    log_statement(statement, **statement_kwargs)
+    # rendering the statement is expensive, only do it when it will be seen
+    if LOG.isEnabledFor(logging.DEBUG):
+        log_statement(statement, **get_updated_statement_kwargs(**kwargs))
     return transaction.execute(statement, **kwargs)
 
 
@@ -0,0 +1,129 @@
+"""
+Historian summarization for wide parallel-by operations.
+
+A parallel-by operation with a parallel_by_summarize_threshold only gets
+historian rows for its first <threshold> children.  Updates about later
+children (and anything nested in them) are dropped unless they report a
+crash.  Instead, the current status of each of those children is kept on
+the net, together with the number of children in each status, and a
+summary row for the parallel-by operation shows the counts.
+
+The summary row is updated along with every recorded child update, every
+<threshold> status changes and when the parallel-by operation finishes,
+so historian load no longer grows with the width of the parallel-by.
+"""
+
+from flow_workflow import factory
+from flow_workflow import io
+from flow_workflow.historian.status import Status, VALID_STATUSES
+from flow_workflow.parallel_id import ParallelIdentifier
+
+import json
+import logging
+
+
+LOG = logging.getLogger(__name__)
+
+
+RECORDED_STATUSES = frozenset(['crashed'])
+
+
+class Summary(object):
+    """
+    Child <index> of the summarized parallel-by <operation_id> (run under
+    <parallel_id>) that an update belongs to.
+    """
+    def __init__(self, operation_id, parallel_id, index, interval):
+        self.operation_id = operation_id
+        self.parallel_id = parallel_id
+        self.index = index
+        self.interval = max(1, interval)
+
+    def record(self, net, status):
+        """
+        Move the child to <status> in the counts, unless it already reached
+        a later status.  Returns whether the summary row is due for an
+        update.
+
+        Updates about one child are sent one after another, so its status
+        is read and written without a transaction.
+        """
+        connection = net.variables.connection
+        key = net.variables.key
+
+        status_name = self._child_status_variable_name()
+        previous = connection.hget(key, status_name)
+        if previous is not None:
+            previous = json.loads(previous)
+            if not Status(status).should_overwrite(Status(previous)):
+                return False
+
+        pipeline = connection.pipeline()
+        pipeline.hset(key, status_name, json.dumps(status))
+        if previous is not None:
+            pipeline.hincrby(key, _count_variable_name(self.operation_id,
+                previous, self.parallel_id), -1)
+        pipeline.hincrby(key, _count_variable_name(self.operation_id, status,
+            self.parallel_id), 1)
+        pipeline.hincrby(key, _changes_variable_name(self.operation_id,
+            self.parallel_id), 1)
+        changes = pipeline.execute()[-1]
+
+        return changes % self.interval == 0
+
+    def _child_status_variable_name(self):
+        return '_wf_pb_status_%s%s' % (int(self.operation_id),
+                self.parallel_id.child_identifier(self.operation_id,
+                    self.index).variable_suffix)
+
+
+def summary_for(net, parallel_id):
+    """
+    The Summary covering updates made under <parallel_id>, or None if they
+    should all be recorded.
+    """
+    entries = list(parallel_id)
+    for position, (operation_id, index) in enumerate(entries):
+        operation = factory.load_operation(net, operation_id)
+        threshold = operation.parallel_by_summarize_threshold
+        if threshold is not None and index >= threshold:
+            return Summary(operation_id,
+                    ParallelIdentifier(entries[:position]), index,
+                    interval=threshold)
+
+
+def counts(net, operation_id, parallel_id):
+    """
+    {status: number of summarized children in it} of the parallel-by
+    <operation_id> run under <parallel_id>, leaving out empty statuses.
+    """
+    names = dict((_count_variable_name(operation_id, status, parallel_id),
+        status) for status in VALID_STATUSES)
+    return dict((names[name], count)
+            for name, count in io.get_variables(net, names).iteritems()
+            if count > 0)
+
+
+def summary_color(color):
+    """
+    The color of the summary row of the parallel-by operation whose own row
+    has <color>.  Token colors are never negative, so it cannot clash with
+    a real row (see OperationData).
+    """
+    return -1 - color
+
+
+def summarized_name(name, status_counts):
+    return '%s [%s]' % (name, ', '.join('%s: %d' % (status,
+        status_counts[status]) for status in VALID_STATUSES
+        if status in status_counts))
+
+
+def _count_variable_name(operation_id, status, parallel_id):
+    return '_wf_pb_count_%s_%s%s' % (int(operation_id), status,
+            parallel_id.variable_suffix)
+
+
+def _changes_variable_name(operation_id, parallel_id):
+    return '_wf_pb_changes_%s%s' % (int(operation_id),
+            parallel_id.variable_suffix)
@@ -0,0 +1,49 @@
+from twisted.internet import defer, reactor, threads
+from twisted.python.threadpool import ThreadPool
+
+import logging
+
+
+LOG = logging.getLogger(__name__)
+
+
+class StorageWorkerPool(object):
+    """
+    Runs blocking storage calls on a thread pool.
+
+    Work is spread over <size> lanes by the hash of a key.  Each lane runs
+    one call at a time in the order they were submitted, so calls with the
+    same key never overlap while calls in different lanes can commit in
+    parallel.
+    """
+    def __init__(self, size, clock=reactor):
+        self.size = size
+        self.clock = clock
+
+        self.threadpool = ThreadPool(minthreads=size, maxthreads=size,
+                name='workflow-historian-storage')
+        self._lane_locks = [defer.DeferredLock() for _ in xrange(size)]
+        self._started = False
+
+    def start(self):
+        if not self._started:
+            LOG.info('Starting %d historian storage threads', self.size)
+            self.threadpool.start()
+            self.clock.addSystemEventTrigger('during', 'shutdown', self.stop)
+            self._started = True
+
+    def stop(self):
+        if self._started:
+            self.threadpool.stop()
+            self._started = False
+
+    def lane(self, key):
+        return hash(key) % self.size
+
+    def run(self, key, func, *args, **kwargs):
+        return self.run_in_lane(self.lane(key), func, *args, **kwargs)
+
+    def run_in_lane(self, lane, func, *args, **kwargs):
+        self.start()
+        return self._lane_locks[lane].run(threads.deferToThreadPool,
+                self.clock, self.threadpool, func, *args, **kwargs)
@@ -7,6 +7,14 @@ class IWorkflowHistorian(object):
     def update(self, operation_data, name, workflow_plan_id, **kwargs):
         pass
 
+    @abstractmethod
+    def update_many(self, updates):
+        """
+        Apply several updates, each a dict of the keyword arguments update
+        takes.
+        """
+        pass
+
 
 class IWorkflowCompletion(object):
     __metaclass__ = ABCMeta
@@ -1,9 +1,18 @@
+from flow_workflow.parallel_id import ParallelIdentifier
+
+import json
 import logging
 
 
 LOG = logging.getLogger(__name__)
 
 
+_MISSING = object()
+
+# maximum number of fields requested by a single HMGET
+HMGET_CHUNK_SIZE = 1000
+
+
 def extract_workflow_data(net, token_indices):
     outputs = {}
 
@@ -31,37 +40,158 @@ def load_input(net, input_connections, property_name, parallel_id):
 def load_inputs(net, input_connections, parallel_id):
     LOG.debug('load_inputs(netkey=%r, %r, %r)',
             net.key, input_connections, parallel_id)
-    inputs = {}
+    sources = {}
     for src_id, prop_hash in input_connections.iteritems():
         for dest_prop_name, src_prop_name in prop_hash.iteritems():
-            inputs[dest_prop_name] = load_output(net=net, operation_id=src_id,
-                    property_name=src_prop_name, parallel_id=parallel_id)
+            sources[dest_prop_name] = (src_id, src_prop_name)
 
-    return inputs
+    return load_output_values(net=net, sources=sources,
+            parallel_id=parallel_id)
 
 
 def load_output(net, operation_id, property_name, parallel_id):
-    for pid in parallel_id.stack_iterator:
-        varname = _output_variable_name(operation_id=operation_id,
-                property_name=property_name, parallel_id=list(pid))
-        try:
-            value = net.variables[varname]
-            LOG.debug('load_output(netkey=%r, %r, %r, %r) = %r',
-                    net.key, operation_id, property_name, parallel_id, value)
-            return value
-        except KeyError:
-            pass
-
-    raise KeyError("Output %s not found on operation %r, parallel_id %r" %
-            (property_name, operation_id, parallel_id))
+    value = load_output_values(net=net,
+            sources={property_name: (operation_id, property_name)},
+            parallel_id=parallel_id)[property_name]
+    LOG.debug('load_output(netkey=%r, %r, %r, %r) = %r',
+            net.key, operation_id, property_name, parallel_id, value)
+    return value
 
 
 def load_outputs(net, operation_id, property_names, parallel_id):
-    outputs = {}
-    for output_name in property_names:
-        outputs[output_name] = load_output(net=net, operation_id=operation_id,
-                property_name=output_name, parallel_id=parallel_id)
-    return outputs
+    return load_output_values(net=net,
+            sources=dict((name, (operation_id, name))
+                for name in property_names),
+            parallel_id=parallel_id)
+
+
+def load_output_values(net, sources, parallel_id):
+    """
+    Load several outputs with a single HMGET.
+
+    <sources> maps result names to (operation_id, property_name) pairs.  As
+    with load_output, each output is looked up under <parallel_id> first and
+    then under each of its ancestors.
+    """
+    pids = list(parallel_id.stack_iterator)
+
+    candidates = {}
+    for name, (operation_id, property_name) in sources.iteritems():
+        candidates[name] = [_output_variable_name(operation_id=operation_id,
+            property_name=property_name, parallel_id=pid) for pid in pids]
+
+    values = get_variables(net,
+            [v for names in candidates.itervalues() for v in names])
+
+    results = {}
+    for name, varnames in candidates.iteritems():
+        for varname in varnames:
+            if varname in values:
+                results[name] = values[varname]
+                break
+        else:
+            operation_id, property_name = sources[name]
+            raise KeyError("Output %s not found on operation %r, "
+                    "parallel_id %r" % (property_name, operation_id,
+                        parallel_id))
+
+    return results
+
+
+def load_output_array(net, operation_id, property_name, parallel_id,
+        parallel_operation_id, size, chunk_size=HMGET_CHUNK_SIZE):
+    """
+    Load an output for every child of a parallel-by operation.
+
+    Element i of the result is what load_output returns for
+    parallel_id.child_identifier(parallel_operation_id, i), but the child
+    variables are fetched with one HMGET per <chunk_size> children and the
+    ancestors of <parallel_id> are probed at most once.
+    """
+    results, missing_indices = _load_child_values(net=net,
+            operation_id=operation_id, property_name=property_name,
+            parallel_id=parallel_id,
+            parallel_operation_id=parallel_operation_id, size=size,
+            chunk_size=chunk_size)
+
+    if missing_indices:
+        # children that did not store the output inherit it from an ancestor
+        inherited_value = load_output(net=net, operation_id=operation_id,
+                property_name=property_name, parallel_id=parallel_id)
+        for i in missing_indices:
+            results[i] = inherited_value
+
+    return results
+
+
+def move_output_array(net, operation_id, property_name, parallel_id,
+        parallel_operation_id, size, chunk_size=HMGET_CHUNK_SIZE):
+    """
+    Store the array load_output_array returns as the output at
+    <parallel_id> and delete the children's variables, so that each value
+    is only kept once and the output takes a single field.  Nothing at or
+    above <parallel_id> reads the children's variables.
+
+    The array, the deletions and a marker recording the move are written
+    in one transaction.  Moving the same output again (e.g. when the join
+    is redelivered) finds the marker and returns the stored array instead
+    of rebuilding it from the deleted children.
+    """
+    connection = net.variables.connection
+    key = net.variables.key
+    marker_name = _moved_variable_name(operation_id=operation_id,
+            property_name=property_name, parallel_id=parallel_id)
+    output_name = _output_variable_name(operation_id=operation_id,
+            property_name=property_name, parallel_id=parallel_id)
+
+    if connection.hexists(key, marker_name):
+        return get_variables(net, [output_name])[output_name]
+
+    values = load_output_array(net=net, operation_id=operation_id,
+            property_name=property_name, parallel_id=parallel_id,
+            parallel_operation_id=parallel_operation_id, size=size,
+            chunk_size=chunk_size)
+
+    pipeline = connection.pipeline()
+    pipeline.hset(key, output_name, json.dumps(values))
+    pipeline.hset(key, marker_name, json.dumps(parallel_operation_id))
+    for begin in xrange(0, size, chunk_size):
+        pipeline.hdel(key, *_child_variable_names(operation_id=operation_id,
+            property_name=property_name, parallel_id=parallel_id,
+            parallel_operation_id=parallel_operation_id,
+            indices=xrange(begin, min(size, begin + chunk_size))))
+    pipeline.execute()
+
+    return values
+
+
+def _load_child_values(net, operation_id, property_name, parallel_id,
+        parallel_operation_id, size, chunk_size):
+    results = []
+    missing_indices = []
+    for begin in xrange(0, size, chunk_size):
+        indices = xrange(begin, min(size, begin + chunk_size))
+        values = _hmget(net, _child_variable_names(operation_id=operation_id,
+            property_name=property_name, parallel_id=parallel_id,
+            parallel_operation_id=parallel_operation_id, indices=indices))
+        for i, value in zip(indices, values):
+            if value is _MISSING:
+                missing_indices.append(i)
+            results.append(value)
+
+    return results, missing_indices
+
+
+def store_output_array(net, operation_id, property_name, parallel_id,
+        parallel_operation_id, values):
+    """
+    The inverse of load_output_array: store values[i] under
+    parallel_id.child_identifier(parallel_operation_id, i) with one HMSET.
+    """
+    set_variables(net, dict(zip(_child_variable_names(
+        operation_id=operation_id, property_name=property_name,
+        parallel_id=parallel_id, parallel_operation_id=parallel_operation_id,
+        indices=xrange(len(values))), values)))
 
 
 def store_output(net, operation_id, property_name, value, parallel_id=None):
@@ -74,12 +204,54 @@ def store_output(net, operation_id, property_name, value, parallel_id=None):
 
 
 def store_outputs(net, operation_id, outputs, parallel_id):
-    for name, value in outputs.iteritems():
-        store_output(net=net,
-                operation_id=operation_id,
-                property_name=name,
-                value=value,
-                parallel_id=parallel_id)
+    store_output_values(net=net, values=dict(((operation_id, name), value)
+        for name, value in outputs.iteritems()), parallel_id=parallel_id)
+
+
+def store_output_values(net, values, parallel_id):
+    """
+    Store several outputs with a single HMSET.  <values> maps
+    (operation_id, property_name) pairs to the values to store.
+    """
+    LOG.debug('store_output_values(netkey=%r, %r, %r)',
+            net.key, values, parallel_id)
+    set_variables(net, output_variables(values, parallel_id))
+
+
+def output_variables(values, parallel_id):
+    """
+    The net variables store_output_values would set, as a dict.
+    """
+    return dict((_output_variable_name(operation_id=operation_id,
+            property_name=property_name, parallel_id=parallel_id), value)
+        for (operation_id, property_name), value in values.iteritems())
+
+
+def get_variables(net, names):
+    """
+    Fetch the net variables <names> with one HMGET.  Returns a dict of the
+    variables that are set.
+    """
+    names = list(set(names))
+    return dict((name, value) for name, value in zip(names, _hmget(net, names))
+            if value is not _MISSING)
+
+
+def _hmget(net, names):
+    if not names:
+        return []
+
+    raw_values = net.variables.connection.hmget(net.variables.key, names)
+    return [_MISSING if raw is None else json.loads(raw)
+            for raw in raw_values]
+
+
+def set_variables(net, values):
+    """
+    Set several net variables with one HMSET.
+    """
+    if values:
+        net.variables.update(values)
 
 
 def _output_variable_name(operation_id, property_name, parallel_id=None):
@@ -89,10 +261,29 @@ def _output_variable_name(operation_id, property_name, parallel_id=None):
     """
     base = "_wf_outp_%s_%s" % (int(operation_id), property_name)
 
-    if parallel_id:
+    if isinstance(parallel_id, ParallelIdentifier):
+        parallel_part = parallel_id.variable_suffix
+    elif parallel_id:
         parallel_part = '|' + '|'.join('%s:%s' % (op_id, par_idx)
                 for op_id, par_idx in parallel_id)
     else:
         parallel_part = ''
 
     return base + parallel_part
+
+
+def _moved_variable_name(operation_id, property_name, parallel_id):
+    return '_wf_moved_%s_%s%s' % (int(operation_id), property_name,
+            parallel_id.variable_suffix)
+
+
+def _child_variable_names(operation_id, property_name, parallel_id,
+        parallel_operation_id, indices):
+    """
+    The output variable names of the children <indices> of a parallel-by
+    operation run under <parallel_id>.
+    """
+    prefix = '%s|%d:' % (_output_variable_name(operation_id=operation_id,
+        property_name=property_name, parallel_id=parallel_id),
+        int(parallel_operation_id))
+    return [prefix + str(i) for i in indices]
@@ -1,3 +1,5 @@
+from flow_workflow.parallel_id import ParallelIdentifier
+
 import os
 import re
 
@@ -41,4 +43,6 @@ class LogManager(object):
         return os.path.join(self.log_dir, filename)
 
     def _serialize_parallel_id(self, parallel_id):
+        if isinstance(parallel_id, ParallelIdentifier):
+            return list(parallel_id.log_name_components)
         return ['%d_%d' % (op_id, par_idx) for op_id, par_idx in parallel_id]
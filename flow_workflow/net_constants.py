@@ -0,0 +1,40 @@
+from flow_workflow.cache import LRUCache
+
+import logging
+
+
+LOG = logging.getLogger(__name__)
+
+
+# Net constants are written by construct_net and never change once the net
+# is started, so every action in the process shares one copy per net.
+NET_CACHE_SIZE = 1000
+_NET_CONSTANTS = LRUCache(max_size=NET_CACHE_SIZE)
+
+_MISSING = object()
+
+
+def get_constant(net, name, default=None):
+    """
+    net.constant(name, default), fetched from redis at most once per net.
+    Callers must not modify the returned value.
+    """
+    constants = _NET_CONSTANTS.get(net.key)
+    if constants is None:
+        constants = {}
+        _NET_CONSTANTS.set(net.key, constants)
+
+    if name in constants:
+        value = constants[name]
+    else:
+        value = net.constant(name, _MISSING)
+        constants[name] = value
+        LOG.debug('Cached constant %s of net %s', name, net.key)
+
+    if value is _MISSING:
+        return default
+    return value
+
+
+def forget_constants(net_key):
+    _NET_CONSTANTS.discard(net_key)
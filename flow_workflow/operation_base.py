@@ -1,6 +1,6 @@
 from flow.petri_net.net import Net
 from flow_workflow import io
-from flow_workflow.factory import load_operation
+from flow_workflow.factory import load_operation, prefetch_operations
 
 import abc
 import flow_workflow.log_manager
@@ -13,11 +13,17 @@ class Operation(object):
 
     def __init__(self, net, name, operation_id, input_connections,
             output_properties, log_dir, parent_net_key, parent_operation_id,
-            children):
+            children, input_sources=None,
+            parallel_by_summarize_threshold=None):
         self.net = net
 
         self.children = children
         self.input_connections = input_connections
+        # {input_name: [storage_operation_id, property_name] or None}, as
+        # resolved by future_operation.input_source_tables
+        self.input_sources = input_sources
+        # see flow_workflow.historian.summary
+        self.parallel_by_summarize_threshold = parallel_by_summarize_threshold
         self.log_dir = log_dir
         self.name = name
         self.operation_id = operation_id
@@ -34,6 +40,13 @@ class Operation(object):
         return self._load_operation(*self._child_net_key_and_id_from(name))
 
     def iter_children(self):
+        child_ids = {}
+        for net_key, child_id in self.children.itervalues():
+            child_ids.setdefault(net_key, []).append(child_id)
+        for net_key, operation_ids in child_ids.iteritems():
+            prefetch_operations(Net(self._connection, key=net_key),
+                    operation_ids)
+
         for net_key, child_id in self.children.itervalues():
             yield self._load_operation(net_key, child_id)
 
@@ -87,26 +100,85 @@ class Operation(object):
         return self.net.connection
 
     def load_inputs(self, parallel_id):
-        results = {}
+        if self.input_sources is not None:
+            return _load_from_sources(self._resolved_input_sources(),
+                    parallel_id)
+
+        sources = {}
         for name in self.input_names:
             try:
-                results[name] = self.load_input(name=name,
-                        parallel_id=parallel_id)
+                sources[name] = self.input_source(name)
             except MissingInputError:
                 # this is to allow optional model inputs
                 # such as is done in InstrumentData::Composite::Workflow
                 pass
-        return results
+        return _load_from_sources(sources, parallel_id)
 
     def load_outputs(self, parallel_id):
-        return {name: self.load_output(name, parallel_id)
-                for name in self.output_properties}
+        return _load_from_sources(dict((name, self.output_source(name))
+                for name in self.output_properties), parallel_id)
 
     def store_outputs(self, outputs, parallel_id):
+        by_net = {}
         for name, value in outputs.iteritems():
-            self.store_output(name, value, parallel_id)
+            destination = self.output_destination(name)
+            if destination is not None:
+                storage_op, storage_name = destination
+                net, values = by_net.setdefault(storage_op.net_key,
+                        (storage_op.net, {}))
+                values[storage_op.operation_id, storage_name] = value
+
+        for net, values in by_net.itervalues():
+            io.store_output_values(net=net, values=values,
+                    parallel_id=parallel_id)
+
+    def input_source(self, name):
+        """
+        Return the (DirectStorageOperation, property_name) pair where input
+        <name> is stored, or None if it always loads as None.
+        """
+        if self.input_sources is not None:
+            return self._resolved_input_source(name)
+
+        source_op_id, source_name = self._determine_input_source(name)
+        source_op = self._load_operation(self.net_key, source_op_id)
+        return source_op.output_source(source_name)
+
+    def _resolved_input_source(self, name):
+        if name not in self.input_sources:
+            raise MissingInputError("Property (%s) not found on operation "
+                    "(%s)" % (name, self.name))
+        return self._storage_location(self.input_sources[name])
+
+    def _resolved_input_sources(self):
+        return dict((name, self._storage_location(source))
+                for name, source in self.input_sources.iteritems())
+
+    def _storage_location(self, source):
+        if source is None:
+            return None
+        storage_op_id, storage_name = source
+        return _StorageLocation(self.net, storage_op_id), storage_name
+
+    def input_destination(self, name):
+        """
+        Like input_source, but following the path store_input takes.
+        """
+        source_op_id, source_name = self._determine_input_source(name)
+        source_op = self._load_operation(self.net_key, source_op_id)
+        return source_op.output_destination(source_name)
+
+    def output_destination(self, name):
+        """
+        Like output_source, but following the path store_output takes.
+        """
+        return self.output_source(name)
 
     def load_input(self, name, parallel_id):
+        if self.input_sources is not None:
+            return _load_from_sources({name: self._resolved_input_source(name)},
+                    parallel_id)[name]
+
         source_op_id, source_name = self._determine_input_source(name)
         source_op = self._load_operation(self.net_key, source_op_id)
         return source_op.load_output(source_name, parallel_id)
@@ -116,6 +188,14 @@ class Operation(object):
         source_op = self._load_operation(self.net_key, source_op_id)
         source_op.store_output(source_name, value, parallel_id)
 
+    @abc.abstractmethod
+    def output_source(self, name):
+        """
+        Return the (DirectStorageOperation, property_name) pair where output
+        <name> is stored, or None if it always loads as None.
+        """
+        raise NotImplementedError()
+
     @abc.abstractmethod
     def load_output(self, name, parallel_id):
         raise NotImplementedError()
@@ -137,6 +217,15 @@ class NullOperation(Operation):
     def net_key(self):
         return None
 
+    def input_source(self, name):
+        return None
+
+    def input_destination(self, name):
+        return None
+
+    def output_source(self, name):
+        return None
+
     def load_output(self, name, parallel_id):
         pass
 
@@ -145,6 +234,9 @@ class NullOperation(Operation):
 
 
 class DirectStorageOperation(Operation):
+    def output_source(self, name):
+        return self, name
+
     def load_output(self, name, parallel_id):
         return io.load_output(
                 net=self.net,
@@ -162,8 +254,51 @@ class DirectStorageOperation(Operation):
 
 
 class PassThroughOperation(Operation):
+    def output_source(self, name):
+        return self.input_source(name)
+
+    def output_destination(self, name):
+        return self.input_destination(name)
+
     def load_output(self, name, parallel_id):
         return self.load_input(name, parallel_id)
 
     def store_output(self, name, value, parallel_id):
         return self.store_input(name, value, parallel_id)
+
+
+class _StorageLocation(object):
+    """
+    Stands in for the DirectStorageOperation <operation_id> on <net>
+    wherever only its location is needed, so that resolved inputs do not
+    have to load it.
+    """
+    def __init__(self, net, operation_id):
+        self.net = net
+        self.operation_id = operation_id
+
+    @property
+    def net_key(self):
+        return self.net.key
+
+
+def _load_from_sources(sources, parallel_id):
+    """
+    Load values given a dict mapping names to the pairs returned by
+    Operation.output_source, with one HMGET per net.
+    """
+    results = {}
+    by_net = {}
+    for name, source in sources.iteritems():
+        if source is None:
+            results[name] = None
+        else:
+            storage_op, storage_name = source
+            net, net_sources = by_net.setdefault(storage_op.net_key,
+                    (storage_op.net, {}))
+            net_sources[name] = (storage_op.operation_id, storage_name)
+
+    for net, net_sources in by_net.itervalues():
+        results.update(io.load_output_values(net=net, sources=net_sources,
+            parallel_id=parallel_id))
+    return results
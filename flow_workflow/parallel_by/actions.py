@@ -15,6 +15,20 @@ def _parallel_id_from_workflow_data(workflow_data):
     return ParallelIdentifier(workflow_data.get('parallel_id', []))
 
 
+def _storage_key(source):
+    if source is not None:
+        storage_op, storage_name = source
+        return storage_op.net_key, int(storage_op.operation_id), storage_name
+
+
+def _next_index_variable_name(operation_id, color_group_idx):
+    """
+    Name of the variable holding the index of the next child a throttled
+    parallel-by will release into the color group <color_group_idx>.
+    """
+    return '_wf_pb_next_%s_%s' % (int(operation_id), color_group_idx)
+
+
 class ParallelBySplit(BasicActionBase):
     requrired_arguments = ['parallel_property', 'operation_id']
 
@@ -38,33 +52,56 @@ class ParallelBySplit(BasicActionBase):
 
         tokens = self._create_tokens(num_tokens=len(parallel_input),
                 color_descriptor=color_descriptor,
-                workflow_data=workflow_data, net=net)
+                workflow_data=workflow_data, net=net,
+                limit=self.args.get('limit'))
 
         return tokens, defer.succeed(None)
 
     def store_parallel_input(self, operation, parallel_property, parallel_input,
             parallel_id):
-        for parallel_idx, value in enumerate(parallel_input):
-            operation.store_input(name=parallel_property,
-                    value=value, parallel_id=parallel_id.child_identifier(
-                        operation.operation_id, parallel_idx))
-
-    def _create_tokens(self, num_tokens, color_descriptor, workflow_data, net):
+        destination = operation.input_destination(parallel_property)
+        if destination is None:
+            return
+
+        storage_op, storage_name = destination
+        io.store_output_array(net=storage_op.net,
+                operation_id=storage_op.operation_id,
+                property_name=storage_name, parallel_id=parallel_id,
+                parallel_operation_id=operation.operation_id,
+                values=parallel_input)
+
+    def _create_tokens(self, num_tokens, color_descriptor, workflow_data, net,
+            limit=None):
+        """
+        Create the color group for all <num_tokens> children, but only the
+        first <limit> tokens.  ParallelByRelease creates the rest as running
+        children finish.
+        """
         new_color_group = net.add_color_group(size=num_tokens,
                 parent_color=color_descriptor.color,
                 parent_color_group_idx=color_descriptor.group.idx)
 
+        if limit is not None and limit < num_tokens:
+            net.set_variable(_next_index_variable_name(
+                self.args['operation_id'], new_color_group.idx), limit)
+            num_tokens = limit
+
         this_workflow_data = copy.copy(workflow_data)
         parallel_id = _parallel_id_from_workflow_data(workflow_data)
 
-        operation_id = self.args['operation_id']
+        # child_identifier is only used once to validate operation_id, the
+        # rest of the children's parallel_ids are built from plain lists
+        first_child_id = list(parallel_id.child_identifier(
+            self.args['operation_id'], 0))
+        parent_entries = first_child_id[:-1]
+        operation_id = first_child_id[-1][0]
 
         tokens = []
         for parallel_idx in xrange(num_tokens):
             color = new_color_group.begin + parallel_idx
 
-            this_workflow_data['parallel_id'] = list(
-                    parallel_id.child_identifier(operation_id, parallel_idx))
+            this_workflow_data['parallel_id'] = parent_entries + [
+                    (operation_id, parallel_idx)]
             data = {'workflow_data': this_workflow_data}
 
             tokens.append(net.create_token(color=color,
@@ -73,6 +110,42 @@ class ParallelBySplit(BasicActionBase):
         return tokens
 
 
+class ParallelByRelease(BasicActionBase):
+    """
+    Releases the next waiting child of a throttled parallel-by each time one
+    of its running children succeeds or fails.
+    """
+    required_arguments = ['operation_id']
+
+    def execute(self, net, color_descriptor, active_tokens, service_interfaces):
+        color_group = color_descriptor.group
+        parallel_idx = self._claim_next_index(net, color_group.idx)
+        if parallel_idx >= color_group.size:
+            return [], defer.succeed(None)
+
+        workflow_data = io.extract_workflow_data(net, active_tokens)
+        parallel_id = _parallel_id_from_workflow_data(workflow_data)
+        workflow_data['parallel_id'] = list(
+                parallel_id.parent_identifier.child_identifier(
+                    self.args['operation_id'], parallel_idx))
+
+        LOG.debug('Releasing child %d of %d for parallel-by operation %s '
+                'on net %s', parallel_idx, color_group.size,
+                self.args['operation_id'], net.key)
+        token = net.create_token(color=color_group.begin + parallel_idx,
+                color_group_idx=color_group.idx,
+                data={'workflow_data': workflow_data})
+
+        return [token], defer.succeed(None)
+
+    def _claim_next_index(self, net, color_group_idx):
+        varname = _next_index_variable_name(self.args['operation_id'],
+                color_group_idx)
+        # HINCRBY makes claiming atomic when children finish concurrently
+        return net.variables.connection.hincrby(net.variables.key,
+                varname, 1) - 1
+
+
 class ParallelByJoin(BarrierActionBase):
     requrired_arguments = ['operation_id']
 
@@ -86,15 +159,23 @@ class ParallelByJoin(BarrierActionBase):
         parallel_id = _parallel_id_from_workflow_data(workflow_data)
         parent_parallel_id = parallel_id.parent_identifier
 
+        array_outputs = {}
+        moved_keys = set()
         for property_name in op.output_properties:
-            array_value = self.collect_array_output(net=net,
+            if self.move_array_output(operation=op,
+                    parallel_size=parallel_size,
+                    property_name=property_name,
+                    parallel_id=parent_parallel_id,
+                    moved_keys=moved_keys):
+                continue
+
+            array_outputs[property_name] = self.collect_array_output(net=net,
                     operation=op,
                     parallel_size=parallel_size,
                     property_name=property_name,
                     parallel_id=parent_parallel_id)
 
-            op.store_output(property_name, value=array_value,
-                    parallel_id=parent_parallel_id)
+        op.store_outputs(array_outputs, parallel_id=parent_parallel_id)
 
         workflow_data['parallel_id'] = list(parent_parallel_id)
         token = net.create_token(color=color_descriptor.group.parent_color,
@@ -103,15 +184,44 @@ class ParallelByJoin(BarrierActionBase):
 
         return [token], defer.succeed(None)
 
+    def move_array_output(self, property_name, parallel_size, operation,
+            parallel_id, moved_keys):
+        """
+        Replace the children's outputs with the joined array at
+        <parallel_id> when they are stored where it would be written.
+        Properties sharing a storage key already in <moved_keys> are left
+        alone: their array is already in place.
+        """
+        source = operation.output_source(property_name)
+        destination = operation.output_destination(property_name)
+        storage_key = _storage_key(source)
+        if source is None or storage_key != _storage_key(destination):
+            return False
+
+        if storage_key in moved_keys:
+            return True
+        moved_keys.add(storage_key)
+
+        storage_op, storage_name = source
+        io.move_output_array(net=storage_op.net,
+                operation_id=storage_op.operation_id,
+                property_name=storage_name, parallel_id=parallel_id,
+                parallel_operation_id=operation.operation_id,
+                size=parallel_size)
+        return True
+
     def collect_array_output(self, net, property_name, parallel_size,
             operation, parallel_id):
-        result = []
-        for parallel_idx in xrange(parallel_size):
-            result.append(operation.load_output(name=property_name,
-                parallel_id=parallel_id.child_identifier(
-                    operation.operation_id, parallel_idx)))
-
-        return result
+        source = operation.output_source(property_name)
+        if source is None:
+            return [None] * parallel_size
+
+        storage_op, storage_name = source
+        return io.load_output_array(net=storage_op.net,
+                operation_id=storage_op.operation_id,
+                property_name=storage_name, parallel_id=parallel_id,
+                parallel_operation_id=operation.operation_id,
+                size=parallel_size)
 
 
 class ParallelByFail(BasicActionBase):
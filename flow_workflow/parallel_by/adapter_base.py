@@ -19,6 +19,32 @@ class ParallelXMLAdapterBase(flow_workflow.adapter_base.XMLAdapterBase):
     def parallel_by(self):
         return self.xml.attrib.get('parallelBy')
 
+    def parallel_by_limit(self, resources):
+        limit = resources.get('parallel_by_limit',
+                self.xml.attrib.get('parallelByLimit'))
+        if limit is not None:
+            return int(limit)
+
+    def parallel_by_summarize_threshold(self, resources):
+        threshold = resources.get('parallel_by_summarize_threshold',
+                self.xml.attrib.get('parallelBySummarizeThreshold'))
+        if threshold is not None:
+            return int(threshold)
+
+    def future_operation(self, parent_future_operation, input_connections,
+            output_properties, resources=None):
+        base = flow_workflow.adapter_base.XMLAdapterBase
+        future_operation = base.future_operation(self,
+                parent_future_operation, input_connections, output_properties,
+                resources=resources)
+        if self.parallel_by:
+            threshold = self.parallel_by_summarize_threshold(resources or {})
+            if threshold is not None:
+                future_operation.kwargs['parallel_by_summarize_threshold'] = \
+                        threshold
+        return future_operation
+
     def _parallel_by_net(self, resources):
         target_net = self.single_future_net(resources=resources)
-        return future_nets.ParallelByNet(target_net, self.parallel_by)
+        return future_nets.ParallelByNet(target_net, self.parallel_by,
+                limit=self.parallel_by_limit(resources))
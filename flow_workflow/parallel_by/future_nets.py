@@ -8,8 +8,12 @@ class ParallelByNet(WorkflowNetBase):
     """
     Make a given <target_net> run parallel on the given <parallel_property>.
     The target_net must be a WorkflowNetBase net.
+
+    If <limit> is given, at most that many children run at once: the split
+    starts the first <limit> children and each child that succeeds or fails
+    releases the next one.
     """
-    def __init__(self, target_net, parallel_property):
+    def __init__(self, target_net, parallel_property, limit=None):
 
         self.target_net = target_net
 
@@ -22,9 +26,12 @@ class ParallelByNet(WorkflowNetBase):
 
 
         # split_transition
+        split_args = {}
+        if limit is not None:
+            split_args['limit'] = limit
         split_action = FutureAction(cls=actions.ParallelBySplit,
                 operation_id=operation_id,
-                parallel_property=parallel_property)
+                parallel_property=parallel_property, **split_args)
         self.split_transition = self.add_basic_transition(
                 name='ParallelBy(%s) split' % operation_id,
                 action=split_action)
@@ -83,5 +90,19 @@ class ParallelByNet(WorkflowNetBase):
                 self.internal_failure_transition,
                 name='failing')
 
+        # release_transition
+        if limit is not None:
+            release_action = FutureAction(cls=actions.ParallelByRelease,
+                    operation_id=operation_id)
+            self.release_transition = self.add_basic_transition(
+                    name='ParallelBy(%s) release' % operation_id,
+                    action=release_action)
+            self.releasing_place = self.bridge_transitions(
+                    target_net.success_transition,
+                    self.release_transition,
+                    name='releasing')
+            target_net.failure_transition.add_arc_out(self.releasing_place)
+            self.release_transition.add_arc_out(self.succeeding_split_place)
+
 def display_name(name):
     return "%s (Parallel By)" % name
@@ -2,57 +2,110 @@ from collections import OrderedDict
 
 import json
 import logging
+import weakref
 
 
 LOG = logging.getLogger(__name__)
 
 
 class ParallelIdentifier(object):
-    def __init__(self, parallel_id=[]):
-        self._entries = OrderedDict([(int(op_id), int(par_idx))
-                for op_id, par_idx in parallel_id])
+    """
+    An immutable sequence of (operation_id, parallel_index) pairs.
+
+    Identifiers are interned, so building one that already exists returns
+    the existing instance.  Everything derived from the entries (hash,
+    parent, serialization, variable name suffix) is computed at most once
+    per identifier.
+    """
+    __slots__ = ['_entries', '_hash', '_parent', '_stack', '_serialized',
+            '_variable_suffix', '_log_name_components', '__weakref__']
+
+    _interned = weakref.WeakValueDictionary()
+
+    def __new__(cls, parallel_id=()):
+        entries = tuple((int(op_id), int(par_idx))
+                for op_id, par_idx in parallel_id)
+        if len(set(op_id for op_id, _ in entries)) != len(entries):
+            # repeated operation_ids keep their first position, last index
+            entries = tuple(OrderedDict(entries).iteritems())
+        return cls._from_entries(entries)
+
+    @classmethod
+    def _from_entries(cls, entries):
+        instance = cls._interned.get(entries)
+        if instance is None:
+            instance = object.__new__(cls)
+            instance._entries = entries
+            instance._hash = hash(entries)
+            instance._parent = None
+            instance._stack = None
+            instance._serialized = None
+            instance._variable_suffix = None
+            instance._log_name_components = None
+            cls._interned[entries] = instance
+        return instance
+
+    def __reduce__(self):
+        # copying or unpickling must intern, not fill in a bare instance
+        return (ParallelIdentifier, (list(self._entries),))
 
     @property
     def index(self):
         if self._entries:
-            return self._entries.values()[-1]
+            return self._entries[-1][1]
 
     def refers_to(self, operation):
-        return int(operation.operation_id) in self._entries
-
-    @property
-    def _parent_entries(self):
-        parent_entries = OrderedDict(self._entries)
-        parent_entries.popitem()
-        return parent_entries
+        operation_id = int(operation.operation_id)
+        return any(op_id == operation_id for op_id, _ in self._entries)
 
     @property
     def parent_identifier(self):
-        return ParallelIdentifier(self._parent_entries.iteritems())
+        if self._parent is None:
+            if not self._entries:
+                raise KeyError('ParallelIdentifier is empty')
+            self._parent = self._from_entries(self._entries[:-1])
+        return self._parent
 
-    def _child_entries(self, operation_id, parallel_idx):
-        if int(operation_id) in self._entries:
+    def child_identifier(self, operation_id, parallel_idx):
+        operation_id = int(operation_id)
+        if any(op_id == operation_id for op_id, _ in self._entries):
             raise ValueError('operation_id already in ParallelIdentifier '
                     'op_id (%r) in %r' % (operation_id, self._entries))
 
-        child_entries = OrderedDict(self._entries)
-        child_entries[int(operation_id)] = int(parallel_idx)
-        return child_entries
-
-    def child_identifier(self, operation_id, parallel_idx):
-        return ParallelIdentifier(self._child_entries(
-            operation_id, parallel_idx).iteritems())
+        return self._from_entries(
+                self._entries + ((operation_id, int(parallel_idx)),))
 
     @property
     def stack_iterator(self):
-        current_id = self
-        while len(current_id):
-            yield current_id
-            current_id = current_id.parent_identifier
-        yield current_id
+        if self._stack is None:
+            stack = [self]
+            while len(stack[-1]):
+                stack.append(stack[-1].parent_identifier)
+            self._stack = tuple(stack)
+        return iter(self._stack)
+
+    @property
+    def variable_suffix(self):
+        """
+        The part of output variable names that identifies this parallel_id.
+        """
+        if self._variable_suffix is None:
+            if self._entries:
+                self._variable_suffix = '|' + '|'.join('%s:%s' % entry
+                        for entry in self._entries)
+            else:
+                self._variable_suffix = ''
+        return self._variable_suffix
+
+    @property
+    def log_name_components(self):
+        if self._log_name_components is None:
+            self._log_name_components = tuple('%d_%d' % entry
+                    for entry in self._entries)
+        return self._log_name_components
 
     def __iter__(self):
-        return self._entries.iteritems()
+        return iter(self._entries)
 
     def __len__(self):
         return len(self._entries)
@@ -60,11 +113,29 @@ class ParallelIdentifier(object):
     def __repr__(self):
         return 'ParallelIdentifier(%r)' % list(self)
 
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, ParallelIdentifier):
+            return NotImplemented
+        return self._entries == other._entries
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
     def __cmp__(self, other):
         return cmp(self._entries, other._entries)
 
     def serialize(self):
-        return json.dumps(list(self))
+        if self._serialized is None:
+            self._serialized = json.dumps(list(self))
+        return self._serialized
 
     @classmethod
     def deserialize(cls, data='[]'):
@@ -2,6 +2,7 @@ from flow_workflow import factory
 from flow.shell_command.petri_net import actions
 from flow_workflow.parallel_id import ParallelIdentifier
 from flow_workflow.historian.operation_data import OperationData
+from flow_workflow.net_constants import get_constant
 from twisted.python.procutils import which
 
 import logging
@@ -33,7 +34,8 @@ class PerlAction(object):
         executor_data['stdout'] = log_manager.stdout_log_path(parallel_id)
 
     def environment(self, net, color_descriptor):
-        env = net.constant('environment', {})
+        # copied, since the cached environment is shared by every action
+        env = dict(get_constant(net, 'environment', {}))
 
         operation = self._get_operation(net)
         operation_data = OperationData(net_key=net.key,
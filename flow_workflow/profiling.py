@@ -0,0 +1,94 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import time
+
+
+class PhaseTimer(object):
+    """
+    Records the wall time spent in named phases along with named counts, in
+    the order they were first seen.
+    """
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.phases = OrderedDict()
+        self.counts = OrderedDict()
+        self._begin_times = {}
+
+    @contextmanager
+    def phase(self, name):
+        self.begin(name)
+        try:
+            yield
+        finally:
+            self.end(name)
+
+    def begin(self, name):
+        self._begin_times[name] = self.clock()
+
+    def end(self, name):
+        elapsed = self.clock() - self._begin_times.pop(name)
+        self.phases[name] = self.phases.get(name, 0.0) + elapsed
+
+    def count(self, name, value=1):
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    def report(self):
+        lines = ['Phase timings:']
+        for name, seconds in self.phases.iteritems():
+            lines.append('  %-24s %10.3f s' % (name, seconds))
+        lines.append('  %-24s %10.3f s' % ('total',
+            sum(self.phases.itervalues())))
+
+        if self.counts:
+            lines.append('Counts:')
+            for name, value in self.counts.iteritems():
+                lines.append('  %-24s %10d' % (name, value))
+        return '\n'.join(lines)
+
+
+class RedisCommandCounter(object):
+    """
+    Counts the commands sent through a redis connection by wrapping its
+    execute_command method.  Commands queued on a pipeline are sent by the
+    pipeline itself and count as one 'pipeline' command.
+    """
+    def __init__(self, connection):
+        self.connection = connection
+        self.counts = {}
+        self._original_execute_command = None
+        self._original_pipeline = None
+
+    @property
+    def total(self):
+        return sum(self.counts.itervalues())
+
+    def install(self):
+        if self._original_execute_command is not None:
+            return
+
+        self._original_execute_command = self.connection.execute_command
+        self.connection.execute_command = self._execute_command
+
+        self._original_pipeline = getattr(self.connection, 'pipeline', None)
+        if self._original_pipeline is not None:
+            self.connection.pipeline = self._pipeline
+
+    def uninstall(self):
+        if self._original_execute_command is not None:
+            self.connection.execute_command = self._original_execute_command
+            self._original_execute_command = None
+        if self._original_pipeline is not None:
+            self.connection.pipeline = self._original_pipeline
+            self._original_pipeline = None
+
+    def _count(self, name):
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def _execute_command(self, *args, **kwargs):
+        self._count(str(args[0]).upper())
+        return self._original_execute_command(*args, **kwargs)
+
+    def _pipeline(self, *args, **kwargs):
+        self._count('PIPELINE')
+        return self._original_pipeline(*args, **kwargs)
@@ -0,0 +1,77 @@
+from flow_workflow.historian.batch import UpdateBatcher
+from twisted.internet import task
+from twisted.python.failure import Failure
+
+import unittest
+
+
+class UpdateBatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = task.Clock()
+        self.written = []
+        self.batcher = UpdateBatcher(self.write_batch, batch_size=3,
+                batch_window=2, clock=self.clock)
+
+    def write_batch(self, items):
+        self.written.append(items)
+        return [item * 10 for item in items]
+
+    def _results(self, deferreds):
+        results = []
+        for deferred in deferreds:
+            deferred.addCallback(results.append)
+        return results
+
+    def test_flush_on_size(self):
+        results = self._results([self.batcher.add(i) for i in xrange(3)])
+
+        self.assertEqual([[0, 1, 2]], self.written)
+        self.assertEqual([0, 10, 20], results)
+        self.assertEqual(0, len(self.batcher))
+
+    def test_flush_on_window(self):
+        results = self._results([self.batcher.add(i) for i in xrange(2)])
+        self.assertEqual([], self.written)
+        self.assertEqual(2, len(self.batcher))
+
+        self.clock.advance(2)
+        self.assertEqual([[0, 1]], self.written)
+        self.assertEqual([0, 10], results)
+
+    def test_size_flush_cancels_window(self):
+        [self.batcher.add(i) for i in xrange(3)]
+        self.assertEqual([], self.clock.getDelayedCalls())
+
+    def test_flush_empty(self):
+        self.batcher.flush()
+        self.assertEqual([], self.written)
+
+    def test_per_item_failure(self):
+        def write_batch(items):
+            return [None, Failure(RuntimeError('bad item'))]
+        batcher = UpdateBatcher(write_batch, batch_size=2, batch_window=1,
+                clock=self.clock)
+
+        good = batcher.add('good')
+        bad = batcher.add('bad')
+
+        errors = []
+        bad.addErrback(errors.append)
+        self.assertEqual(1, len(errors))
+        self.assertTrue(errors[0].check(RuntimeError))
+        self.assertTrue(good.called)
+
+    def test_batch_failure(self):
+        def write_batch(items):
+            raise RuntimeError('whole batch failed')
+        batcher = UpdateBatcher(write_batch, batch_size=2, batch_window=1,
+                clock=self.clock)
+
+        errors = []
+        for deferred in [batcher.add(1), batcher.add(2)]:
+            deferred.addErrback(errors.append)
+        self.assertEqual(2, len(errors))
+
+
+if __name__ == '__main__':
+    unittest.main()
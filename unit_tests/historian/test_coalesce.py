@@ -0,0 +1,94 @@
+from flow_workflow.historian.coalesce import (UpdateCoalescer, coalesce,
+        merge_update_info)
+from flow_workflow.historian.operation_data import OperationData
+from flow_workflow.historian.status import Status
+
+import unittest
+
+
+class UpdateCoalescerTest(unittest.TestCase):
+    def setUp(self):
+        self.od1 = OperationData(net_key='a', operation_id=1, color=0)
+        self.od2 = OperationData(net_key='a', operation_id=2, color=0)
+        self.coalescer = UpdateCoalescer()
+
+    def test_keeps_first_seen_order(self):
+        self.coalescer.add({'operation_data': self.od1, 'status': Status('new')})
+        self.coalescer.add({'operation_data': self.od2, 'status': Status('new')})
+        self.coalescer.add({'operation_data': self.od1,
+            'status': Status('new'), 'stdout': '1'})
+
+        self.assertEqual(1, self.coalescer.coalesced)
+        updates = self.coalescer.pop_all()
+        self.assertEqual([self.od1, self.od2],
+                [u['operation_data'] for u in updates])
+        self.assertEqual('1', updates[0]['stdout'])
+
+    def test_pop_all_resets(self):
+        self.coalescer.add({'operation_data': self.od1, 'status': Status('new')})
+        self.coalescer.pop_all()
+
+        self.assertEqual(0, len(self.coalescer))
+        self.assertEqual(0, self.coalescer.coalesced)
+        self.assertEqual([], self.coalescer.pop_all())
+
+    def test_different_statuses_kept_apart(self):
+        updates = coalesce([
+            {'operation_data': self.od1, 'status': Status('running'),
+                'start_time': 'start'},
+            {'operation_data': self.od1, 'status': Status('done'),
+                'end_time': 'end'},
+            {'operation_data': self.od1, 'status': Status('running'),
+                'dispatch_id': '123'},
+        ])
+
+        self.assertEqual(['running', 'done'],
+                [str(u['status']) for u in updates])
+        self.assertEqual('start', updates[0]['start_time'])
+        self.assertEqual('123', updates[0]['dispatch_id'])
+        self.assertEqual('end', updates[1]['end_time'])
+
+    def test_later_update_only_fills_missing_fields(self):
+        updates = coalesce([
+            {'operation_data': self.od1, 'status': Status('running'),
+                'stdout': '1'},
+            {'operation_data': self.od1, 'status': Status('running'),
+                'stdout': 'X', 'stderr': '2'},
+        ])
+
+        self.assertEqual(1, len(updates))
+        self.assertEqual('1', updates[0]['stdout'])
+        self.assertEqual('2', updates[0]['stderr'])
+
+    def test_later_summary_overwrites_fields(self):
+        updates = coalesce([
+            {'operation_data': self.od1, 'status': Status('running'),
+                'name': 'op [new: 2]', 'is_summary': True},
+            {'operation_data': self.od1, 'status': Status('running'),
+                'name': 'op [new: 1, done: 1]', 'is_summary': True},
+        ])
+
+        self.assertEqual('op [new: 1, done: 1]', updates[0]['name'])
+
+    def test_higher_summary_wins_merge(self):
+        merged = merge_update_info(
+            {'operation_data': self.od1, 'status': Status('done'),
+                'name': 'op [done: 2]', 'is_summary': True},
+            {'operation_data': self.od1, 'status': Status('running'),
+                'name': 'op [new: 1, done: 1]', 'is_summary': True})
+
+        self.assertEqual('op [done: 2]', merged['name'])
+        self.assertEqual(Status('done'), merged['status'])
+
+    def test_equal_operation_data_from_different_objects(self):
+        other_od1 = OperationData(net_key='a', operation_id='1', color='0')
+        updates = coalesce([
+            {'operation_data': self.od1, 'status': Status('new')},
+            {'operation_data': other_od1, 'status': Status('new')},
+        ])
+
+        self.assertEqual(1, len(updates))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+from flow.petri_net.net import Net
+from flow_workflow import factory
+from flow_workflow import future_operation
+from flow_workflow.historian.context import HistorianContext
+from test_helpers.fakeredistest import FakeRedisTest
+
+import mock
+import unittest
+
+
+class HistorianContextTest(FakeRedisTest):
+    def setUp(self):
+        FakeRedisTest.setUp(self)
+        self.net = Net.create(self.conn, key='netkey')
+
+        root = future_operation.NullFutureOperation()
+        self.parent = future_operation.FutureOperation(
+                operation_class='null', operation_id=1, name='parent',
+                parent=root)
+        self.child = future_operation.FutureOperation(
+                operation_class='null', operation_id=2, name='child',
+                parent=self.parent)
+        future_operation.save_operations(self.net, [self.parent, self.child])
+
+        color_group = self.net.add_color_group(size=1)
+        self.token = self.net.create_token(color=color_group.begin,
+                color_group_idx=color_group.idx,
+                data={'workflow_data': {'parallel_id': [[3, 4]]}})
+
+    def tearDown(self):
+        for operation_id in [1, 2]:
+            factory.forget_operation(self.net.key, operation_id)
+        FakeRedisTest.tearDown(self)
+
+    def prefetch(self, **kwargs):
+        with mock.patch.object(self.conn, 'pipeline',
+                wraps=self.conn.pipeline) as pipeline:
+            context = HistorianContext.prefetch(self.net, self.token.index,
+                    **kwargs)
+            self.assertEqual(1, pipeline.call_count)
+        return context
+
+    def test_token_data(self):
+        context = self.prefetch(operation_id=2)
+        self.assertEqual({'workflow_data': {'parallel_id': [[3, 4]]}},
+                context.token_data)
+
+    def test_caches_operation_and_then_parent(self):
+        self.prefetch(operation_id=2)
+        self.assertEqual('child',
+                factory.cached_operation_dict(self.net, 2)['name'])
+        self.assertIsNone(factory.cached_operation_dict(self.net, 1))
+
+        self.prefetch(operation_id=2)
+        self.assertEqual('parent',
+                factory.cached_operation_dict(self.net, 1)['name'])
+
+    def test_children(self):
+        self.prefetch(operation_id=1)
+        self.prefetch(operation_id=1, include_children=True)
+        self.assertEqual('child',
+                factory.cached_operation_dict(self.net, 2)['name'])
+
+    def test_timestamp(self):
+        context = HistorianContext(token_data={}, now=(1363285207, 324852))
+        self.assertRegexpMatches(context.timestamp,
+                r'^2013-03-\d\d \d\d:\d\d:\d\d$')
+
+
+if __name__ == "__main__":
+    unittest.main()
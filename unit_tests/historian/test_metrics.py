@@ -0,0 +1,54 @@
+from flow_workflow.historian.metrics import StatementMetrics, statement_label
+
+import unittest
+
+
+class StatementLabelTest(unittest.TestCase):
+    def test_insert(self):
+        self.assertEqual('INSERT workflow.workflow_instance',
+                statement_label(' INSERT INTO WORKFLOW.workflow_instance '
+                    '(NAME) VALUES (:NAME)'))
+
+    def test_update(self):
+        self.assertEqual('UPDATE workflow.workflow_instance',
+                statement_label('    UPDATE WORKFLOW.workflow_instance '
+                    'SET NAME=:NAME WHERE id=:id'))
+
+    def test_select(self):
+        self.assertEqual('SELECT workflow.workflow_historian',
+                statement_label('\n    SELECT workflow_instance_id\n'
+                    '    FROM WORKFLOW.workflow_historian\n'
+                    '    WHERE net_key = :net_key'))
+
+
+class StatementMetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.metrics = StatementMetrics()
+
+    def test_record(self):
+        self.metrics.record('SELECT a FROM b', 0.5)
+        self.metrics.record('SELECT c FROM b', 0.25)
+        self.metrics.record('DELETE FROM b', 1.0)
+
+        self.assertEqual({
+            'SELECT b': {'count': 2, 'seconds': 0.75},
+            'DELETE b': {'count': 1, 'seconds': 1.0},
+        }, self.metrics.stats)
+        self.assertEqual(3, self.metrics.total_count)
+
+    def test_label_cache_bounded(self):
+        metrics = StatementMetrics(label_cache_size=2)
+        for table in ['a', 'b', 'c']:
+            metrics.record('SELECT x FROM %s' % table, 0.5)
+
+        self.assertEqual(2, len(metrics._labels))
+        self.assertEqual(3, metrics.total_count)
+
+    def test_reset(self):
+        self.metrics.record('SELECT a FROM b', 0.5)
+        self.metrics.reset()
+        self.assertEqual({}, self.metrics.stats)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -35,5 +35,15 @@ class OperationDataTests(TestCase):
         operation_data = OperationData.loads(self.string)
         self.assertEqual(self.operation_data, operation_data)
 
+    def test_hash(self):
+        operation_data = OperationData.loads(self.string)
+        self.assertEqual(hash(self.operation_data), hash(operation_data))
+        self.assertEqual(1, len(set([self.operation_data, operation_data])))
+
+    def test_not_equal(self):
+        operation_data = OperationData(net_key=self.net_key,
+                operation_id=self.operation_id, color=self.color + 1)
+        self.assertNotEqual(self.operation_data, operation_data)
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,32 @@
+from flow_workflow.historian import partitions
+
+import unittest
+
+
+class PartitionsTest(unittest.TestCase):
+    def test_partition_for_is_stable(self):
+        self.assertEqual(partitions.partition_for('some net key', 7),
+                partitions.partition_for('some net key', 7))
+
+    def test_partition_for_spreads_net_keys(self):
+        used = set(partitions.partition_for('net_%d' % i, 4)
+                for i in xrange(100))
+        self.assertEqual(set([0, 1, 2, 3]), used)
+
+    def test_names(self):
+        self.assertEqual('workflow_historian.update.3',
+                partitions.partition_routing_key('workflow_historian.update', 3))
+        self.assertEqual('workflow_historian_update_3',
+                partitions.partition_queue_name('workflow_historian_update', 3))
+
+    def test_routing_key_for_unpartitioned(self):
+        self.assertEqual('rk', partitions.routing_key_for('rk', 'net', 1))
+
+    def test_routing_key_for_partitioned(self):
+        partition = partitions.partition_for('net', 5)
+        self.assertEqual('rk.%d' % partition,
+                partitions.routing_key_for('rk', 'net', 5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,172 @@
+from flow_workflow.historian import partitions
+from flow_workflow.historian.service_interface import WorkflowHistorianServiceInterface
+from twisted.internet import defer, task
+
+import mock
+import unittest
+
+
+class WorkflowHistorianServiceInterfaceTest(unittest.TestCase):
+    def setUp(self):
+        self.broker = mock.Mock()
+        self.operation_data = {'net_key': 'netkey', 'operation_id': 4,
+                'color': 0}
+
+    def create_service_interface(self, **kwargs):
+        return WorkflowHistorianServiceInterface(broker=self.broker,
+                exchange='exchange', update_routing_key='rk', **kwargs)
+
+    def test_negative_workflow_plan_id_is_ignored(self):
+        si = self.create_service_interface(partitions=1)
+        si.update(operation_data=self.operation_data, name='foo',
+                workflow_plan_id=-1, status='new', user_name='user')
+        self.assertEqual(0, self.broker.publish.call_count)
+
+    def test_update(self):
+        si = self.create_service_interface(partitions=1)
+        si.update(operation_data=self.operation_data, name='foo',
+                workflow_plan_id=3, status='new', user_name='user')
+        self.broker.publish.assert_called_once_with('exchange', 'rk',
+                mock.ANY)
+
+    def test_partitioned_update(self):
+        si = self.create_service_interface(partitions=4)
+        si.update(operation_data=self.operation_data, name='foo',
+                workflow_plan_id=3, status='new', user_name='user')
+
+        expected_routing_key = 'rk.%d' % partitions.partition_for('netkey', 4)
+        self.broker.publish.assert_called_once_with('exchange',
+                expected_routing_key, mock.ANY)
+
+
+    def updates(self, net_keys):
+        return [{'operation_data': {'net_key': net_key, 'operation_id': i,
+                    'color': 0},
+                 'name': 'op %d' % i, 'workflow_plan_id': 3, 'status': 'new',
+                 'user_name': 'user'}
+                for i, net_key in enumerate(net_keys)]
+
+    def test_update_many(self):
+        si = self.create_service_interface(partitions=1,
+                update_batch_routing_key='batch_rk')
+        si.update_many(self.updates(['netkey'] * 3))
+
+        self.broker.publish.assert_called_once_with('exchange', 'batch_rk',
+                mock.ANY)
+        message = self.broker.publish.call_args[0][2]
+        self.assertEqual(['op 0', 'op 1', 'op 2'],
+                [u['name'] for u in message.updates])
+
+    def test_partitioned_update_many(self):
+        si = self.create_service_interface(partitions=4,
+                update_batch_routing_key='batch_rk')
+        net_keys = ['netkey', 'netkey', 'other netkey']
+        si.update_many(self.updates(net_keys))
+
+        expected_routing_keys = set('batch_rk.%d' %
+                partitions.partition_for(net_key, 4) for net_key in net_keys)
+        self.assertEqual(expected_routing_keys, set(c[0][1]
+            for c in self.broker.publish.call_args_list))
+
+    def test_update_many_without_batch_routing_key(self):
+        si = self.create_service_interface(partitions=1)
+        si.update_many(self.updates(['netkey'] * 3))
+
+        self.assertEqual(3, self.broker.publish.call_count)
+        self.broker.publish.assert_called_with('exchange', 'rk', mock.ANY)
+
+    def test_update_many_ignores_negative_workflow_plan_id(self):
+        si = self.create_service_interface(partitions=1,
+                update_batch_routing_key='batch_rk')
+        updates = self.updates(['netkey'] * 2)
+        for update in updates:
+            update['workflow_plan_id'] = -1
+        si.update_many(updates)
+
+        self.assertEqual(0, self.broker.publish.call_count)
+
+
+class BufferedPublishTest(unittest.TestCase):
+    def setUp(self):
+        self.broker = mock.Mock()
+        self.publishes = []
+        self.broker.publish.side_effect = self.publish
+
+        self.clock = task.Clock()
+        patcher = mock.patch(
+                'flow_workflow.historian.service_interface.reactor',
+                callLater=self.clock.callLater)
+        self.reactor = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.si = WorkflowHistorianServiceInterface(broker=self.broker,
+                exchange='exchange', update_routing_key='rk',
+                update_batch_routing_key='batch_rk', partitions=4,
+                publish_batch_size=3, publish_batch_window=0.1)
+
+    def publish(self, exchange, routing_key, message):
+        deferred = defer.Deferred()
+        self.publishes.append((routing_key, message, deferred))
+        return deferred
+
+    def update(self, net_key, operation_id):
+        return self.si.update(operation_data={'net_key': net_key,
+                    'operation_id': operation_id, 'color': 0},
+                name='op %d' % operation_id, workflow_plan_id=3,
+                status='new', user_name='user')
+
+    def test_flush_on_size(self):
+        deferreds = [self.update('netkey', i) for i in xrange(3)]
+
+        self.assertEqual(1, len(self.publishes))
+        routing_key, message, publish_deferred = self.publishes[0]
+        self.assertEqual('batch_rk.%d' % partitions.partition_for('netkey', 4),
+                routing_key)
+        self.assertEqual(['op 0', 'op 1', 'op 2'],
+                [u['name'] for u in message.updates])
+
+        self.assertFalse(any(d.called for d in deferreds))
+        publish_deferred.callback(None)
+        self.assertTrue(all(d.called for d in deferreds))
+
+    def test_flush_on_window(self):
+        self.update('netkey', 0)
+        self.assertEqual([], self.publishes)
+
+        self.clock.advance(0.1)
+        self.assertEqual(1, len(self.publishes))
+
+    def test_flush_on_shutdown(self):
+        self.update('netkey', 0)
+        self.reactor.addSystemEventTrigger.assert_called_once_with('before',
+                'shutdown', self.si.publisher.flush)
+
+    def test_failed_publish(self):
+        ok = self.update('netkey', 0)
+        failed = self.update('other netkey', 1)
+        self.si.publisher.flush()
+
+        by_net_key = dict((m.updates[0]['operation_data']['net_key'], d)
+                for _, m, d in self.publishes)
+        by_net_key['netkey'].callback(None)
+        by_net_key['other netkey'].errback(RuntimeError('nope'))
+
+        failures = []
+        failed.addErrback(failures.append)
+        self.assertTrue(ok.called)
+        self.assertTrue(failures[0].check(RuntimeError))
+
+    def test_update_many_is_buffered(self):
+        self.update('netkey', 0)
+        self.si.update_many([{'operation_data': {'net_key': 'netkey',
+                'operation_id': i, 'color': 0}, 'name': 'op %d' % i,
+                'workflow_plan_id': 3, 'status': 'new', 'user_name': 'user'}
+            for i in [1, 2]])
+
+        self.assertEqual(1, len(self.publishes))
+        self.assertEqual(['op 0', 'op 1', 'op 2'],
+                [u['name'] for u in self.publishes[0][1].updates])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,10 @@
 import unittest
 import copy
+import mock
 import sqlite3
 from collections import defaultdict
 from flow_workflow.historian.storage import WorkflowHistorianStorage
+from flow_workflow.historian.storage import SequenceAllocator
 from flow_workflow.historian import storage
 from sqlalchemy.exc import IntegrityError, OperationalError, SQLAlchemyError
 from flow_workflow.historian.status import Status
@@ -10,6 +12,10 @@ from flow_workflow.historian.operation_data import OperationData
 
 class TestHistorianStorage(WorkflowHistorianStorage):
     def __init__(self, *args, **kwargs):
+        kwargs.setdefault('id_cache_size', 1000)
+        kwargs.setdefault('id_cache_ttl', None)
+        kwargs.setdefault('id_block_size', 5)
+        kwargs.setdefault('pool_size', 1)
         WorkflowHistorianStorage.__init__(self, *args, **kwargs)
         self._ids = defaultdict(lambda:0)
 
@@ -254,6 +260,29 @@ class TestStorage(unittest.TestCase):
         self._test_instance(parallel_index=9)
         self._test_execution(status='done', stdout='1', stderr='2')
 
+    def test_summary_update_overwrites_same_status(self):
+        self.update_info['status'] = Status('running')
+        self.update_info['is_summary'] = True
+        self.s.update(self.update_info)
+
+        self.update_info['name'] = 'test_name [done: 1]'
+        self.s.update(self.update_info)
+
+        self.irows[0]['name'] = 'test_name [done: 1]'
+        self._test_instance(rows=self.irows)
+
+    def test_stale_summary_update_ignored(self):
+        self.update_info['is_summary'] = True
+        self.update_info['status'] = Status('done')
+        self.s.update(self.update_info)
+
+        self.update_info['status'] = Status('running')
+        self.update_info['name'] = 'test_name [new: 1]'
+        self.s.update(self.update_info)
+
+        self._test_instance(name='test_name')
+        self._test_execution(status='done')
+
     def test_overwriting_status_update(self):
         self.update_info['status'] = Status('new')
         self.update_info['stdout'] = '1'
@@ -384,3 +413,245 @@ class TestStorage(unittest.TestCase):
                 {'name':'another-peer-guy', 'peer_instance_id':1},
         ]
         self._test_instance(rows=rows)
+
+    def test_update_many(self):
+        u1 = copy.copy(self.update_info)
+        u2 = copy.copy(self.update_info)
+        u2['operation_data'] = OperationData(net_key=self.net_key,
+                operation_id=5678, color=self.color)
+        u2['status'] = Status('running')
+
+        self.s.update_many([u1, u2])
+
+        rows = [
+                {'status':'new'},
+                {'status':'running'}
+        ]
+        self._test_execution(rows=rows)
+
+    def test_update_many_merges_same_operation(self):
+        u1 = copy.copy(self.update_info)
+        u1['status'] = Status('running')
+        u1['stdout'] = '1'
+
+        u2 = copy.copy(self.update_info)
+        u2['status'] = Status('new')
+        u2['stdout'] = 'X'
+        u2['stderr'] = '2'
+
+        u3 = copy.copy(self.update_info)
+        u3['status'] = Status('done')
+        u3['dispatch_id'] = 'P123'
+
+        self.s.update_many([u1, u2, u3])
+
+        self._test_instance(rows=self.irows)
+        self._test_execution(status='done', stdout='1', stderr='2',
+                dispatch_id='P123')
+
+    def test_update_many_matches_sequential_updates(self):
+        def updates(operation_id):
+            operation_data = OperationData(net_key=self.net_key,
+                    operation_id=operation_id, color=self.color)
+            result = []
+            for status, fields in [('running', {'stdout': '1'}),
+                    ('crashed', {'stdout': 'X', 'stderr': '2'})]:
+                update_info = copy.copy(self.update_info)
+                update_info.update(fields, status=Status(status),
+                        operation_data=operation_data)
+                result.append(update_info)
+            return result
+
+        for operation_id in [5, 6]:
+            update_info = copy.copy(self.update_info)
+            update_info['operation_data'] = OperationData(
+                    net_key=self.net_key, operation_id=operation_id,
+                    color=self.color)
+            update_info['status'] = Status('done')
+            self.s.update(update_info)
+
+        for update_info in updates(5):
+            self.s.update(update_info)
+        self.s.update_many(updates(6))
+
+        expected = {'status': 'done', 'stdout': '1', 'stderr': '2'}
+        self._test_execution(rows=[expected, expected])
+
+    def test_update_many_reserves_ids(self):
+        updates = []
+        for operation_id in [5, 6, 7]:
+            update_info = copy.copy(self.update_info)
+            update_info['operation_data'] = OperationData(
+                    net_key=self.net_key, operation_id=operation_id,
+                    color=self.color)
+            updates.append(update_info)
+
+        with mock.patch.object(self.s.id_allocators.instance, 'reserve',
+                wraps=self.s.id_allocators.instance.reserve) as reserve:
+            self.s.update_many(updates)
+            reserve.assert_called_once_with(mock.ANY, 3)
+
+        self._test_instance(rows=[{'workflow_instance_id': i}
+            for i in [1, 2, 3]])
+
+    def test_id_cache_filled_on_insert(self):
+        self.s.update(self.update_info)
+        self.assertEqual(1, self.s.id_cache.get(
+            ('instance_id', self.net_key, self.operation_id, self.color)))
+
+        self.update_info['status'] = Status('done')
+        self.s.update(self.update_info)
+        self.assertEqual(0, self.s.id_cache.misses)
+
+    def test_id_cache_used_for_parent_lookups(self):
+        parent_operation_data = OperationData(net_key=self.net_key,
+                operation_id=4567, color=self.color)
+        for operation_id in [1, 2, 3]:
+            self.update_info['operation_data'] = OperationData(
+                    net_key=self.net_key, operation_id=operation_id,
+                    color=self.color)
+            self.update_info['parent_operation_data'] = parent_operation_data
+            self.s.update(self.update_info)
+
+        # the parent row is created once and found in the cache afterwards
+        self.assertEqual(2, self.s.id_cache.hits)
+        self._test_instance(rows=[{'parent_instance_id': 2}, {},
+            {'parent_instance_id': 2}, {'parent_instance_id': 2}])
+
+    def test_id_cache_invalidated_on_rollback(self):
+        u1 = copy.copy(self.update_info)
+        u2 = copy.copy(self.update_info)
+        u2['operation_data'] = OperationData(net_key=self.net_key,
+                operation_id=5678, color=self.color)
+        del u2['name']
+
+        with self.assertRaises(KeyError):
+            self.s.update_many([u1, u2])
+
+        self.assertEqual(0, len(self.s.id_cache))
+        self._test_instance(rows=[])
+
+    def test_new_ids_published_on_commit(self):
+        operation_data = self.update_info['operation_data']
+        transaction = storage.SimpleTransaction(self.e)
+        self.s._recursive_insert_or_update(transaction, self.update_info)
+
+        # other transactions must not see the uncommitted row
+        self.assertEqual(0, len(self.s.id_cache))
+        self.assertTrue(self.s._is_known(transaction, operation_data))
+
+        transaction.commit()
+        self.assertEqual(2, len(self.s.id_cache))
+        other_transaction = storage.SimpleTransaction(self.e)
+        self.assertTrue(self.s._is_known(other_transaction, operation_data))
+        other_transaction.rollback()
+
+    def test_id_cache_invalidated_on_failed_commit(self):
+        with mock.patch.object(storage.SimpleTransaction, 'commit',
+                side_effect=OperationalError('COMMIT', {}, None)):
+            with self.assertRaises(OperationalError):
+                self.s.update(self.update_info)
+
+        self.assertEqual(0, len(self.s.id_cache))
+        self._test_instance(rows=[])
+
+    def test_failing_commit_callback_error_raised(self):
+        with mock.patch.object(self.s, '_publish_ids',
+                side_effect=ValueError):
+            with self.assertRaises(ValueError):
+                self.s.update(self.update_info)
+
+        # the commit itself went through
+        self._test_instance(rows=self.irows)
+
+    def test_update_logs_id_cache_stats(self):
+        with mock.patch.object(storage.LOG, 'isEnabledFor',
+                return_value=True):
+            with mock.patch.object(storage.LOG, 'debug') as debug:
+                self.s.update(self.update_info)
+        debug.assert_any_call("Historian id cache: %s", self.s.id_cache.stats)
+
+    def test_stats_skipped_without_debug_logging(self):
+        with mock.patch.object(storage.LOG, 'isEnabledFor',
+                return_value=False):
+            with mock.patch.object(storage.StatementMetrics, 'stats',
+                    new_callable=mock.PropertyMock) as stats:
+                self.s.update(self.update_info)
+        self.assertFalse(stats.called)
+
+    def test_claim_historian_row(self):
+        operation_data = self.update_info['operation_data']
+        transaction = storage.SimpleTransaction(self.e)
+        self.assertTrue(self.s._claim_historian_row(transaction,
+            operation_data))
+        self.assertFalse(self.s._claim_historian_row(transaction,
+            operation_data))
+        transaction.rollback()
+
+    def test_known_operation_skips_insert(self):
+        self.s.update(self.update_info)
+
+        self.update_info['status'] = Status('done')
+        with mock.patch.object(self.s, '_claim_historian_row') as claim:
+            self.s.update(self.update_info)
+            self.assertEqual(0, claim.call_count)
+
+        self._test_execution(status='done')
+
+    def test_unknown_existing_operation_is_updated(self):
+        self.s.update(self.update_info)
+        self.s.id_cache.clear()
+
+        self.update_info['status'] = Status('done')
+        self.s.update(self.update_info)
+
+        self._test_instance(rows=self.irows)
+        self._test_execution(status='done')
+
+    def test_statement_metrics(self):
+        self.s.update(self.update_info)
+
+        stats = self.s.statement_metrics.stats
+        self.assertEqual(1, stats['INSERT workflow.workflow_instance']['count'])
+        self.assertEqual(1,
+                stats['INSERT workflow.workflow_instance_execution']['count'])
+
+    def test_statements_not_rendered_without_debug(self):
+        with mock.patch.object(storage, 'log_statement') as log_statement:
+            with mock.patch.object(storage.LOG, 'isEnabledFor',
+                    return_value=False):
+                self.s.update(self.update_info)
+            self.assertEqual(0, log_statement.call_count)
+
+class SequenceAllocatorTest(unittest.TestCase):
+    def setUp(self):
+        self.next_value = 0
+        self.calls = []
+        self.allocator = SequenceAllocator(self.fetch_ids, 'seq',
+                block_size=3)
+
+    def fetch_ids(self, transaction, sequence_name, count):
+        self.calls.append((sequence_name, count))
+        values = range(self.next_value + 1, self.next_value + count + 1)
+        self.next_value += count
+        return values
+
+    def test_next_fetches_blocks(self):
+        values = [self.allocator.next(None) for _ in xrange(7)]
+
+        self.assertEqual(range(1, 8), values)
+        self.assertEqual([('seq', 3)] * 3, self.calls)
+        self.assertEqual(2, len(self.allocator))
+
+    def test_reserve(self):
+        self.allocator.next(None)
+        self.allocator.reserve(None, 10)
+
+        self.assertEqual([('seq', 3), ('seq', 8)], self.calls)
+        self.assertEqual(10, len(self.allocator))
+        self.assertEqual(2, self.allocator.next(None))
+
+    def test_reserve_already_available(self):
+        self.allocator.next(None)
+        self.allocator.reserve(None, 2)
+        self.assertEqual([('seq', 3)], self.calls)
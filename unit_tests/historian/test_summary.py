@@ -0,0 +1,92 @@
+from flow.petri_net.net import Net
+from flow_workflow import factory
+from flow_workflow import future_operation
+from flow_workflow.historian import summary
+from flow_workflow.parallel_id import ParallelIdentifier
+from test_helpers.fakeredistest import FakeRedisTest
+
+import unittest
+
+
+class SummaryTest(FakeRedisTest):
+    def setUp(self):
+        FakeRedisTest.setUp(self)
+        self.net = Net.create(self.conn, key='netkey')
+
+        root = future_operation.NullFutureOperation()
+        self.outer = future_operation.FutureOperation(
+                operation_class='null', operation_id=1, name='outer',
+                parent=root, parallel_by_summarize_threshold=10)
+        self.inner = future_operation.FutureOperation(
+                operation_class='null', operation_id=2, name='inner',
+                parent=self.outer, parallel_by_summarize_threshold=2)
+        self.plain = future_operation.FutureOperation(
+                operation_class='null', operation_id=3, name='plain',
+                parent=self.inner)
+        future_operation.save_operations(self.net,
+                [self.outer, self.inner, self.plain])
+
+    def tearDown(self):
+        for operation_id in [1, 2, 3]:
+            factory.forget_operation(self.net.key, operation_id)
+        FakeRedisTest.tearDown(self)
+
+    def test_below_threshold(self):
+        self.assertIsNone(summary.summary_for(self.net,
+            ParallelIdentifier()))
+        self.assertIsNone(summary.summary_for(self.net,
+            ParallelIdentifier([[1, 9], [2, 1], [3, 50]])))
+
+    def test_summary_for(self):
+        result = summary.summary_for(self.net,
+                ParallelIdentifier([[1, 3], [2, 2], [3, 0]]))
+        self.assertEqual(2, result.operation_id)
+        self.assertEqual(ParallelIdentifier([[1, 3]]), result.parallel_id)
+        self.assertEqual(2, result.index)
+
+    def test_outermost_summary(self):
+        result = summary.summary_for(self.net,
+                ParallelIdentifier([[1, 10], [2, 5]]))
+        self.assertEqual(1, result.operation_id)
+        self.assertEqual(ParallelIdentifier(), result.parallel_id)
+
+    def record(self, index, status):
+        return summary.summary_for(self.net,
+                ParallelIdentifier([[1, 3], [2, index]])).record(
+                        self.net, status)
+
+    def test_counts_by_status(self):
+        for index in [2, 3, 4]:
+            self.record(index, 'new')
+        self.record(2, 'running')
+        self.record(2, 'done')
+        self.record(3, 'crashed')
+
+        self.assertEqual({'new': 1, 'crashed': 1, 'done': 1},
+                summary.counts(self.net, 2, ParallelIdentifier([[1, 3]])))
+        self.assertEqual({}, summary.counts(self.net, 2,
+            ParallelIdentifier([[1, 4]])))
+
+    def test_record_ignores_earlier_status(self):
+        self.record(2, 'done')
+        self.assertFalse(self.record(2, 'running'))
+
+        self.assertEqual({'done': 1},
+                summary.counts(self.net, 2, ParallelIdentifier([[1, 3]])))
+
+    def test_record_due_every_threshold_changes(self):
+        # the threshold of operation 2 is 2
+        self.assertEqual([False, True, False, True],
+                [self.record(index, 'new') for index in [2, 3, 4, 5]])
+
+    def test_summary_color(self):
+        self.assertEqual(-1, summary.summary_color(0))
+        self.assertEqual(-8, summary.summary_color(7))
+
+    def test_summarized_name(self):
+        self.assertEqual('foo [crashed: 1, done: 2]',
+                summary.summarized_name('foo', {'done': 2, 'crashed': 1}))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+from flow_workflow.historian.workers import StorageWorkerPool
+from twisted.internet import defer
+
+import mock
+import unittest
+
+
+class StorageWorkerPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = mock.Mock()
+        self.pool = StorageWorkerPool(size=2, clock=self.clock)
+        self.pool.threadpool = mock.Mock()
+
+        self.started = []
+        patcher = mock.patch('twisted.internet.threads.deferToThreadPool',
+                self.fake_defer_to_thread_pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fake_defer_to_thread_pool(self, clock, threadpool, func, *args):
+        deferred = defer.Deferred()
+        self.started.append((func, args, deferred))
+        return deferred
+
+    def test_lane_is_stable(self):
+        key = ('net_key', 3)
+        self.assertEqual(self.pool.lane(key), self.pool.lane(key))
+        self.assertTrue(0 <= self.pool.lane(key) < 2)
+
+    def test_same_lane_is_serialized(self):
+        first = self.pool.run_in_lane(0, 'func', 1)
+        second = self.pool.run_in_lane(0, 'func', 2)
+
+        self.assertEqual([('func', (1,))],
+                [(f, a) for f, a, d in self.started])
+
+        self.started[0][2].callback('one')
+        self.assertEqual('one', first.result)
+        self.assertEqual(2, len(self.started))
+        self.assertEqual((2,), self.started[1][1])
+
+        self.started[1][2].callback('two')
+        self.assertEqual('two', second.result)
+
+    def test_different_lanes_run_concurrently(self):
+        self.pool.run_in_lane(0, 'func', 1)
+        self.pool.run_in_lane(1, 'func', 2)
+        self.assertEqual(2, len(self.started))
+
+    def test_starts_threadpool_once(self):
+        self.pool.run_in_lane(0, 'func')
+        self.pool.run_in_lane(1, 'func')
+        self.pool.threadpool.start.assert_called_once_with()
+        self.clock.addSystemEventTrigger.assert_called_once_with('during',
+                'shutdown', self.pool.stop)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,6 @@
 from flow_workflow import future_operation
 from flow_workflow import factory
+from flow_workflow import io
 from flow.petri_net import color
 from flow.petri_net.net import Net
 from flow_workflow.parallel_by import actions
@@ -98,6 +99,70 @@ class PBSplitExecuteTest(fakeredistest.FakeRedisTest):
                         parallel_id=ParallelIdentifier().child_identifier(
                             self.operation_id, i)))
 
+class PBSplitThrottledExecuteTest(PBSplitExecuteTest):
+    def create_action(self):
+        self.args = {
+            'parallel_property': self.parallel_property,
+            'operation_id': self.operation_id,
+            'limit': 2,
+        }
+        return actions.ParallelBySplit.create(self.conn, args=self.args)
+
+    def test_execute(self):
+        tokens, deferred = self.action.execute(net=self.net,
+                color_descriptor=self.parent_color_descriptor,
+                active_tokens=set(),
+                service_interfaces=self.service_interfaces)
+
+        self.assertEqual(2, len(tokens))
+        self.assertEqual(2, self.net.variables[
+            actions._next_index_variable_name(self.operation_id,
+                tokens[0].color_group_idx)])
+
+        # all inputs are stored up front
+        self.assertEqual('c', self.operation.load_input(self.parallel_property,
+            parallel_id=ParallelIdentifier().child_identifier(
+                self.operation_id, 2)))
+
+
+class PBReleaseExecuteTest(fakeredistest.FakeRedisTest):
+    def setUp(self):
+        fakeredistest.FakeRedisTest.setUp(self)
+
+        self.net = Net.create(self.conn)
+        self.operation_id = 42
+        self.action = actions.ParallelByRelease.create(self.conn,
+                args={'operation_id': self.operation_id})
+
+        self.color_group = self.net.add_color_group(size=3)
+        self.net.set_variable(actions._next_index_variable_name(
+            self.operation_id, self.color_group.idx), 2)
+
+        self.color_descriptor = color.ColorDescriptor(
+                color=self.color_group.begin, group=self.color_group)
+        self.token = self.net.create_token(color=self.color_group.begin,
+                color_group_idx=self.color_group.idx,
+                data={'workflow_data': {
+                    'parallel_id': [[7, 1], [self.operation_id, 0]]}})
+
+    def execute(self):
+        tokens, deferred = self.action.execute(net=self.net,
+                color_descriptor=self.color_descriptor,
+                active_tokens=[self.token.index],
+                service_interfaces={})
+        return tokens
+
+    def test_releases_next_child_once(self):
+        tokens = self.execute()
+
+        self.assertEqual(1, len(tokens))
+        self.assertEqual(self.color_group.begin + 2, tokens[0].color)
+        self.assertEqual([[7, 1], [self.operation_id, 2]],
+                tokens[0].data.value['workflow_data']['parallel_id'])
+
+        self.assertEqual([], self.execute())
+
+
 class PBJoinExecuteTest(fakeredistest.FakeRedisTest):
     def setUp(self):
         fakeredistest.FakeRedisTest.setUp(self)
@@ -220,20 +285,23 @@ class ParallelBySplitTest(fakeredistest.FakeRedisTest):
 
 
     def test_store_parallel_input(self):
-        net = mock.MagicMock()
-        net.key = 'netkey'
         parallel_input = ['a', 'b', 'c']
-
-        self.action.store_parallel_input(operation=self.operation,
-                parallel_input=parallel_input,
-                parallel_property=self.parallel_property,
-                parallel_id=self.parallel_id)
-
-        self.assertEqual(3, self.operation.store_input.call_count)
-        for pi in parallel_input:
-            self.operation.store_input.assert_any_call(
-                    name=self.parallel_property, value=pi,
-                    parallel_id=mock.ANY)
+        storage_op = mock.Mock()
+        self.operation.input_destination.return_value = (storage_op, 'sbar')
+
+        with mock.patch('flow_workflow.io.store_output_array') as store:
+            self.action.store_parallel_input(operation=self.operation,
+                    parallel_input=parallel_input,
+                    parallel_property=self.parallel_property,
+                    parallel_id=self.parallel_id)
+
+            store.assert_called_once_with(net=storage_op.net,
+                    operation_id=storage_op.operation_id,
+                    property_name='sbar', parallel_id=self.parallel_id,
+                    parallel_operation_id=self.operation.operation_id,
+                    values=parallel_input)
+        self.operation.input_destination.assert_called_once_with(
+                self.parallel_property)
 
     def test_create_tokens(self):
         color_group = color.ColorGroup(idx=27, parent_color=892,
@@ -252,6 +320,9 @@ class ParallelBySplitTest(fakeredistest.FakeRedisTest):
         self.assertEqual(num_tokens, len(net.create_token.mock_calls))
         net.create_token.assert_any_call(color=color_group.begin,
                 color_group_idx=color_group.idx, data=mock.ANY)
+        last_data = net.create_token.call_args[1]['data']
+        self.assertEqual([(42, 3), (self.operation_id, num_tokens - 1)],
+                last_data['workflow_data']['parallel_id'])
 
 class ParallelByJoinTest(fakeredistest.FakeRedisTest):
     def setUp(self):
@@ -279,19 +350,67 @@ class ParallelByJoinTest(fakeredistest.FakeRedisTest):
         property_name = 'bar'
         parallel_size = 3
         parallel_id = ParallelIdentifier([(42, 7)])
+        storage_op = mock.Mock()
+        self.operation.output_source.return_value = (storage_op, 'sbar')
+
+        with mock.patch('flow_workflow.io.load_output_array') as load:
+            results = self.action.collect_array_output(net=self.net,
+                    property_name=property_name, parallel_size=parallel_size,
+                    operation=self.operation,
+                    parallel_id=parallel_id)
+
+            self.assertEqual(load.return_value, results)
+            load.assert_called_once_with(net=storage_op.net,
+                    operation_id=storage_op.operation_id,
+                    property_name='sbar', parallel_id=parallel_id,
+                    parallel_operation_id=self.operation.operation_id,
+                    size=parallel_size)
+        self.operation.output_source.assert_called_once_with(property_name)
+
+    def _move_setup(self):
+        net = Net.create(self.conn, key='netkey')
+        storage_op = mock.Mock(net=net, net_key=net.key, operation_id=4)
+        self.operation.operation_id = 9
+        self.operation.output_source.return_value = (storage_op, 'a')
+        self.operation.output_destination.return_value = (storage_op, 'a')
+
+        parallel_id = ParallelIdentifier([(7, 1)])
+        io.store_output_array(net=net, operation_id=4, property_name='a',
+                parallel_id=parallel_id, parallel_operation_id=9,
+                values=['x', 'y'])
+        return net, parallel_id
+
+    def test_move_array_output_twice(self):
+        net, parallel_id = self._move_setup()
+
+        for attempt in xrange(2):
+            self.assertTrue(self.action.move_array_output(
+                property_name='bar', parallel_size=2,
+                operation=self.operation, parallel_id=parallel_id,
+                moved_keys=set()))
+            self.assertEqual(['x', 'y'], io.load_output(net=net,
+                operation_id=4, property_name='a', parallel_id=parallel_id))
+
+    def test_move_array_output_shared_storage(self):
+        net, parallel_id = self._move_setup()
+
+        moved_keys = set()
+        for property_name in ['bar', 'baz']:
+            self.assertTrue(self.action.move_array_output(
+                property_name=property_name, parallel_size=2,
+                operation=self.operation, parallel_id=parallel_id,
+                moved_keys=moved_keys))
+        self.assertEqual(['x', 'y'], io.load_output(net=net,
+            operation_id=4, property_name='a', parallel_id=parallel_id))
+
+    def test_collect_array_output_null_source(self):
+        self.operation.output_source.return_value = None
 
         results = self.action.collect_array_output(net=self.net,
-                property_name=property_name, parallel_size=parallel_size,
+                property_name='bar', parallel_size=2,
                 operation=self.operation,
-                parallel_id=parallel_id)
-
-        self.assertEqual(parallel_size,
-                len(self.operation.load_output.mock_calls))
-        self.assertEqual([self.operation.load_output.return_value
-            for x in xrange(parallel_size)],
-                results)
-        self.operation.load_output.assert_any_call(
-                name=property_name, parallel_id=mock.ANY)
+                parallel_id=ParallelIdentifier())
+        self.assertEqual([None, None], results)
 
 
 class ParallelByFailTest(fakeredistest.FakeRedisTest):
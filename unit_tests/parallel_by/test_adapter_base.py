@@ -53,10 +53,39 @@ class ParallelByPerlActionAdapterBaseTest(unittest.TestCase):
         self.assertEqual('foo', self.adapter.parallel_by)
 
     def test_future_net(self):
-        net = self.adapter.future_net(
-                resources=mock.Mock())
+        net = self.adapter.future_net(resources={})
         self.assertIsInstance(net, future_nets.ParallelByNet)
 
+    def test_parallel_by_limit(self):
+        self.assertIsNone(self.adapter.parallel_by_limit({}))
+        self.assertEqual(5,
+                self.adapter.parallel_by_limit({'parallel_by_limit': 5}))
+
+        self.adapter.xml.attrib['parallelByLimit'] = '3'
+        self.assertEqual(3, self.adapter.parallel_by_limit({}))
+        self.assertEqual(5,
+                self.adapter.parallel_by_limit({'parallel_by_limit': 5}))
+
+    def test_parallel_by_summarize_threshold(self):
+        self.assertIsNone(self.adapter.parallel_by_summarize_threshold({}))
+
+        self.adapter.xml.attrib['parallelBySummarizeThreshold'] = '3'
+        self.assertEqual(3, self.adapter.parallel_by_summarize_threshold({}))
+        self.assertEqual(5, self.adapter.parallel_by_summarize_threshold(
+            {'parallel_by_summarize_threshold': 5}))
+
+    def test_future_operation_summarize_threshold(self):
+        future_operation = self.adapter.future_operation(self.parent,
+                input_connections={}, output_properties=[],
+                resources={'parallel_by_summarize_threshold': 2})
+        self.assertEqual(2,
+                future_operation.kwargs['parallel_by_summarize_threshold'])
+
+        future_operation = self.adapter.future_operation(self.parent,
+                input_connections={}, output_properties=[])
+        self.assertNotIn('parallel_by_summarize_threshold',
+                future_operation.kwargs)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -52,6 +52,34 @@ class ParallelByNetTest(unittest.TestCase):
         self.assertIn(self.net.internal_failure_transition,
                 self.net.failing_place.arcs_out)
 
+    def test_no_release_path_without_limit(self):
+        self.assertFalse(hasattr(self.net, 'release_transition'))
+
+
+class ThrottledParallelByNetTest(unittest.TestCase):
+    def setUp(self):
+        self.target_net = WorkflowNetBase(name='supernet',
+                operation_id='12345')
+        self.net = future_nets.ParallelByNet(target_net=self.target_net,
+                parallel_property='foo', limit=10)
+
+    def test_split_limit(self):
+        self.assertEqual(10, self.net.split_transition.action.args['limit'])
+
+    def test_release_path(self):
+        self.assertIn(self.net.releasing_place,
+                self.target_net.success_transition.arcs_out)
+        self.assertIn(self.net.releasing_place,
+                self.target_net.failure_transition.arcs_out)
+        self.assertIn(self.net.release_transition,
+                self.net.releasing_place.arcs_out)
+        self.assertIn(self.net.succeeding_split_place,
+                self.net.release_transition.arcs_out)
+
+        # the join still sees every successful child
+        self.assertIn(self.net.starting_join_place,
+                self.target_net.success_transition.arcs_out)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -2,6 +2,7 @@ from flow.petri_net import color
 from flow_workflow.perl_action import actions
 from flow_workflow.parallel_id import ParallelIdentifier
 from flow_workflow.historian.operation_data import OperationData
+from flow_workflow.net_constants import forget_constants
 
 import fakeredis
 import mock
@@ -21,6 +22,7 @@ class PerlActionTest(unittest.TestCase):
 
         self.net = mock.MagicMock()
         self.net.key = 'netkey'
+        forget_constants(self.net.key)
 
     def test_environment(self):
         operation_id = 999
@@ -55,8 +57,10 @@ class PerlActionTest(unittest.TestCase):
             factory.load_operation.assert_called_once_with(self.net,
                     self.args['operation_id'])
 
-        self.net.constant.assert_called_once_with('environment', {})
+        self.net.constant.assert_called_once_with('environment', mock.ANY)
         self.assertEqual(expected_environment, result_env)
+        # the cached environment is not modified
+        self.assertEqual({'foo': 'bar', 'baz': 'buz'}, environment)
 
     def test_command_line_no_parallel_index(self):
         expected_value = [
@@ -0,0 +1,69 @@
+from flow_workflow.cache import LRUCache
+
+import mock
+import unittest
+
+
+class LRUCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = mock.Mock(return_value=100)
+        self.cache = LRUCache(max_size=2, ttl=10, clock=self.clock)
+
+    def test_get_missing(self):
+        self.assertEqual(None, self.cache.get('a'))
+        self.assertEqual('default', self.cache.get('a', 'default'))
+        self.assertEqual(2, self.cache.misses)
+        self.assertEqual(0, self.cache.hits)
+
+    def test_set_get(self):
+        self.cache.set('a', 1)
+        self.assertEqual(1, self.cache.get('a'))
+        self.assertEqual(1, self.cache.hits)
+        self.assertTrue('a' in self.cache)
+
+    def test_evicts_least_recently_used(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+
+        self.assertEqual(2, len(self.cache))
+        self.assertFalse('b' in self.cache)
+        self.assertTrue('a' in self.cache)
+        self.assertTrue('c' in self.cache)
+
+    def test_ttl(self):
+        self.cache.set('a', 1)
+        self.clock.return_value = 109
+        self.assertEqual(1, self.cache.get('a'))
+
+        self.clock.return_value = 110
+        self.assertEqual(None, self.cache.get('a'))
+
+    def test_no_ttl(self):
+        cache = LRUCache(max_size=2, clock=self.clock)
+        cache.set('a', 1)
+        self.clock.return_value = 1e12
+        self.assertEqual(1, cache.get('a'))
+
+    def test_disabled(self):
+        cache = LRUCache(max_size=0)
+        cache.set('a', 1)
+        self.assertEqual(0, len(cache))
+
+    def test_discard(self):
+        self.cache.set('a', 1)
+        self.cache.discard('a')
+        self.cache.discard('never set')
+        self.assertEqual(0, len(self.cache))
+
+    def test_stats(self):
+        self.cache.set('a', 1)
+        self.cache.get('a')
+        self.cache.get('b')
+        self.assertEqual({'hits': 1, 'misses': 1, 'size': 1},
+                self.cache.stats)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+from flow_workflow import compiled_workflow
+from flow_workflow.future_operation import FutureOperation
+from flow_workflow.future_operation import ForeignFutureOperation
+from flow_workflow.future_operation import NullFutureOperation
+
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+
+def _future_operations(root_operation, input_connections,
+        output_properties):
+    inputs = FutureOperation(operation_class='direct_storage',
+            operation_id=0, name='InputStorage', parent=root_operation)
+    model = FutureOperation(operation_class='model', operation_id=1,
+            name='model', parent=root_operation)
+    command = FutureOperation(operation_class='command', operation_id=2,
+            name='command', parent=model)
+    return [inputs, model, command]
+
+
+class CompiledWorkflowTest(unittest.TestCase):
+    def setUp(self):
+        self.workflow = mock.Mock()
+        self.workflow.future_net.return_value = {'name': 'future net'}
+        self.workflow.future_operations.side_effect = _future_operations
+        self.workflow.inputs_storage_adapter.operation_id = 0
+        self.workflow.child_adapter.operation_id = 1
+        self.workflow.output_properties = ['out']
+
+        self.compiled = compiled_workflow.CompiledWorkflow.compile(
+                self.workflow, resources={'model': {}})
+
+    def test_compile(self):
+        self.workflow.future_net.assert_called_once_with({'model': {}})
+        self.assertEqual({'name': 'future net'}, self.compiled.future_net)
+        self.assertEqual(1, self.compiled.child_operation_id)
+        self.assertEqual(['out'], self.compiled.output_properties)
+
+    def test_future_operations_reparents_top_level(self):
+        operation_data = mock.Mock(operation_id=77, net_key='parent_net')
+        parent = ForeignFutureOperation(operation_data=operation_data)
+
+        fops = self.compiled.future_operations(parent)
+        dicts = [fop.as_dict(default_net_key='net') for fop in fops]
+
+        self.assertEqual([77, 77, 1],
+                [d['parent_operation_id'] for d in dicts])
+        self.assertEqual(['parent_net', 'parent_net', 'net'],
+                [d['parent_net_key'] for d in dicts])
+        self.assertEqual({'command': ('net', 2)}, dicts[1]['children'])
+
+    def test_future_operations_does_not_modify_template(self):
+        self.compiled.future_operations(ForeignFutureOperation(
+            operation_data=mock.Mock(operation_id=77, net_key='parent_net')))
+
+        fops = self.compiled.future_operations(NullFutureOperation())
+        self.assertEqual(None, fops[0].as_dict(
+            default_net_key='net')['parent_operation_id'])
+
+    def test_input_variables(self):
+        self.assertEqual({'_wf_outp_0_a': 'A', '_wf_outp_0_b': 'B'},
+                self.compiled.input_variables({'a': 'A', 'b': 'B'}))
+
+
+class CacheKeyTest(unittest.TestCase):
+    def setUp(self):
+        fd, self.xml_filename = tempfile.mkstemp()
+        with os.fdopen(fd, 'w') as f:
+            f.write('<workflow/>')
+
+    def tearDown(self):
+        os.remove(self.xml_filename)
+
+    def key(self, input_names=('a', 'b'), resources=None,
+            local_workflow=False):
+        return compiled_workflow.cache_key(self.xml_filename,
+                input_names=input_names, resources=resources or {},
+                local_workflow=local_workflow)
+
+    def test_stable(self):
+        self.assertEqual(self.key(), self.key(input_names=['b', 'a']))
+
+    def test_depends_on_everything(self):
+        keys = set([self.key(), self.key(input_names=['a']),
+            self.key(resources={'x': {'cpu': 2}}),
+            self.key(local_workflow=True)])
+        self.assertEqual(4, len(keys))
+
+        with open(self.xml_filename, 'w') as f:
+            f.write('<workflow name="other"/>')
+        self.assertNotIn(self.key(), keys)
+
+
+class CompiledWorkflowCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = compiled_workflow.CompiledWorkflowCache(
+                os.path.join(self.directory, 'cache'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_miss(self):
+        self.assertIsNone(self.cache.get('abc'))
+
+    def test_round_trip(self):
+        root = NullFutureOperation()
+        fops = _future_operations(root, None, None)
+        self.cache.set('abc', compiled_workflow.CompiledWorkflow(
+            future_net={'name': 'future net'}, future_operations=fops,
+            root_operation=root, input_storage_operation_id=0,
+            child_operation_id=1, output_properties=['out']))
+
+        loaded = self.cache.get('abc')
+        self.assertEqual({'name': 'future net'}, loaded.future_net)
+
+        parent = ForeignFutureOperation(operation_data=mock.Mock(
+            operation_id=77, net_key='parent_net'))
+        self.assertEqual([77, 77, 1],
+                [fop.as_dict('net')['parent_operation_id']
+                    for fop in loaded.future_operations(parent)])
+
+    def test_corrupt_entry_is_a_miss(self):
+        os.makedirs(self.cache.directory, 0700)
+        with open(self.cache._path('abc'), 'w') as f:
+            f.write('not a pickle')
+
+        self.assertIsNone(self.cache.get('abc'))
+
+    def set_entry(self):
+        self.cache.set('abc', compiled_workflow.CompiledWorkflow(
+            future_net={'name': 'future net'}, future_operations=[],
+            root_operation=NullFutureOperation(),
+            input_storage_operation_id=0, child_operation_id=1,
+            output_properties=[]))
+        self.assertIsNotNone(self.cache.get('abc'))
+
+    def test_directory_per_user(self):
+        self.set_entry()
+        self.assertEqual(os.path.join(self.directory, 'cache',
+            str(os.getuid())), self.cache.directory)
+        self.assertEqual(0, os.stat(self.cache.directory).st_mode & 0077)
+
+    def test_shared_directory_is_not_read(self):
+        self.set_entry()
+        os.chmod(self.cache.directory, 0777)
+        self.assertIsNone(self.cache.get('abc'))
+
+    def test_shared_file_is_not_read(self):
+        self.set_entry()
+        os.chmod(self.cache._path('abc'), 0666)
+        self.assertIsNone(self.cache.get('abc'))
+
+    def test_linked_file_is_not_read(self):
+        self.set_entry()
+        os.link(self.cache._path('abc'), os.path.join(self.directory, 'link'))
+        self.assertIsNone(self.cache.get('abc'))
+
+
+if __name__ == "__main__":
+    unittest.main()
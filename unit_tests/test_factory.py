@@ -1,4 +1,8 @@
+from flow.petri_net.net import Net
+from flow_workflow import future_operation
+from flow_workflow.operation_base import DirectStorageOperation
 from lxml import etree
+from test_helpers.fakeredistest import FakeRedisTest
 
 import mock
 import unittest
@@ -20,5 +24,69 @@ class OperationTypeTest(unittest.TestCase):
                 flow_workflow.factory.get_operation_type(xml))
 
 
+class LoadOperationTest(FakeRedisTest):
+    def setUp(self):
+        FakeRedisTest.setUp(self)
+        self.net = Net.create(self.conn)
+
+        for operation_id in [3, 4, 5]:
+            self.save_operation(operation_id, name='op %d' % operation_id)
+
+    def save_operation(self, operation_id, name):
+        fop = future_operation.FutureOperation(
+                operation_class='direct_storage',
+                operation_id=operation_id, name=name,
+                parent=future_operation.NullFutureOperation(),
+                input_connections={}, output_properties=[],
+                log_dir='/exciting/log/dir')
+        fop.save(self.net)
+
+    def test_operation_dict_cached(self):
+        with mock.patch.object(self.conn, 'hget',
+                wraps=self.conn.hget) as hget:
+            first = flow_workflow.factory.load_operation(self.net, 3)
+            self.assertEqual(1, hget.call_count)
+
+            second = flow_workflow.factory.load_operation(self.net, 3)
+            self.assertEqual(1, hget.call_count)
+
+        self.assertIsInstance(second, DirectStorageOperation)
+        self.assertEqual(first.name, second.name)
+
+    def test_save_invalidates(self):
+        flow_workflow.factory.load_operation(self.net, 3)
+        self.save_operation(3, name='renamed')
+        self.assertEqual('renamed',
+                flow_workflow.factory.load_operation(self.net, 3).name)
+
+    def test_prefetch_operations(self):
+        with mock.patch.object(self.conn, 'hmget',
+                wraps=self.conn.hmget) as hmget:
+            flow_workflow.factory.prefetch_operations(self.net, [3, 4, 5, 6])
+            self.assertEqual(1, hmget.call_count)
+
+            # everything that exists is cached now
+            flow_workflow.factory.prefetch_operations(self.net, [3, 4, 5])
+            self.assertEqual(1, hmget.call_count)
+
+        with mock.patch.object(self.conn, 'hget') as hget:
+            self.assertEqual('op 5',
+                    flow_workflow.factory.load_operation(self.net, 5).name)
+            self.assertEqual(0, hget.call_count)
+
+    def test_operation_class_memoized(self):
+        original = flow_workflow.factory.pkg_resources.iter_entry_points
+        with mock.patch.dict(flow_workflow.factory._OPERATION_CLASSES,
+                clear=True):
+            with mock.patch('pkg_resources.iter_entry_points',
+                    wraps=original) as iter_entry_points:
+                cls = flow_workflow.factory.operation_class('direct_storage')
+                self.assertEqual(1, iter_entry_points.call_count)
+
+                self.assertIs(cls, flow_workflow.factory.operation_class(
+                    'direct_storage'))
+                self.assertEqual(1, iter_entry_points.call_count)
+
+
 if __name__ == '__main__':
     unittest.main()
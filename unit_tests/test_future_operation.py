@@ -1,4 +1,7 @@
 from flow_workflow.future_operation import FutureOperation
+from flow_workflow.future_operation import NullFutureOperation
+from flow_workflow.future_operation import input_source_tables
+from flow_workflow.future_operation import save_operations
 
 import mock
 import unittest
@@ -46,5 +49,94 @@ class FutureOperationTest(unittest.TestCase):
         self.parent.add_child.assert_called_once_with(self.future_operation)
 
 
+class SaveOperationsTest(unittest.TestCase):
+    def test_save_operations(self):
+        parent = NullFutureOperation()
+        fops = [FutureOperation(name='op %d' % i, operation_class='null',
+            operation_id=i, parent=parent) for i in [1, 2]]
+        net = mock.Mock()
+        net.key = 'netkey'
+
+        save_operations(net, fops, variables={'extra': 'value'})
+
+        net.variables.update.assert_called_once_with({
+            '_wf_op_1': fops[0].as_dict(default_net_key='netkey'),
+            '_wf_op_2': fops[1].as_dict(default_net_key='netkey'),
+            'extra': 'value',
+        })
+
+
+class InputSourceTablesTest(unittest.TestCase):
+    def setUp(self):
+        root = NullFutureOperation()
+        self.storage = FutureOperation(name='InputStorage',
+                operation_class='direct_storage', operation_id=0,
+                parent=root)
+        self.model = FutureOperation(name='model', operation_class='model',
+                operation_id=1, parent=root,
+                input_connections={0: {'a': 'a', 'b': 'b'}})
+        self.input_connector = FutureOperation(name='input connector',
+                operation_class='input_connector', operation_id=2,
+                parent=self.model,
+                input_connections={0: {'a': 'a', 'b': 'b'}})
+        self.command = FutureOperation(name='command',
+                operation_class='direct_storage', operation_id=4,
+                parent=self.model,
+                input_connections={2: {'x': 'a'}})
+        self.block = FutureOperation(name='block',
+                operation_class='pass_through', operation_id=5,
+                parent=self.model,
+                input_connections={4: {'y': 'out'}, 2: {'z': 'b'}})
+        self.output_connector = FutureOperation(name='output connector',
+                operation_class='pass_through', operation_id=3,
+                parent=self.model,
+                input_connections={5: {'result': 'y'}})
+        self.fops = [self.storage, self.model, self.input_connector,
+                self.output_connector, self.command, self.block]
+
+    def test_resolves_through_connectors_and_blocks(self):
+        tables = input_source_tables(self.fops)
+
+        self.assertEqual({'a': (0, 'a'), 'b': (0, 'b')}, tables[1])
+        self.assertEqual({'x': (0, 'a')}, tables[4])
+        self.assertEqual({'y': (4, 'out'), 'z': (0, 'b')}, tables[5])
+        self.assertEqual({'result': (4, 'out')}, tables[3])
+        # input connectors defer to their parent at run time
+        self.assertNotIn(2, tables)
+        self.assertNotIn(0, tables)
+
+    def test_model_outputs_resolve_through_output_connector(self):
+        consumer = FutureOperation(name='consumer',
+                operation_class='direct_storage', operation_id=6,
+                parent=NullFutureOperation(),
+                input_connections={1: {'in': 'result'}})
+
+        tables = input_source_tables(self.fops + [consumer])
+        self.assertEqual({'in': (4, 'out')}, tables[6])
+
+    def test_missing_inputs_are_left_out(self):
+        self.command.kwargs['input_connections'] = {2: {'x': 'nonexistent'}}
+
+        self.assertEqual({}, input_source_tables(self.fops)[4])
+
+    def test_unresolvable_operations_get_no_table(self):
+        self.command.kwargs['input_connections'] = {99: {'x': 'a'}}
+
+        tables = input_source_tables(self.fops)
+        self.assertNotIn(4, tables)
+        # the block depends on the command's output, not its inputs
+        self.assertIn(5, tables)
+
+    def test_save_operations_stores_tables(self):
+        net = mock.Mock()
+        net.key = 'netkey'
+
+        save_operations(net, self.fops)
+
+        values = net.variables.update.call_args[0][0]
+        self.assertEqual({'x': (0, 'a')}, values['_wf_op_4']['input_sources'])
+        self.assertNotIn('input_sources', values['_wf_op_2'])
+
+
 if __name__ == "__main__":
     unittest.main()
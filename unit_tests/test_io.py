@@ -152,6 +152,151 @@ class StoreLoadTest(FakeRedisTest):
         load_parallel_id = [[7, 24]]
         self.store_outputs_then_load_inputs(store_parallel_id, load_parallel_id)
 
+    def test_load_output_values_prefers_deepest_parallel_id(self):
+        io.store_output(net=self.net, operation_id=4, property_name='a',
+                value='shallow', parallel_id=[])
+        io.store_output(net=self.net, operation_id=4, property_name='a',
+                value='deep', parallel_id=[[7, 1]])
+        io.store_output(net=self.net, operation_id=5, property_name='b',
+                value='other', parallel_id=[])
+
+        self.assertEqual({'x': 'deep', 'y': 'other'},
+                io.load_output_values(net=self.net,
+                    sources={'x': (4, 'a'), 'y': (5, 'b')},
+                    parallel_id=ParallelIdentifier([[7, 1]])))
+
+    def test_load_output_values_missing(self):
+        with self.assertRaises(KeyError):
+            io.load_output_values(net=self.net, sources={'x': (4, 'a')},
+                    parallel_id=ParallelIdentifier([[7, 1]]))
+
+    def test_load_output_values_uses_one_hmget(self):
+        with mock.patch.object(self.conn, 'hmget',
+                wraps=self.conn.hmget) as hmget:
+            io.load_output_values(net=self.net, sources={},
+                    parallel_id=ParallelIdentifier())
+            self.assertEqual(0, hmget.call_count)
+
+            with self.assertRaises(KeyError):
+                io.load_output_values(net=self.net,
+                        sources={'x': (4, 'a'), 'y': (5, 'b')},
+                        parallel_id=ParallelIdentifier([[7, 1], [8, 2]]))
+            self.assertEqual(1, hmget.call_count)
+
+    def test_store_output_values(self):
+        parallel_id = ParallelIdentifier([[7, 1]])
+        io.store_output_values(net=self.net,
+                values={(4, 'a'): 'A', (5, 'b'): 'B'},
+                parallel_id=parallel_id)
+
+        self.assertEqual('A', io.load_output(net=self.net, operation_id=4,
+            property_name='a', parallel_id=parallel_id))
+        self.assertEqual('B', io.load_output(net=self.net, operation_id=5,
+            property_name='b', parallel_id=parallel_id))
+
+    def test_load_output_array(self):
+        parent_id = ParallelIdentifier([[7, 1]])
+        for i in [0, 1, 3]:
+            io.store_output(net=self.net, operation_id=4, property_name='a',
+                    value='child %d' % i,
+                    parallel_id=parent_id.child_identifier(9, i))
+        io.store_output(net=self.net, operation_id=4, property_name='a',
+                value='inherited', parallel_id=[])
+
+        with mock.patch.object(self.conn, 'hmget',
+                wraps=self.conn.hmget) as hmget:
+            self.assertEqual(
+                    ['child 0', 'child 1', 'inherited', 'child 3'],
+                    io.load_output_array(net=self.net, operation_id=4,
+                        property_name='a', parallel_id=parent_id,
+                        parallel_operation_id=9, size=4, chunk_size=3))
+            # two chunks and one probe of the ancestors
+            self.assertEqual(3, hmget.call_count)
+
+    def test_load_output_array_missing(self):
+        with self.assertRaises(KeyError):
+            io.load_output_array(net=self.net, operation_id=4,
+                    property_name='a', parallel_id=ParallelIdentifier(),
+                    parallel_operation_id=9, size=2)
+
+    def test_store_output_array(self):
+        parent_id = ParallelIdentifier([[7, 1]])
+        io.store_output_array(net=self.net, operation_id=4,
+                property_name='a', parallel_id=parent_id,
+                parallel_operation_id=9, values=['x', 'y'])
+
+        self.assertEqual(['x', 'y'], io.load_output_array(net=self.net,
+            operation_id=4, property_name='a', parallel_id=parent_id,
+            parallel_operation_id=9, size=2))
+
+    def test_move_output_array(self):
+        parent_id = ParallelIdentifier([[7, 1]])
+        io.store_output_array(net=self.net, operation_id=4,
+                property_name='a', parallel_id=parent_id,
+                parallel_operation_id=9, values=['x', 'y', 'z'])
+
+        self.assertEqual(['x', 'y', 'z'], io.move_output_array(net=self.net,
+            operation_id=4, property_name='a', parallel_id=parent_id,
+            parallel_operation_id=9, size=3, chunk_size=2))
+
+        # the array is stored once, in a single field
+        self.assertEqual(['_wf_outp_4_a|7:1'], [name for name
+            in self.conn.hkeys(self.net.variables.key)
+            if name.startswith('_wf_outp_')])
+        with mock.patch.object(self.conn, 'hmget',
+                wraps=self.conn.hmget) as hmget:
+            self.assertEqual(['x', 'y', 'z'], io.load_output(net=self.net,
+                operation_id=4, property_name='a',
+                parallel_id=parent_id.child_identifier(3, 0)))
+            self.assertEqual(1, hmget.call_count)
+
+    def test_move_output_array_again(self):
+        parent_id = ParallelIdentifier([[7, 1]])
+        io.store_output(net=self.net, operation_id=4, property_name='a',
+                value='x', parallel_id=parent_id.child_identifier(9, 0))
+        io.store_output(net=self.net, operation_id=4, property_name='a',
+                value='inherited', parallel_id=[])
+
+        for attempt in xrange(2):
+            self.assertEqual(['x', 'inherited'], io.move_output_array(
+                net=self.net, operation_id=4, property_name='a',
+                parallel_id=parent_id, parallel_operation_id=9, size=2))
+        self.assertEqual(['x', 'inherited'], io.load_output(net=self.net,
+            operation_id=4, property_name='a', parallel_id=parent_id))
+
+    def test_move_output_array_inherited(self):
+        parent_id = ParallelIdentifier([[7, 1]])
+        io.store_output(net=self.net, operation_id=4, property_name='a',
+                value='x', parallel_id=parent_id.child_identifier(9, 0))
+        io.store_output(net=self.net, operation_id=4, property_name='a',
+                value='inherited', parallel_id=[])
+
+        io.move_output_array(net=self.net, operation_id=4,
+                property_name='a', parallel_id=parent_id,
+                parallel_operation_id=9, size=2)
+        self.assertEqual(['x', 'inherited'], io.load_output(net=self.net,
+            operation_id=4, property_name='a', parallel_id=parent_id))
+
+    def test_nested_move_output_array(self):
+        for outer in xrange(2):
+            outer_id = ParallelIdentifier([[7, outer]])
+            io.store_output_array(net=self.net, operation_id=4,
+                    property_name='a', parallel_id=outer_id,
+                    parallel_operation_id=9, values=[outer, outer + 10])
+            io.move_output_array(net=self.net, operation_id=4,
+                    property_name='a', parallel_id=outer_id,
+                    parallel_operation_id=9, size=2)
+        io.move_output_array(net=self.net, operation_id=4,
+                property_name='a', parallel_id=ParallelIdentifier(),
+                parallel_operation_id=7, size=2)
+
+        self.assertEqual(['_wf_outp_4_a'], [name for name
+            in self.conn.hkeys(self.net.variables.key)
+            if name.startswith('_wf_outp_')])
+        self.assertEqual([[0, 10], [1, 11]], io.load_output(net=self.net,
+            operation_id=4, property_name='a',
+            parallel_id=ParallelIdentifier()))
+
 
 if __name__ == "__main__":
     unittest.main()
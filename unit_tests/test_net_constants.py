@@ -0,0 +1,57 @@
+from flow_workflow import net_constants
+
+import mock
+import unittest
+
+
+class GetConstantTest(unittest.TestCase):
+    def setUp(self):
+        self.constants = {'user_name': 'alice', 'workflow_plan_id': None}
+        self.net = mock.Mock()
+        self.net.key = 'netkey'
+        self.net.constant.side_effect = self.constants.get
+        net_constants.forget_constants(self.net.key)
+
+    def tearDown(self):
+        net_constants.forget_constants(self.net.key)
+
+    def test_fetches_once(self):
+        for i in xrange(3):
+            self.assertEqual('alice',
+                    net_constants.get_constant(self.net, 'user_name'))
+        self.net.constant.assert_called_once_with('user_name', mock.ANY)
+
+    def test_missing(self):
+        self.assertEqual({}, net_constants.get_constant(self.net,
+            'environment', {}))
+        self.assertEqual(None, net_constants.get_constant(self.net,
+            'environment'))
+        self.assertEqual(1, self.net.constant.call_count)
+
+    def test_none_is_cached(self):
+        self.assertIsNone(net_constants.get_constant(self.net,
+            'workflow_plan_id', 'default'))
+        self.assertIsNone(net_constants.get_constant(self.net,
+            'workflow_plan_id', 'default'))
+        self.assertEqual(1, self.net.constant.call_count)
+
+    def test_forget_constants(self):
+        net_constants.get_constant(self.net, 'user_name')
+        net_constants.forget_constants(self.net.key)
+        net_constants.get_constant(self.net, 'user_name')
+        self.assertEqual(2, self.net.constant.call_count)
+
+    def test_nets_are_separate(self):
+        other_net = mock.Mock()
+        other_net.key = 'other netkey'
+        other_net.constant.return_value = 'bob'
+
+        self.assertEqual('alice',
+                net_constants.get_constant(self.net, 'user_name'))
+        self.assertEqual('bob',
+                net_constants.get_constant(other_net, 'user_name'))
+        net_constants.forget_constants(other_net.key)
+
+
+if __name__ == "__main__":
+    unittest.main()
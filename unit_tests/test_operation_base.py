@@ -89,24 +89,69 @@ class DirectStorageOperationTest(unittest.TestCase):
 
     def test_load_inputs(self):
         parallel_id = mock.Mock()
-        load_input = mock.Mock()
-        self.operation.load_input = load_input
+        storage = mock.Mock()
+        storage.operation_id = 7
+        self.operation.input_source = mock.Mock(
+                side_effect=lambda name: (storage, 'src_' + name))
 
-        inputs = self.operation.load_inputs(parallel_id)
-        self.assertItemsEqual(['in1', 'in2'], inputs.keys())
-        self.assertEqual(2, load_input.call_count)
-        load_input.assert_any_call(name='in1', parallel_id=parallel_id)
+        with mock.patch('flow_workflow.operation_base.io') as io:
+            io.load_output_values.return_value = {'in1': 1, 'in2': 2}
+            inputs = self.operation.load_inputs(parallel_id)
+            self.assertEqual({'in1': 1, 'in2': 2}, inputs)
+            io.load_output_values.assert_called_once_with(net=storage.net,
+                    sources={'in1': (7, 'src_in1'), 'in2': (7, 'src_in2')},
+                    parallel_id=parallel_id)
+
+    def test_load_inputs_missing_and_null(self):
+        def input_source(name):
+            if name == 'in1':
+                raise operation_base.MissingInputError(name)
+            return None
+        self.operation.input_source = input_source
+
+        with mock.patch('flow_workflow.operation_base.io') as io:
+            inputs = self.operation.load_inputs(mock.Mock())
+            self.assertEqual({'in2': None}, inputs)
+            self.assertEqual(0, io.load_output_values.call_count)
+
+    def test_load_inputs_resolved(self):
+        parallel_id = mock.Mock()
+        self.operation.input_sources = {'in1': [3, 'out1'], 'in2': None}
+        self.operation._load_operation = mock.Mock()
+
+        with mock.patch('flow_workflow.operation_base.io') as io:
+            io.load_output_values.return_value = {'in1': 1}
+            inputs = self.operation.load_inputs(parallel_id)
+            self.assertEqual({'in1': 1, 'in2': None}, inputs)
+            io.load_output_values.assert_called_once_with(net=self.net,
+                    sources={'in1': (3, 'out1')}, parallel_id=parallel_id)
+        self.assertEqual(0, self.operation._load_operation.call_count)
+
+    def test_load_input_resolved(self):
+        parallel_id = mock.Mock()
+        self.operation.input_sources = {'in1': [3, 'out1']}
+
+        with mock.patch('flow_workflow.operation_base.io') as io:
+            io.load_output_values.return_value = {'in1': 1}
+            self.assertEqual(1, self.operation.load_input('in1', parallel_id))
+            io.load_output_values.assert_called_once_with(net=self.net,
+                    sources={'in1': (3, 'out1')}, parallel_id=parallel_id)
+
+            with self.assertRaises(operation_base.MissingInputError):
+                self.operation.load_input('in2', parallel_id)
 
     def test_load_outputs(self):
         parallel_id = mock.Mock()
         with mock.patch('flow_workflow.operation_base.io') as io:
+            io.load_output_values.return_value = {'buz': 1, 'baz': 2}
             outputs = self.operation.load_outputs(parallel_id)
             self.assertItemsEqual(['buz', 'baz'], outputs.keys())
-            self.assertEqual(2, io.load_output.call_count)
-            io.load_output.assert_any_call(net=self.net,
+            io.load_output_values.assert_called_once_with(net=self.net,
                     parallel_id=parallel_id,
-                    operation_id=self.operation_id,
-                    property_name='buz')
+                    sources={
+                        'buz': (self.operation_id, 'buz'),
+                        'baz': (self.operation_id, 'baz'),
+                    })
 
     def test_store_outputs(self):
         parallel_id = mock.Mock()
@@ -116,13 +161,17 @@ class DirectStorageOperationTest(unittest.TestCase):
         }
         with mock.patch('flow_workflow.operation_base.io') as io:
             self.operation.store_outputs(outputs, parallel_id)
-            self.assertEqual(2, io.store_output.call_count)
-            io.store_output.assert_any_call(
+            io.store_output_values.assert_called_once_with(
                     net=self.net,
-                    property_name='buz',
-                    value='buzdata',
-                    parallel_id=parallel_id,
-                    operation_id=self.operation_id)
+                    values={
+                        (self.operation_id, 'buz'): 'buzdata',
+                        (self.operation_id, 'baz'): 'bazdata',
+                    },
+                    parallel_id=parallel_id)
+
+    def test_output_source(self):
+        self.assertEqual((self.operation, 'baz'),
+                self.operation.output_source('baz'))
 
     def test_determine_input_source_success(self):
         self.assertEqual((3, 'out1'),  # Fakeredis makes these unicode..
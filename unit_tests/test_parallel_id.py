@@ -1,6 +1,8 @@
 from flow_workflow.parallel_id import ParallelIdentifier
 
+import copy
 import mock
+import pickle
 import unittest
 
 
@@ -106,5 +108,48 @@ class ParallelIdentifierIterationTest(unittest.TestCase):
         self.assertNotEqual(a, b)
 
 
+class ParallelIdentifierCachingTest(unittest.TestCase):
+    def test_interned(self):
+        a = ParallelIdentifier([[4, 7], [6, 2]])
+        self.assertIs(a, ParallelIdentifier([(4, 7), (6, 2)]))
+        self.assertIs(a, ParallelIdentifier([[4, 7]]).child_identifier(6, 2))
+        self.assertIs(ParallelIdentifier([[4, 7]]), a.parent_identifier)
+
+    def test_copy_and_pickle(self):
+        pid = ParallelIdentifier([[1, 2], [3, 4]])
+        copies = [copy.copy(pid), copy.deepcopy(pid),
+                pickle.loads(pickle.dumps(pid)),
+                pickle.loads(pickle.dumps(pid, 2))]
+
+        for result in copies:
+            self.assertIs(pid, result)
+        self.assertEqual([], list(ParallelIdentifier()))
+
+    def test_hashable(self):
+        a = ParallelIdentifier([[4, 7], [6, 2]])
+        b = ParallelIdentifier([[4, 7], [6, 3]])
+        self.assertEqual({a: 1, b: 2}[ParallelIdentifier([[4, 7], [6, 2]])],
+                1)
+
+    def test_child_identifier_repeated_operation(self):
+        pi = ParallelIdentifier([[4, 7]])
+        with self.assertRaises(ValueError):
+            pi.child_identifier(4, 1)
+
+    def test_serialize(self):
+        pi = ParallelIdentifier([[4, 7], [6, 2]])
+        self.assertEqual('[[4, 7], [6, 2]]', pi.serialize())
+        self.assertIs(pi, ParallelIdentifier.deserialize(pi.serialize()))
+
+    def test_variable_suffix(self):
+        self.assertEqual('', ParallelIdentifier().variable_suffix)
+        self.assertEqual('|4:7|6:2',
+                ParallelIdentifier([[4, 7], [6, 2]]).variable_suffix)
+
+    def test_log_name_components(self):
+        self.assertEqual(('4_7', '6_2'),
+                ParallelIdentifier([[4, 7], [6, 2]]).log_name_components)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,82 @@
+from flow_workflow import profiling
+
+import mock
+import unittest
+
+
+class PhaseTimerTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = mock.Mock()
+        self.timer = profiling.PhaseTimer(clock=self.clock)
+
+    def test_phase(self):
+        self.clock.side_effect = [1.0, 3.5, 4.0, 4.25]
+        with self.timer.phase('a'):
+            pass
+        with self.timer.phase('b'):
+            pass
+
+        self.assertEqual([('a', 2.5), ('b', 0.25)],
+                self.timer.phases.items())
+
+    def test_phase_accumulates(self):
+        self.clock.side_effect = [0.0, 1.0, 5.0, 7.0]
+        with self.timer.phase('a'):
+            pass
+        with self.timer.phase('a'):
+            pass
+
+        self.assertEqual({'a': 3.0}, dict(self.timer.phases))
+
+    def test_phase_records_time_on_error(self):
+        self.clock.side_effect = [0.0, 2.0]
+        with self.assertRaises(RuntimeError):
+            with self.timer.phase('a'):
+                raise RuntimeError()
+
+        self.assertEqual({'a': 2.0}, dict(self.timer.phases))
+
+    def test_report(self):
+        self.clock.side_effect = [0.0, 2.0]
+        with self.timer.phase('load_xml'):
+            pass
+        self.timer.count('places', 3)
+        self.timer.count('places', 4)
+
+        report = self.timer.report()
+        self.assertIn('load_xml', report)
+        self.assertIn('2.000', report)
+        self.assertIn('places', report)
+        self.assertIn(' 7', report)
+
+
+class RedisCommandCounterTest(unittest.TestCase):
+    def setUp(self):
+        self.connection = mock.Mock()
+        self.execute_command = self.connection.execute_command
+        self.pipeline = self.connection.pipeline
+        self.counter = profiling.RedisCommandCounter(self.connection)
+
+    def test_counts_commands(self):
+        self.counter.install()
+        self.connection.execute_command('hmget', 'key', 'a')
+        self.connection.execute_command('HSET', 'key', 'a', 'b')
+        self.connection.execute_command('hmget', 'key', 'b')
+        self.connection.pipeline()
+
+        self.assertEqual({'HMGET': 2, 'HSET': 1, 'PIPELINE': 1},
+                self.counter.counts)
+        self.assertEqual(4, self.counter.total)
+        self.assertEqual(3, self.execute_command.call_count)
+
+    def test_uninstall(self):
+        self.counter.install()
+        self.counter.uninstall()
+
+        self.assertIs(self.execute_command,
+                self.connection.execute_command)
+        self.assertIs(self.pipeline, self.connection.pipeline)
+
+
+if __name__ == "__main__":
+    unittest.main()